@@ -0,0 +1,127 @@
+# aggregator.py
+"""
+Sliding-window label aggregator shared by main.py (/status label) and
+emotion.py (hearts meter).
+
+Both used to run tumbling windows: counts reset every N seconds, so the
+smoothed label could lag a whole window and jumped at window edges. This
+keeps the last `window_sec` of observations in a fixed-size timestamped
+ring buffer with running per-label totals:
+
+- add() appends one observation and evicts whatever has aged out or is
+  overwritten: amortized O(1),
+- counts()/weights()/dominant() read the running totals: O(number of
+  labels), i.e. O(1),
+- observations carry a weight (e.g. model confidence), so both raw counts
+  and confidence-weighted totals are available,
+- an optional EMA (ema_alpha) gives an exponentially smoothed score per
+  label for a smoother, window-free label.
+
+The vision thread writes while HTTP threads read, so every public method
+takes a (cheap, uncontended most of the time) lock.
+"""
+
+import time
+import threading
+
+RING_CAPACITY = 1024
+
+
+class SlidingWindowAggregator:
+    def __init__(self, labels, window_sec, capacity=RING_CAPACITY, ema_alpha=None):
+        self.labels = tuple(labels)
+        self.window_sec = float(window_sec)
+        self.capacity = int(capacity)
+        self.ema_alpha = ema_alpha
+        self._index = {l: i for i, l in enumerate(self.labels)}
+        self._lock = threading.RLock()
+
+        # ring buffer (plain lists: cheaper than NumPy for scalar access)
+        self._ts = [0.0] * self.capacity
+        self._lab = [0] * self.capacity
+        self._w = [0.0] * self.capacity
+        self._head = 0      # next write position
+        self._n = 0         # live entries; oldest is at head - n
+
+        self._counts = [0] * len(self.labels)
+        self._weights = [0.0] * len(self.labels)
+        self._ema = [0.0] * len(self.labels)
+
+    def __len__(self):
+        return self._n
+
+    def _evict_oldest(self):
+        tail = (self._head - self._n) % self.capacity
+        k = self._lab[tail]
+        self._counts[k] -= 1
+        self._weights[k] -= self._w[tail]
+        self._n -= 1
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        cutoff = now - self.window_sec
+        with self._lock:
+            while self._n and self._ts[(self._head - self._n) % self.capacity] <= cutoff:
+                self._evict_oldest()
+            if self._n == 0:
+                # re-zero to stop float drift accumulating in the weight totals
+                self._weights = [0.0] * len(self.labels)
+
+    def add(self, label, weight=1.0, ts=None):
+        k = self._index.get(label)
+        if k is None:
+            return
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self.expire(ts)
+            if self._n == self.capacity:
+                self._evict_oldest()
+            i = self._head
+            self._ts[i], self._lab[i], self._w[i] = ts, k, float(weight)
+            self._head = (i + 1) % self.capacity
+            self._n += 1
+            self._counts[k] += 1
+            self._weights[k] += float(weight)
+
+            if self.ema_alpha:
+                a = self.ema_alpha
+                for j in range(len(self._ema)):
+                    self._ema[j] *= (1.0 - a)
+                self._ema[k] += a * float(weight)
+
+    def reset(self):
+        with self._lock:
+            self._n = 0
+            self._counts = [0] * len(self.labels)
+            self._weights = [0.0] * len(self.labels)
+            self._ema = [0.0] * len(self.labels)
+
+    # ---------- queries ----------
+    def counts(self, now=None) -> dict:
+        with self._lock:
+            self.expire(now)
+            return dict(zip(self.labels, self._counts))
+
+    def weights(self, now=None) -> dict:
+        with self._lock:
+            self.expire(now)
+            return dict(zip(self.labels, (round(w, 4) for w in self._weights)))
+
+    def ema(self) -> dict:
+        with self._lock:
+            return dict(zip(self.labels, (round(e, 4) for e in self._ema)))
+
+    def dominant(self, now=None, weighted=True, default=None):
+        """Label with the largest (weighted) total in the window; default if empty."""
+        with self._lock:
+            self.expire(now)
+            if self._n == 0:
+                return default
+            totals = self._weights if weighted else self._counts
+            return self.labels[max(range(len(totals)), key=totals.__getitem__)]
+
+    def ema_label(self, default=None):
+        with self._lock:
+            if not any(self._ema):
+                return default
+            return self.labels[max(range(len(self._ema)), key=self._ema.__getitem__)]
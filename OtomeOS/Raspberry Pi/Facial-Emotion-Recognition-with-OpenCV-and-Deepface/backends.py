@@ -0,0 +1,572 @@
+# backends.py
+"""
+Inference backends for the Pi server, selectable by name.
+
+Every backend is an object with .analyze(frame_bgr) returning the same dict:
+
+    { present, dominant_emotion, emotion_conf, embedding, box, classified, track_id,
+      quality, skip_reason,        # quality.py gate on the main face (None: not checked / passed)
+      faces: [ { track_id, box, dominant_emotion, emotion_conf, classified, quality } ],
+      timings: { stage: ms } }     # detect / quality / cache / emotion / embedding, whichever ran;
+                                   # models = emotion + embedding wall time
+
+and optionally .warmup_steps() -> [(model_name, fn)], .stats() -> dict and
+.clone() -> a fresh engine (own tracks and embedding cache) that shares the
+loaded models, one per camera (see clone() and share_models()). Engines
+with embeddings skip Facenet while .want_embedding is False. Model weights
+live in the model manager (models.py), which loads them on demand and
+unloads idle ones.
+
+Registered backends (main.py picks one with LUMI_BACKEND, default "auto"):
+
+    auto      emotion.EmotionEngine / emotion.analyze_frame if emotion.py
+              provides them, else "deepface"
+    engine    emotion.EmotionEngine with the DeepFace Keras models
+    deepface  DeepFace API only: detect + align once, then the emotion model
+              and Facenet concurrently on the crop (old fallback)
+    dnn       emotion.EmotionEngine with OpenCV-DNN models (no TensorFlow)
+    dnn-int8  same, loading the int8-quantized model files
+    stub      deterministic fake results, no models (tests and benchmarks)
+
+The dnn backends read exported models from DNN_MODEL_DIR:
+
+    emotion.onnx / emotion.int8.onnx   input (N, 48, 48, 1) gray in [0, 1]
+    facenet.onnx / facenet.int8.onnx   input (N, 160, 160, 3) RGB in [0, 1]
+
+e.g. exported from the DeepFace Keras models with tf2onnx and quantized with
+onnxruntime.quantization.quantize_static (QDQ format, which cv2.dnn reads).
+"""
+
+import os
+import time
+import zlib
+import threading
+import numpy as np
+import cv2
+
+from embedding_cache import TrackEmbeddingCache, TrackIdAssigner, box_iou, l2_normalize, pick_main
+from models import LAZY_MODELS, MANAGER, drop_deepface_model
+from quality import QualityGate
+from roi_cache import RoiCache, dhash
+
+BATCH_WAIT_MS = 3.0   # how long a shared classifier waits for other cameras' ROIs
+
+DNN_MODEL_DIR = os.environ.get("LUMI_DNN_MODELS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+BACKENDS = {}
+
+
+def register(name):
+    def deco(factory):
+        BACKENDS[name] = factory
+        return factory
+    return deco
+
+
+def available():
+    return sorted(BACKENDS)
+
+
+def create(name, **kwargs):
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown backend {name!r}; choose from {', '.join(available())}")
+    engine = factory(**kwargs)
+    engine.backend_name = name
+    return engine
+
+
+def clone(engine):
+    """Engine for another camera: fresh tracking state, same models."""
+    fn = getattr(engine, "clone", None)
+    twin = fn() if callable(fn) else create(getattr(engine, "backend_name", "auto"))
+    twin.backend_name = getattr(engine, "backend_name", None)
+    return twin
+
+
+class BatchingClassifier:
+    """
+    One emotion classifier shared by several cameras' engines.
+
+    predict_proba calls from different vision threads that arrive within
+    max_wait_ms are concatenated into one batched model call, so the ROIs of
+    all cameras share a forward pass. The first caller collects until
+    parties() callers (the pipelines currently analyzing) have joined or
+    the wait runs out. Model calls are serialized, because the
+    classifiers reuse preallocated buffers.
+    """
+
+    def __init__(self, clf, parties=lambda: 1, max_wait_ms=BATCH_WAIT_MS):
+        self.clf = clf
+        self.parties = parties
+        self.max_wait = max_wait_ms / 1000.0
+        self._cond = threading.Condition()
+        self._run_lock = threading.Lock()
+        self._queue = []
+        self._collecting = False
+        self.calls = 0
+        self.batches = 0
+        self.rois = 0
+
+    def predict_proba(self, gray_faces):
+        req = {"rois": list(gray_faces), "probs": None, "error": None, "done": False}
+        with self._cond:
+            self._queue.append(req)
+            self.calls += 1
+            self._cond.notify_all()
+            if self._collecting:
+                while not req["done"]:
+                    self._cond.wait()
+                batch = None
+            else:
+                self._collecting = True
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < self.parties():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue, []
+                self._collecting = False
+        if batch is not None:
+            self._run(batch)
+        if req["error"] is not None:
+            raise req["error"]
+        return req["probs"]
+
+    def _run(self, batch):
+        rois = [r for q in batch for r in q["rois"]]
+        try:
+            with self._run_lock:
+                probs = self.clf.predict_proba(rois)
+            i = 0
+            for q in batch:
+                q["probs"] = probs[i:i + len(q["rois"])]
+                i += len(q["rois"])
+        except Exception as e:
+            for q in batch:
+                q["error"] = e
+        with self._cond:
+            for q in batch:
+                q["done"] = True
+            self.batches += 1
+            self.rois += len(rois)
+            self._cond.notify_all()
+
+    def predict_one(self, gray):
+        return self.predict_proba((gray,))[0]
+
+    def stats(self):
+        return {"calls": self.calls, "batches": self.batches, "rois": self.rois,
+                "calls_per_batch": round(self.calls / self.batches, 2) if self.batches else None}
+
+
+def _serialized(fn):
+    lock = threading.Lock()
+
+    def call(*a, **kw):
+        with lock:
+            return fn(*a, **kw)
+    return call
+
+
+def share_models(engine, parties):
+    """
+    Prepare a warmed-up engine to be clone()d for several cameras: its
+    emotion classifier batches across cameras (BatchingClassifier) and its
+    embedder runs one call at a time (each clone's embedding cache has its
+    own model thread). Engines without direct models are left alone.
+    """
+    clf = getattr(engine, "_classifier", None)
+    if clf is not None and hasattr(clf, "predict_proba") and not isinstance(clf, BatchingClassifier):
+        engine._classifier = BatchingClassifier(clf, parties)
+    if callable(getattr(engine, "embedder", None)):
+        engine.embedder = _serialized(engine.embedder)
+    return engine
+
+
+def empty_result():
+    return {
+        "present": False,
+        "dominant_emotion": "neutral",
+        "emotion_conf": 0.0,
+        "embedding": None,
+        "box": None,
+        "classified": False,
+        "track_id": None,
+        "quality": None,
+        "skip_reason": None,
+        "faces": [],
+        "timings": {},
+    }
+
+
+# ----------------- deepface (DeepFace detector + models) -----------------
+class DeepFaceEngine:
+    """
+    The original main.py fallback, using only the public DeepFace API.
+
+    The face is detected and aligned once per frame (DeepFace.extract_faces).
+    The aligned crops then go to the emotion model (DeepFace.analyze) and the
+    main face's crop to Facenet (DeepFace.represent), both with
+    detector_backend="skip", unless the quality gate (quality.py) rejects
+    them. Facenet runs on the embedding cache's model
+    thread while the emotion model runs here, so a frame costs about as much
+    as the slower of the two models, not their sum. Facenet only runs while
+    the IoU-track is pooling or re-verifying (see embedding_cache). Both
+    models' results for the main face are cached by the crop's dHash
+    (roi_cache.py) while its IoU-track lasts.
+    """
+
+    detector_backend = "opencv"   # DeepFace's default detector
+
+    def __init__(self, with_embedding=True, detector_backend=None, quality_gate=True, roi_cache=True):
+        self.with_embedding = with_embedding
+        if detector_backend:
+            self.detector_backend = detector_backend
+        self.want_embedding = True
+        self.DeepFace = None
+        self.ids = TrackIdAssigner()
+        self.embeddings = TrackEmbeddingCache()
+        self.quality = QualityGate(enforce=quality_gate)
+        self.roi_cache = RoiCache() if roi_cache else None
+
+    def clone(self):
+        twin = DeepFaceEngine(self.with_embedding, self.detector_backend, self.quality.enforce,
+                              self.roi_cache is not None)
+        twin.DeepFace = self.DeepFace
+        return twin
+
+    def _import(self):
+        if self.DeepFace is None:
+            from deepface import DeepFace
+            self.DeepFace = DeepFace
+            # DeepFace caches its models itself; the manager builds and drops them.
+            MANAGER.register("emotion", lambda: self._build("Emotion", "facial_attribute"),
+                             lambda _: drop_deepface_model("Emotion"), source="deepface:Emotion",
+                             idle_sec=None)
+            MANAGER.register("facenet", lambda: self._build("Facenet", "facial_recognition"),
+                             lambda _: drop_deepface_model("Facenet"), source="deepface:Facenet")
+
+    def _build(self, model_name, task):
+        try:
+            return self.DeepFace.build_model(task=task, model_name=model_name)
+        except TypeError:  # older deepface: build_model(model_name)
+            return self.DeepFace.build_model(model_name=model_name)
+
+    def warmup_steps(self):
+        dummy = np.zeros((240, 320, 3), np.uint8)
+        steps = [
+            ("deepface", self._import),
+            ("detector", lambda: self._detect(dummy)),
+            ("emotion", lambda: self._emotion(dummy[:48, :48], [0, 0, 48, 48])),
+        ]
+        if self.with_embedding and "facenet" not in LAZY_MODELS:
+            steps.append(("facenet", lambda: MANAGER.get("facenet")))
+        return steps
+
+    def _detect(self, frame_bgr):
+        """[(box, aligned face crop as BGR uint8)] for every detected face."""
+        found = self.DeepFace.extract_faces(
+            img_path=frame_bgr, detector_backend=self.detector_backend,
+            align=True, enforce_detection=False,
+        )
+        faces = []
+        for f in found or ():
+            # with enforce_detection=False, "no face" comes back as the whole
+            # frame with confidence 0
+            if not f.get("confidence"):
+                continue
+            a = f.get("facial_area") or {}
+            crop = f["face"]
+            if crop.dtype != np.uint8:
+                crop = np.clip(crop * 255.0 if crop.max() <= 1.0 else crop, 0, 255).astype(np.uint8)
+            faces.append(([int(a.get(k, 0)) for k in ("x", "y", "w", "h")],
+                          cv2.cvtColor(crop, cv2.COLOR_RGB2BGR)))
+        return faces
+
+    @staticmethod
+    def _unclassified(box):
+        return {"track_id": None, "box": box, "dominant_emotion": "neutral",
+                "emotion_conf": 0.0, "classified": False}
+
+    def _emotion(self, crop_bgr, box):
+        with MANAGER.use("emotion"):
+            analysis = self.DeepFace.analyze(
+                img_path=crop_bgr, actions=["emotion"], detector_backend="skip", enforce_detection=False
+            )
+        if isinstance(analysis, list):
+            analysis = analysis[0] if analysis else {}
+        de = analysis.get("dominant_emotion", "neutral")
+        emo_map = analysis.get("emotion", {})
+        return {
+            "track_id": None,
+            "box": box,
+            "dominant_emotion": de,
+            "emotion_conf": float(emo_map.get(de, 1.0)) if isinstance(emo_map, dict) else 1.0,
+            "classified": True,
+        }
+
+    def _represent(self, crop_bgr):
+        with MANAGER.use("facenet"):
+            reps = self.DeepFace.represent(
+                img_path=crop_bgr, model_name="Facenet", detector_backend="skip", enforce_detection=False
+            )
+        if isinstance(reps, list) and reps and "embedding" in reps[0]:
+            return np.array(reps[0]["embedding"], dtype=np.float32)
+        return None
+
+    def _cached(self, kind, track_id, h, fn):
+        """fn() through the ROI cache (h is None: no cache)."""
+        if h is None:
+            return fn()
+        v = self.roi_cache.get(track_id, kind, h)
+        if v is None:
+            t0 = time.perf_counter()
+            v = fn()
+            self.roi_cache.put(track_id, kind, h, v, (time.perf_counter() - t0) * 1000.0)
+        return v
+
+    def analyze(self, frame_bgr):
+        out = empty_result()
+        timings = out["timings"]
+        try:
+            self._import()
+            t0 = time.perf_counter()
+            faces = self._detect(frame_bgr)
+            timings["detect"] = (time.perf_counter() - t0) * 1000.0
+            if not faces:
+                self.ids.assign(None)
+                self.embeddings.end_track()
+                if self.roi_cache is not None:
+                    self.roi_cache.retain(())
+                return out
+
+            # the face still on the last main track, unless another is clearly larger
+            last = self.ids.last_box
+            ious = [box_iou(last, tuple(b)) if last is not None else 0.0 for b, _ in faces]
+            cur = max(range(len(faces)), key=ious.__getitem__)
+            main = pick_main([b[2] * b[3] for b, _ in faces],
+                             cur if ious[cur] >= self.ids.min_iou else None)
+            box, crop = faces[main]
+            tid = out["track_id"] = self.ids.assign(tuple(box))
+            h = None
+            if self.roi_cache is not None:
+                t0 = time.perf_counter()
+                self.roi_cache.retain((tid,))
+                h = dhash(crop)
+                timings["cache"] = (time.perf_counter() - t0) * 1000.0
+
+            t0 = time.perf_counter()
+            checks = self.quality.check([c for _, c in faces], sizes=[min(b[2], b[3]) for b, _ in faces])
+            timings["quality"] = (time.perf_counter() - t0) * 1000.0
+
+            # Facenet on the model thread while the emotion model runs here
+            t_models = time.perf_counter()
+            emb_job = None
+            failures = self.embeddings.reverify_failures
+            if self.with_embedding and self.want_embedding and checks[main]["reason"] is None:
+                emb_job = self.embeddings.get_async(
+                    tid, lambda: self._cached("embedding", tid, h, lambda: self._represent(crop)))
+            out["faces"] = []
+            for i, ((b, c), q) in enumerate(zip(faces, checks)):
+                if q["reason"] is not None:
+                    face = self._unclassified(b)
+                elif i == main:
+                    face = dict(self._cached("emotion", tid, h, lambda: self._emotion(c, b)), box=b)
+                else:
+                    face = self._emotion(c, b)
+                face["quality"] = q["score"]
+                if q["reason"] is not None:
+                    face["skip_reason"] = q["reason"]
+                out["faces"].append(face)
+            timings["emotion"] = (time.perf_counter() - t_models) * 1000.0
+            if emb_job is not None:
+                try:
+                    out["embedding"], timings["embedding"] = emb_job.result()
+                except Exception as e:
+                    print("[Fallback] embedding warn:", e)
+                if h is not None and self.embeddings.reverify_failures != failures:
+                    self.roi_cache.invalidate(tid)   # someone else under this track
+            timings["models"] = (time.perf_counter() - t_models) * 1000.0
+
+            main_face = out["faces"][main]
+            main_face["track_id"] = out["track_id"]
+            out.update({k: main_face[k] for k in ("dominant_emotion", "emotion_conf", "classified", "quality")})
+            out["skip_reason"] = main_face.get("skip_reason")
+            out["box"] = box
+            out["present"] = True
+        except Exception as e:
+            print("[Fallback] analyze warn:", e)
+        return out
+
+    def stats(self):
+        return {"embedding_cache": self.embeddings.stats(), "quality": self.quality.stats(),
+                "roi_cache": self.roi_cache.stats() if self.roi_cache is not None else None,
+                "models": MANAGER.stats()}
+
+
+@register("deepface")
+def _deepface(**kw):
+    return DeepFaceEngine(**kw)
+
+
+# ----------------- engine (emotion.py, DeepFace Keras models) -----------------
+@register("engine")
+def _engine(**kw):
+    import emotion
+    return emotion.EmotionEngine(**kw)
+
+
+# ----------------- dnn / dnn-int8 (OpenCV DNN, no TensorFlow) -----------------
+def _model_path(name, int8):
+    return os.path.join(DNN_MODEL_DIR, f"{name}.int8.onnx" if int8 else f"{name}.onnx")
+
+
+def _read_net(path):
+    net = cv2.dnn.readNet(path)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+
+class DnnEmotionClassifier:
+    """cv2.dnn drop-in for emotion.EmotionClassifier (same predict_proba contract)."""
+
+    def __init__(self, path, max_batch=8):
+        self.path = path
+        MANAGER.register("emotion", lambda: _read_net(path), source=path, idle_sec=None)
+        self._scratch = np.empty((48, 48), np.uint8)
+        self._batch = np.empty((max_batch, 48, 48, 1), np.float32)
+
+    def predict_proba(self, gray_faces):
+        n = len(gray_faces)
+        if n > len(self._batch):
+            self._batch = np.empty((n, 48, 48, 1), np.float32)
+        for i, g in enumerate(gray_faces):
+            if g.ndim == 3:
+                g = cv2.cvtColor(g, cv2.COLOR_BGR2GRAY)
+            if g.shape != (48, 48):
+                cv2.resize(g, (48, 48), dst=self._scratch, interpolation=cv2.INTER_AREA)
+                g = self._scratch
+            np.multiply(g, 1.0 / 255.0, out=self._batch[i, :, :, 0], casting="unsafe")
+        with MANAGER.use("emotion") as net:
+            net.setInput(self._batch[:n])
+            return np.asarray(net.forward(), dtype=np.float32).reshape(n, -1)
+
+    def predict_one(self, gray):
+        return self.predict_proba((gray,))[0]
+
+
+class DnnEmbedder:
+    """cv2.dnn Facenet: face_bgr -> L2-normalized float32 vector."""
+
+    def __init__(self, path, size=160):
+        self.path = path
+        self.size = size
+        MANAGER.register("facenet", lambda: _read_net(path), source=path)
+
+    def __call__(self, face_bgr):
+        rgb = cv2.cvtColor(cv2.resize(face_bgr, (self.size, self.size)), cv2.COLOR_BGR2RGB)
+        with MANAGER.use("facenet") as net:
+            net.setInput(rgb[None].astype(np.float32) / 255.0)
+            return l2_normalize(net.forward().reshape(-1))
+
+
+def _dnn(int8, with_embedding=True, **kw):
+    import emotion
+    clf = DnnEmotionClassifier(_model_path("emotion", int8))
+    emb = DnnEmbedder(_model_path("facenet", int8)) if with_embedding else None
+    return emotion.EmotionEngine(with_embedding=with_embedding, classifier=clf, embedder=emb, **kw)
+
+
+@register("dnn")
+def _dnn_fp32(**kw):
+    return _dnn(False, **kw)
+
+
+@register("dnn-int8")
+def _dnn_int8(**kw):
+    return _dnn(True, **kw)
+
+
+# ----------------- stub (no models) -----------------
+class StubEngine:
+    """
+    Deterministic results derived from the frame pixels, so the same frames
+    always give the same labels. `latency_ms` simulates model time: slept by
+    default, or burnt in Python holding the GIL (like DeepFace's pre- and
+    post-processing) with spin=True.
+    """
+
+    labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+    def __init__(self, with_embedding=True, latency_ms=0.0, dim=128, spin=False):
+        self.with_embedding = with_embedding
+        self.want_embedding = True
+        self.latency_ms = latency_ms
+        self.spin = spin
+        self.dim = dim
+        self.calls = 0
+
+    def clone(self):
+        return StubEngine(self.with_embedding, self.latency_ms, self.dim, self.spin)
+
+    def analyze(self, frame_bgr):
+        self.calls += 1
+        t0 = time.perf_counter()
+        if self.latency_ms and self.spin:
+            end = t0 + self.latency_ms / 1000.0
+            while time.perf_counter() < end:
+                pass
+        elif self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        out = empty_result()
+        out["timings"]["emotion"] = (time.perf_counter() - t0) * 1000.0
+        thumb = frame_bgr[::16, ::16]
+        level = int(thumb.mean())
+        if level < 8:   # black frame: nobody there
+            return out
+        h, w = frame_bgr.shape[:2]
+        box = [w // 4, h // 4, w // 2, h // 2]
+        label = self.labels[level % len(self.labels)]
+        conf = 0.5 + (level % 50) / 100.0
+        out.update({"present": True, "dominant_emotion": label, "emotion_conf": conf,
+                    "box": box, "classified": True, "track_id": 1})
+        out["faces"] = [{"track_id": 1, "box": box, "dominant_emotion": label,
+                         "emotion_conf": conf, "classified": True}]
+        if self.with_embedding and self.want_embedding:
+            rng = np.random.default_rng(zlib.crc32(thumb.tobytes()) & 0xFF)
+            out["embedding"] = l2_normalize(rng.standard_normal(self.dim))
+        return out
+
+    def stats(self):
+        return {"calls": self.calls}
+
+
+@register("stub")
+def _stub(**kw):
+    return StubEngine(**kw)
+
+
+# ----------------- auto (old _try_load_external_engine behaviour) -----------------
+@register("auto")
+def _auto(**kw):
+    try:
+        import emotion  # your file
+        # Prefer a class EmotionEngine with .analyze(frame_bgr)
+        if hasattr(emotion, "EmotionEngine"):
+            print("[Engine] Using emotion.EmotionEngine from emotion.py")
+            return emotion.EmotionEngine(**kw)
+        # Or a function analyze_frame(frame_bgr)
+        if hasattr(emotion, "analyze_frame") and callable(emotion.analyze_frame):
+            class _Wrapper:
+                def analyze(self, frame_bgr):
+                    return emotion.analyze_frame(frame_bgr)
+            print("[Engine] Using emotion.analyze_frame from emotion.py")
+            return _Wrapper()
+        print("[Engine] emotion.py found but no compatible API; using fallback.")
+    except Exception as e:
+        print("[Engine] No emotion.py or import error; using fallback. Details:", e)
+    return DeepFaceEngine(**kw)
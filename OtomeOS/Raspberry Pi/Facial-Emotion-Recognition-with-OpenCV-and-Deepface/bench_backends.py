@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# bench_backends.py
+"""
+Compare inference backends (see backends.py) on the same frames.
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. For every backend we report per-frame latency (mean/p50/p95),
+model load time, RSS after loading and peak RSS, and how often its labels
+agree with the reference backend (raw 7-way label, happy/neutral/upset
+label, and face presence).
+
+    python3 bench_backends.py --frames clip.mp4 --backends engine dnn dnn-int8 stub
+
+--faces 1,2,4,8 adds a face-count sweep: every frame is tiled N times into
+a grid (so a one-person clip shows N faces) and each backend reports, per N,
+the latency, the model time (emotion + embedding), faces found, model ms per
+face and the embedding cache hit rate. With batched emotion calls the model
+time should grow well below N-fold; detection grows with the canvas.
+
+--check-warmup lists each backend's warm-up steps with and without
+embeddings (no frames needed) and exits non-zero if a cv2.dnn backend would
+load DeepFace / TensorFlow, or an emotion-only engine would load Facenet:
+
+    python3 bench_backends.py --check-warmup --backends dnn dnn-int8
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+import cv2
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_frames(path, max_frames, size=(320, 240)):
+    """Frames from a video file or a directory of images, resized like the camera."""
+    frames = []
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTS))
+        for n in names[:max_frames]:
+            img = cv2.imread(os.path.join(path, n))
+            if img is not None:
+                frames.append(cv2.resize(img, size))
+    else:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < max_frames:
+            ok, img = cap.read()
+            if not ok:
+                break
+            frames.append(cv2.resize(img, size))
+        cap.release()
+    return frames
+
+
+def tile(frame, n):
+    """n copies of frame in a near-square grid (black where the grid is not full)."""
+    cols = math.ceil(math.sqrt(n))
+    rows = math.ceil(n / cols)
+    h, w = frame.shape[:2]
+    canvas = np.zeros((rows * h, cols * w, 3), np.uint8)
+    for i in range(n):
+        r, c = divmod(i, cols)
+        canvas[r * h:(r + 1) * h, c * w:(c + 1) * w] = frame
+    return canvas
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def _pct(xs, q):
+    return round(float(np.percentile(xs, q)), 2) if xs else None
+
+
+def face_sweep(engine, frames, counts):
+    """Per face count: latency, model time and faces found on tiled frames."""
+    rows = []
+    for n in counts:
+        eng = engine.clone() if hasattr(engine, "clone") else engine   # fresh tracks per N
+        lat, models, found = [], [], []
+        for f in frames:
+            img = tile(f, n)
+            t = time.perf_counter()
+            out = eng.analyze(img)
+            lat.append((time.perf_counter() - t) * 1000.0)
+            tm = out.get("timings") or {}
+            models.append(tm.get("models", tm.get("emotion", 0.0) + tm.get("embedding", 0.0)))
+            found.append(len(out.get("faces") or ()) or int(bool(out.get("present"))))
+        st = eng.stats() if hasattr(eng, "stats") else {}
+        faces = float(np.mean(found)) if found else 0.0
+        rows.append({
+            "faces": n,
+            "found": round(faces, 2),
+            "latency_ms": {"mean": round(float(np.mean(lat)), 2) if lat else None,
+                           "p50": _pct(lat, 50), "p95": _pct(lat, 95)},
+            "models_ms": round(float(np.mean(models)), 2) if models else None,
+            "models_ms_per_face": round(float(np.mean(models)) / faces, 2) if faces else None,
+            "embedding_hit_rate": (st.get("embedding_cache") or {}).get("hit_rate"),
+        })
+    base = rows[0]["models_ms"] if rows else None
+    for r in rows:
+        r["models_vs_first"] = round(r["models_ms"] / base, 2) if base else None
+    return rows
+
+
+def run_backend(name, path, max_frames, faces=None):
+    """Runs inside the subprocess: load, warm up, time every frame."""
+    sys.path.insert(0, HERE)
+    import backends
+    from emotion import POSITIVE, NEGATIVE
+
+    def label3(de):
+        return "happy" if de in POSITIVE else "upset" if de in NEGATIVE else "neutral"
+
+    frames = load_frames(path, max_frames)
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    engine = backends.create(name)
+    for _, fn in getattr(engine, "warmup_steps", lambda: [])():
+        fn()
+    load_ms = (time.perf_counter() - t0) * 1000.0
+
+    lat, labels = [], []
+    for f in frames:
+        t = time.perf_counter()
+        out = engine.analyze(f)
+        lat.append((time.perf_counter() - t) * 1000.0)
+        de = str(out.get("dominant_emotion", "neutral"))
+        labels.append([bool(out.get("present")), de, label3(de)])
+
+    result = {
+        "backend": name,
+        "frames": len(frames),
+        "load_ms": round(load_ms, 1),
+        "latency_ms": {"mean": round(float(np.mean(lat)), 2) if lat else None,
+                       "p50": _pct(lat, 50), "p95": _pct(lat, 95)},
+        "rss_mb": {"before_load": rss0, "after": rss_mb(), "peak": peak_rss_mb()},
+        "labels": labels,
+    }
+    if faces:
+        result["face_sweep"] = face_sweep(engine, frames, faces)
+    return result
+
+
+def check_warmup(names):
+    """Warm-up step names per backend, and what should not be in them."""
+    sys.path.insert(0, HERE)
+    import backends
+
+    report, ok = [], True
+    for name in names:
+        for with_embedding in (True, False):
+            engine = backends.create(name, with_embedding=with_embedding)
+            steps = [s for s, _ in getattr(engine, "warmup_steps", lambda: [])()]
+            bad = []
+            if name.startswith("dnn") and "deepface" in steps:
+                bad.append("deepface")
+            if not with_embedding and "facenet" in steps:
+                bad.append("facenet")
+            ok &= not bad
+            report.append({"backend": name, "with_embedding": with_embedding,
+                           "steps": steps, "unexpected": bad})
+    return ok, report
+
+
+def agreement(ref, other):
+    n = min(len(ref), len(other))
+    if n == 0:
+        return {}
+    both = [i for i in range(n) if ref[i][0] and other[i][0]]
+    return {
+        "present": round(sum(ref[i][0] == other[i][0] for i in range(n)) / n, 3),
+        "label": round(sum(ref[i][1] == other[i][1] for i in both) / len(both), 3) if both else None,
+        "label3": round(sum(ref[i][2] == other[i][2] for i in both) / len(both), 3) if both else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", help="video file or image directory")
+    ap.add_argument("--backends", nargs="+", default=["engine", "dnn", "dnn-int8", "stub"])
+    ap.add_argument("--reference", default=None, help="backend to compare labels against (default: first)")
+    ap.add_argument("--max-frames", type=int, default=300)
+    ap.add_argument("--faces", default="", help="face counts to sweep, e.g. 1,2,4,8 (tiled frames)")
+    ap.add_argument("--check-warmup", action="store_true", help="only check the backends' warm-up steps")
+    ap.add_argument("--_worker", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.check_warmup:
+        ok, report = check_warmup(args.backends)
+        print(json.dumps({"ok": ok, "warmup": report}, indent=2))
+        sys.exit(0 if ok else 1)
+    if not args.frames:
+        ap.error("--frames is required")
+
+    if args._worker:
+        faces = [int(n) for n in args.faces.split(",") if n.strip()]
+        print(json.dumps(run_backend(args._worker, args.frames, args.max_frames, faces)))
+        return
+
+    results = {}
+    for name in args.backends:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--frames", args.frames,
+             "--max-frames", str(args.max_frames), "--faces", args.faces, "--_worker", name],
+            capture_output=True, text=True,
+        )
+        try:
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            results[name] = {"backend": name, "error": proc.stderr.strip().splitlines()[-1:]}
+
+    ref = args.reference or args.backends[0]
+    ref_labels = results.get(ref, {}).get("labels")
+    report = []
+    for r in results.values():
+        labels = r.pop("labels", None)
+        if ref_labels is not None and labels is not None:
+            r["agreement"] = agreement(ref_labels, labels)
+        report.append(r)
+    print(json.dumps({"reference": ref, "backends": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
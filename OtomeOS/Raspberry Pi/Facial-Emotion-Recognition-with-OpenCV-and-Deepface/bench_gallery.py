@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# bench_gallery.py
+"""
+Micro-benchmark for gallery.Gallery: enroll N random identities, then time
+/identify-style top-k searches. Prints JSON.
+
+    python3 bench_gallery.py --people 5000 --dim 128
+"""
+
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from gallery import Gallery
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--people", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=128)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((args.people, args.dim)).astype(np.float32)
+    g = Gallery(tempfile.mkdtemp(prefix="lumi-gallery-"))
+
+    t0 = time.perf_counter()
+    for i, v in enumerate(vecs):
+        g.enroll(f"p{i}", v)
+    enroll_ms = (time.perf_counter() - t0) * 1000.0 / args.people
+
+    lat, hits = [], 0
+    for i in rng.integers(0, args.people, args.queries):
+        q = vecs[i] + rng.standard_normal(args.dim).astype(np.float32) * 0.1
+        t = time.perf_counter()
+        top = g.search(q, args.k)
+        lat.append((time.perf_counter() - t) * 1000.0)
+        hits += top[0][0] == f"p{i}"
+
+    print(json.dumps({
+        "people": args.people, "dim": args.dim,
+        "enroll_ms_per_person": round(enroll_ms, 3),
+        "search_ms": {"p50": round(float(np.percentile(lat, 50)), 3),
+                      "p95": round(float(np.percentile(lat, 95)), 3)},
+        "top1_accuracy": round(hits / args.queries, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# bench_http.py
+"""
+HTTP load / soak benchmark for main.py while the vision loop runs.
+
+Starts the server as a subprocess on a fake camera (synthetic frames by
+default, or a recorded clip) with the stub backend (or a real one), waits
+for /ready, measures the vision rate alone for --baseline seconds, then
+drives --pollers clients hammering GET /status (like phones polling) and
+--posters clients alternating POST /display/text and /display/progress
+for --duration seconds. Reports, as JSON:
+
+    requests   per endpoint: count, errors, error rate, throughput and
+               latency p50/p95/p99/max
+    server     CPU% and RSS sampled every --sample seconds (the server and
+               its inference workers), mean/max, and the RSS slope, which
+               shows leaks on long --duration soak runs
+    vision     analyzed frames per second before and under load, from
+               /metrics, and the frame -> /status latency
+
+    python3 bench_http.py --pollers 8 --posters 2 --duration 30
+    python3 bench_http.py --camera clip.mp4 --backend engine --pollers 4 --duration 600
+    python3 bench_http.py --stub-latency-ms 80 --stub-spin --workers 1 --pollers 16
+    python3 bench_http.py --pollers 0 --posters 0     # sanity: no load, ~0% fps change
+
+The server runs with a fixed analysis stride (LUMI_ADAPTIVE=0): the adaptive
+scheduler changes its stride with the scene, and the synthetic clip moves
+through motion / static / empty phases, so the baseline and load windows
+would compare different phases rather than HTTP load. --adaptive keeps it on
+(for soak runs; the fps change is then not comparable). With no clients the
+run is a sanity check: it exits non-zero if the fps moved by more than
+IDLE_TOLERANCE_PCT.
+
+Clients are threads in this process, each with its own connection per
+request (the Flask dev server speaks HTTP/1.0). Use --interval 0 for
+closed-loop clients (next request as soon as the last one returns) to find
+the server's ceiling, or a delay to model phones polling at a fixed rate.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+ANALYZED_RE = re.compile(r'^lumi_frames_total\{outcome="analyzed"\} (\S+)$', re.M)
+LATENCY_RE = re.compile(r"^lumi_frame_to_status_seconds (\S+)$", re.M)
+IDLE_TOLERANCE_PCT = 5.0       # max |fps change| of a run without clients
+
+
+def _request(port, method, path, body=None, timeout=10.0):
+    """(status, latency_ms); status None on a connection error or timeout."""
+    t0 = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=body, headers=headers)
+        r = conn.getresponse()
+        r.read()
+        status = r.status
+    except (OSError, http.client.HTTPException):
+        status = None
+    finally:
+        conn.close()
+    return status, (time.perf_counter() - t0) * 1000.0
+
+
+def _get_text(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5.0)
+    try:
+        conn.request("GET", path)
+        r = conn.getresponse()
+        return r.status, r.read().decode("utf-8", "replace")
+    except (OSError, http.client.HTTPException):
+        return None, ""
+    finally:
+        conn.close()
+
+
+# ----------------- server process -----------------
+def _pids(pid):
+    """The server and its child processes (inference workers)."""
+    out = [pid]
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out += [int(c) for c in f.read().split()]
+    except OSError:
+        pass
+    return out
+
+
+def _cpu_rss(pids):
+    """(cpu seconds, RSS MB) summed over pids."""
+    cpu, rss = 0.0, 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss += int(line.split()[1]) / 1024.0
+        except (OSError, IndexError, ValueError):
+            pass
+    return cpu, rss
+
+
+class Sampler(threading.Thread):
+    def __init__(self, pid, every):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.every = every
+        self.samples = []     # (t, cpu_pct, rss_mb, phase)
+        self.phase = "baseline"
+        self._done = threading.Event()
+
+    def run(self):
+        t0 = time.time()
+        last_t, (last_cpu, _) = t0, _cpu_rss(_pids(self.pid))
+        while not self._done.wait(self.every):
+            now = time.time()
+            cpu, rss = _cpu_rss(_pids(self.pid))
+            pct = 100.0 * (cpu - last_cpu) / (now - last_t) if now > last_t else 0.0
+            self.samples.append((round(now - t0, 2), round(pct, 1), round(rss, 1), self.phase))
+            last_t, last_cpu = now, cpu
+
+    def stop(self):
+        self._done.set()
+        self.join(timeout=2.0)
+
+    def summary(self, phase):
+        xs = [s for s in self.samples if s[3] == phase]
+        if not xs:
+            return None
+        cpu = np.array([s[1] for s in xs])
+        rss = np.array([s[2] for s in xs])
+        t = np.array([s[0] for s in xs])
+        slope = float(np.polyfit(t, rss, 1)[0]) * 60.0 if len(xs) > 2 else None
+        return {"cpu_pct": {"mean": round(float(cpu.mean()), 1), "max": round(float(cpu.max()), 1)},
+                "rss_mb": {"start": float(rss[0]), "end": float(rss[-1]), "max": float(rss.max()),
+                           "slope_mb_per_min": None if slope is None else round(slope, 3)}}
+
+
+def start_server(args):
+    runtime = tempfile.mkdtemp(prefix="lumi-bench-")
+    env = dict(os.environ, LUMI_PORT=str(args.port), LUMI_EVENTS_PORT=str(args.port + 1),
+               LUMI_CAMERA=str(args.camera), LUMI_RUNTIME=runtime, LUMI_BACKEND=args.backend,
+               LUMI_WORKERS=str(args.workers), LUMI_LOOP="1", LUMI_ADAPTIVE="1" if args.adaptive else "0")
+    env.setdefault("LUMI_FB", "none")
+    # Like `python3 main.py`, plus the stub's simulated model time.
+    opts = {"latency_ms": args.stub_latency_ms, "spin": args.stub_spin} if args.backend == "stub" else {}
+    boot = f"import main; main.BACKEND_OPTIONS.update({opts!r}); main.main()"
+    return subprocess.Popen([sys.executable, "-c", boot], cwd=HERE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+
+
+def wait_ready(port, timeout):
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        status, _ = _get_text(port, "/ready")
+        if status == 200:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def vision_counters(port):
+    _, text = _get_text(port, "/metrics")
+    m = ANALYZED_RE.search(text)
+    lat = LATENCY_RE.search(text)
+    return (float(m.group(1)) if m else None, float(lat.group(1)) * 1000.0 if lat else None)
+
+
+# ----------------- clients -----------------
+class Client(threading.Thread):
+    def __init__(self, port, calls, interval, deadline, log):
+        super().__init__(daemon=True)
+        self.port = port
+        self.calls = calls        # [(endpoint label, method, path, body)], taken in turn
+        self.interval = interval
+        self.deadline = deadline
+        self.log = log            # endpoint -> [(status, ms)]
+
+    def run(self):
+        i = 0
+        while time.time() < self.deadline:
+            label, method, path, body = self.calls[i % len(self.calls)]
+            i += 1
+            self.log[label].append(_request(self.port, method, path, body))
+            if self.interval:
+                time.sleep(self.interval)
+
+
+def _endpoint_report(results, wall):
+    if not results:
+        return None
+    ok = np.array([ms for status, ms in results if status is not None and status < 400])
+    errors = sum(1 for status, _ in results if status is None or status >= 400)
+    rep = {"requests": len(results), "errors": errors,
+           "error_rate": round(errors / len(results), 4),
+           "rps": round(len(results) / wall, 1)}
+    if ok.size:
+        rep["latency_ms"] = {"p50": round(float(np.percentile(ok, 50)), 2),
+                             "p95": round(float(np.percentile(ok, 95)), 2),
+                             "p99": round(float(np.percentile(ok, 99)), 2),
+                             "max": round(float(ok.max()), 2)}
+    return rep
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--camera", default="synthetic:100000", help="LUMI_CAMERA: video file, image dir, synthetic[:N]")
+    ap.add_argument("--backend", default="stub")
+    ap.add_argument("--workers", type=int, default=0, help="LUMI_WORKERS")
+    ap.add_argument("--stub-latency-ms", type=float, default=30.0)
+    ap.add_argument("--stub-spin", action="store_true", help="burn the stub latency holding the GIL")
+    ap.add_argument("--adaptive", action="store_true", help="keep the adaptive scheduler on (LUMI_ADAPTIVE)")
+    ap.add_argument("--pollers", type=int, default=4, help="clients polling GET /status")
+    ap.add_argument("--posters", type=int, default=1, help="clients posting /display/text and /display/progress")
+    ap.add_argument("--interval", type=float, default=0.1, help="per-client delay between requests, seconds (0: closed loop)")
+    ap.add_argument("--status-path", default="/status", help="e.g. /status?embedding_hash=... or /status/<source>")
+    ap.add_argument("--baseline", type=float, default=5.0, help="seconds of vision-only load first")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds of client load")
+    ap.add_argument("--sample", type=float, default=1.0, help="CPU/RSS sampling period, seconds")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--timeout", type=float, default=180.0, help="seconds to wait for /ready")
+    ap.add_argument("--timeline", action="store_true", help="include every CPU/RSS sample in the report")
+    ap.add_argument("--verbose", action="store_true", help="show the server's log on stderr")
+    args = ap.parse_args()
+
+    proc = start_server(args)
+    try:
+        if not wait_ready(args.port, args.timeout):
+            raise SystemExit("server did not become ready")
+        sampler = Sampler(proc.pid, args.sample)
+        sampler.start()
+
+        # --- vision alone ---
+        n0, _ = vision_counters(args.port)
+        time.sleep(args.baseline)
+        n1, lat_base = vision_counters(args.port)
+
+        # --- vision + clients ---
+        sampler.phase = "load"
+        log = {"status": [], "display_text": [], "display_progress": []}
+        deadline = time.time() + args.duration
+        poll = [("status", "GET", args.status_path, None)]
+        post = [("display_text", "POST", "/display/text", json.dumps({"text": "Hello from the load test"})),
+                ("display_progress", "POST", "/display/progress", json.dumps({"image_id": "progress_50"}))]
+        clients = ([Client(args.port, poll, args.interval, deadline, log) for _ in range(args.pollers)]
+                   + [Client(args.port, post, args.interval, deadline, log) for _ in range(args.posters)])
+        t0 = time.time()
+        for c in clients:
+            c.start()
+        lat_load = []
+        while time.time() < deadline:
+            time.sleep(min(1.0, max(0.0, deadline - time.time())))
+            lat_load.append(vision_counters(args.port)[1])
+        for c in clients:
+            c.join(timeout=15.0)
+        wall = time.time() - t0
+        n2, _ = vision_counters(args.port)
+        sampler.stop()
+        alive = proc.poll() is None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    fps_base = (n1 - n0) / args.baseline if None not in (n0, n1) else None
+    fps_load = (n2 - n1) / wall if None not in (n1, n2) else None
+    fps_change = round(100.0 * (fps_load - fps_base) / fps_base, 1) if fps_base and fps_load is not None else None
+    idle = not args.pollers and not args.posters
+    lat_load = [v for v in lat_load if v is not None]
+    report = {
+        "config": {"camera": args.camera, "backend": args.backend, "workers": args.workers,
+                   "stub_latency_ms": args.stub_latency_ms if args.backend == "stub" else None,
+                   "adaptive": args.adaptive,
+                   "pollers": args.pollers, "posters": args.posters, "interval": args.interval,
+                   "duration": args.duration},
+        "requests": {k: _endpoint_report(v, wall) for k, v in log.items() if v},
+        "throughput_rps": round(sum(len(v) for v in log.values()) / wall, 1),
+        "server": {"baseline": sampler.summary("baseline"), "load": sampler.summary("load"),
+                   "alive_at_end": alive},
+        "vision": {
+            "fps_baseline": None if fps_base is None else round(fps_base, 2),
+            "fps_under_load": None if fps_load is None else round(fps_load, 2),
+            "fps_change_pct": fps_change,
+            "frame_to_status_ms": {"baseline": lat_base and round(lat_base, 1),
+                                   "load_max": round(max(lat_load), 1) if lat_load else None},
+        },
+    }
+    if args.timeline:
+        report["server"]["timeline"] = [{"t": t, "cpu_pct": c, "rss_mb": r, "phase": p}
+                                        for t, c, r, p in sampler.samples]
+    if idle:
+        report["vision"]["idle_check_ok"] = fps_change is not None and abs(fps_change) <= IDLE_TOLERANCE_PCT
+    print(json.dumps(report, indent=2))
+    if idle and not report["vision"]["idle_check_ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# bench_pipeline.py
+"""
+Offline replay benchmark for the whole vision pipeline.
+
+Frames come from a video file, an image directory or synthetic frames
+(sources.py) instead of the camera, and go through the same code the server
+runs, main.process_frame: capture -> detect/track -> emotion -> embedding
+-> aggregation (mood window, mood log, state publish). Reports per-stage
+p50/p95/p99 latency, achieved FPS, dropped frames and peak RSS as JSON.
+
+    python3 bench_pipeline.py --source synthetic:600 --backend stub
+    python3 bench_pipeline.py --source clip.mp4 --backend engine --pace realtime
+
+--pace fast      every --stride-th frame is analyzed as fast as possible;
+                 nothing is dropped and results are deterministic (compare
+                 "digest" between runs)
+--pace realtime  the source plays at its fps through capture.LatestFrameCapture,
+                 exactly like the camera; frames the analyzer is too slow for
+                 are dropped and counted
+--adaptive       let scheduler.AdaptiveScheduler pick the stride and skip
+                 unchanged frames, as the server does (its CPU budget only
+                 applies with --pace realtime, to keep fast replays deterministic)
+--workers N      analyze in N worker processes (inference_pool.py, as with
+                 LUMI_WORKERS); the "ipc" stage is the round-trip overhead
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import contextlib
+
+import numpy as np
+
+from bench_backends import rss_mb, peak_rss_mb
+
+STAGES = ("capture", "detect", "emotion", "embedding", "ipc", "analyze", "aggregate", "total")
+REPLAY_EPOCH = 1_700_000_000.0   # frame.ts of frame 0 in fast mode
+
+
+def _summary(xs):
+    if not xs:
+        return None
+    a = np.asarray(xs)
+    return {"n": int(a.size), "mean": round(float(a.mean()), 3),
+            "p50": round(float(np.percentile(a, 50)), 3),
+            "p95": round(float(np.percentile(a, 95)), 3),
+            "p99": round(float(np.percentile(a, 99)), 3)}
+
+
+def _digest_update(h, state):
+    faces = ",".join(f"{f['track_id']}:{f['emotion']}" for f in state["faces"])
+    h.update(f"{state['present']}|{state['emotion']}|{state['embedding_hash']}|{faces}\n".encode())
+
+
+def replay_fast(main, src, sched, max_frames, record):
+    from capture import Frame
+    skipped, next_index = 0, 0
+    while src.index + 1 < max_frames:
+        t0 = time.perf_counter()
+        if not src.grab():
+            break
+        if src.index < next_index:
+            skipped += 1
+            continue
+        next_index = src.index + sched.next_stride()
+        ok, img = src.retrieve()
+        if not ok:
+            break
+        cap_ms = (time.perf_counter() - t0) * 1000.0
+        frame = Frame(src.index, REPLAY_EPOCH + src.timestamp(), img)
+        record(frame, cap_ms)
+    return {"grabbed": src.index + 1, "skipped_stride": skipped, "dropped": 0}
+
+
+def replay_realtime(main, src, sched, max_frames, record):
+    from capture import LatestFrameCapture
+    grabber = LatestFrameCapture(src, main.FRAME_W, main.FRAME_H)
+    if not grabber.start():
+        raise SystemExit("could not open source")
+    seq, late = 0, 0
+    while True:
+        t0 = time.perf_counter()
+        stride = sched.next_stride()
+        frame = grabber.read(min_seq=seq + stride, timeout=2.0)
+        if frame is None:
+            if not src.isOpened() or src.index + 1 >= max_frames:
+                break
+            continue
+        if frame.seq > max_frames:
+            break
+        cap_ms = (time.perf_counter() - t0) * 1000.0
+        if seq:
+            late += frame.seq - (seq + stride)   # wanted frames the analyzer missed
+        seq = frame.seq
+        record(frame, cap_ms)
+        grabber.mark_published(frame)
+    grabber.stop()
+    st = grabber.stats()
+    return {"grabbed": st["grabbed"], "skipped_stride": st["grabbed"] - st["decoded"] - late,
+            "dropped": late, "capture": st}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--source", default="synthetic:600", help="video file, image dir or synthetic[:N]")
+    ap.add_argument("--backend", default="stub")
+    ap.add_argument("--pace", choices=("fast", "realtime"), default="fast")
+    ap.add_argument("--fps", type=float, default=None, help="source fps (default: file's, else 15)")
+    ap.add_argument("--stride", type=int, default=None, help="analyze every Nth frame (default: main.ANALYZE_EVERY_N_FRAMES)")
+    ap.add_argument("--adaptive", action="store_true", help="use the adaptive scheduler")
+    ap.add_argument("--max-frames", type=int, default=10 ** 9)
+    ap.add_argument("--workers", type=int, default=0, help="inference worker processes (0: in-process)")
+    ap.add_argument("--stub-latency-ms", type=float, default=0.0)
+    ap.add_argument("--stub-spin", action="store_true", help="burn the stub latency holding the GIL")
+    args = ap.parse_args()
+
+    # main.py builds its TFT, gallery and mood log at import: keep them off
+    # the real display and out of /app. Its prints go to stderr.
+    os.environ["LUMI_RUNTIME"] = tempfile.mkdtemp(prefix="lumi-bench-")
+    os.environ.setdefault("LUMI_FB", "none")
+    os.environ["LUMI_BACKEND"] = args.backend
+    os.environ["LUMI_WORKERS"] = str(args.workers)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        import main as server
+        import sources
+
+        rss0 = rss_mb()
+        t0 = time.perf_counter()
+        if args.backend == "stub":
+            server.BACKEND_OPTIONS.update(latency_ms=args.stub_latency_ms, spin=args.stub_spin)
+        server.load_models()
+        load_ms = (time.perf_counter() - t0) * 1000.0
+        rss_loaded = rss_mb()
+
+        stride = args.stride or server.ANALYZE_EVERY_N_FRAMES
+        if args.adaptive:
+            from scheduler import AdaptiveScheduler
+            sched = AdaptiveScheduler(base_stride=stride)
+            if args.pace == "fast":
+                sched.cpu_budget = float("inf")
+        else:
+            from scheduler import FixedScheduler
+            sched = FixedScheduler(stride)
+        src = sources.open_source(args.source, realtime=args.pace == "realtime", fps=args.fps)
+        if isinstance(src, int):
+            raise SystemExit("bench_pipeline replays recorded or synthetic frames, not a live camera")
+        if args.pace == "fast":
+            src.set(sources.cv2.CAP_PROP_FRAME_WIDTH, server.FRAME_W)
+            src.set(sources.cv2.CAP_PROP_FRAME_HEIGHT, server.FRAME_H)
+
+        lat = {k: [] for k in STAGES}
+        digest = hashlib.blake2b(digest_size=8)
+        present = 0
+        ctx = server.vision_context()
+
+        def record(frame, cap_ms):
+            nonlocal present
+            run, _ = sched.decide(frame)
+            if not run:
+                state, _ = server.process_frame(frame, ctx, out=ctx["last_out"])
+                _digest_update(digest, state)
+                return
+            state, tm = server.process_frame(frame, ctx)
+            sched.analyzed(frame, tm["analyze"], [f["box"] for f in state["faces"]])
+            tm["capture"] = cap_ms
+            tm["total"] = cap_ms + tm["analyze"] + tm["aggregate"]
+            for k, v in tm.items():
+                if k in lat:
+                    lat[k].append(v)
+            present += bool(state["present"])
+            _digest_update(digest, state)
+
+        wall0 = time.perf_counter()
+        replay = replay_fast if args.pace == "fast" else replay_realtime
+        counts = replay(server, src, sched, args.max_frames, record)
+        wall = time.perf_counter() - wall0
+        src.release()
+        engine = server.engine_stats()
+        if args.workers:
+            server._engine.close()
+
+    analyzed = len(lat["total"])
+    report = {
+        "source": args.source,
+        "backend": args.backend,
+        "pace": args.pace,
+        "stride": stride,
+        "scheduler": sched.stats(),
+        "source_fps": src.fps,
+        "frames": dict(counts, analyzed=analyzed, present=present),
+        "wall_sec": round(wall, 3),
+        "fps": {"analyzed": round(analyzed / wall, 2) if wall else None,
+                "source": round(counts["grabbed"] / wall, 2) if wall else None},
+        "latency_ms": {k: _summary(v) for k, v in lat.items() if v},
+        "load_ms": round(load_ms, 1),
+        "rss_mb": {"before_load": rss0, "after_load": rss_loaded, "after": rss_mb(), "peak": peak_rss_mb()},
+        "engine": engine,
+        "mood_windows": server.moodlog.stats()["records"],
+        "digest": digest.hexdigest(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
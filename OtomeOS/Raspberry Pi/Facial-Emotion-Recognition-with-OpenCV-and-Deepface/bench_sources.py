@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# bench_sources.py
+"""
+Multi-camera benchmark: several recorded or synthetic streams stand in for
+cameras and run through main.py's per-source pipelines (main.vision_loop,
+one thread each) against one engine or worker pool, exactly as with
+LUMI_CAMERAS. Reports, per source, analyzed / unchanged / shed frames and
+the achieved analysis FPS, plus the fair-share split and (in-process
+engines) how many ROIs were batched across cameras, as JSON.
+
+    python3 bench_sources.py --sources "a=clip1.mp4@2,b=clip2.mp4,c=synthetic:900@0.5"
+    python3 bench_sources.py --sources "a=synthetic@2,b=synthetic" --stub-latency-ms 80 --seconds 20
+
+Streams play at their fps and loop until --seconds is up. With a slow
+enough backend the lowest-priority stream is shed first.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+
+from bench_backends import rss_mb, peak_rss_mb
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sources", default="a=synthetic:900@2,b=synthetic:900",
+                    help="name=source[@priority],... (video files, image dirs, synthetic[:N])")
+    ap.add_argument("--backend", default="stub")
+    ap.add_argument("--seconds", type=float, default=15.0)
+    ap.add_argument("--workers", type=int, default=0, help="inference worker processes (0: in-process)")
+    ap.add_argument("--stub-latency-ms", type=float, default=0.0)
+    ap.add_argument("--stub-spin", action="store_true", help="burn the stub latency holding the GIL")
+    args = ap.parse_args()
+
+    os.environ["LUMI_RUNTIME"] = tempfile.mkdtemp(prefix="lumi-bench-")
+    os.environ.setdefault("LUMI_FB", "none")
+    os.environ["LUMI_BACKEND"] = args.backend
+    os.environ["LUMI_WORKERS"] = str(args.workers)
+    os.environ["LUMI_CAMERAS"] = args.sources
+    os.environ["LUMI_LOOP"] = "1"
+
+    with contextlib.redirect_stdout(sys.stderr):
+        import main as server
+
+        if args.backend == "stub":
+            server.BACKEND_OPTIONS.update(latency_ms=args.stub_latency_ms, spin=args.stub_spin)
+        server.load_models()
+        threads = [threading.Thread(target=server.vision_loop, args=(p,), daemon=True)
+                   for p in server.pipelines]
+        wall0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        server.stop_flag = True
+        for t in threads:
+            t.join(timeout=5.0)
+        wall = time.perf_counter() - wall0
+
+        per_source = {}
+        for p in server.pipelines:
+            st = p.engine_stats()
+            per_source[p.name] = {
+                "source": str(p.source),
+                "priority": p.priority,
+                "frames": dict(p.counts),
+                "analysis_fps": round(p.counts["analyzed"] / wall, 2),
+                "capture": p.grabber.stats() if p.grabber is not None else {},
+                "scheduler": p.scheduler.stats() if p.scheduler is not None else {},
+                "batching": st.get("batching"),
+            }
+        engine = server.engine_stats()
+        if args.workers:
+            server._engine.close()
+
+    report = {
+        "sources": per_source,
+        "backend": args.backend,
+        "workers": args.workers,
+        "wall_sec": round(wall, 3),
+        "fair_share": server.fair_share.stats() if server.fair_share is not None else None,
+        "engine": engine,
+        "rss_mb": {"after": rss_mb(), "peak": peak_rss_mb()},
+    }
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# bench_startup.py
+"""
+Startup-time benchmark for main.py.
+
+Launches the server as a subprocess (optionally on a recorded video instead
+of the camera) and measures, from process spawn:
+
+    t_http_s           first answer from /healthz
+    t_ready_s          first 200 from /ready (all models loaded + warmed up)
+    t_first_emotion_s  first /status with a face present from an analyzed frame
+
+plus the per-model load times reported by /healthz. Prints JSON.
+
+    python3 bench_startup.py --camera recorded.mp4 --runs 3
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _get(url, timeout=0.5):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            return r.status, json.loads(r.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read().decode("utf-8"))
+        except Exception:
+            return e.code, None
+    except Exception:
+        return None, None
+
+
+def run_once(args):
+    runtime = tempfile.mkdtemp(prefix="lumi-bench-")
+    env = dict(os.environ, LUMI_PORT=str(args.port), LUMI_CAMERA=str(args.camera),
+               LUMI_RUNTIME=runtime)
+    base = f"http://127.0.0.1:{args.port}"
+    t0 = time.time()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "main.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    res = {"t_http_s": None, "t_ready_s": None, "t_first_emotion_s": None, "models": {}}
+    try:
+        while time.time() - t0 < args.timeout and proc.poll() is None:
+            now = time.time() - t0
+            if res["t_http_s"] is None:
+                code, _ = _get(base + "/healthz")
+                if code == 200:
+                    res["t_http_s"] = round(now, 3)
+            elif res["t_ready_s"] is None:
+                code, body = _get(base + "/ready")
+                if code == 200:
+                    res["t_ready_s"] = round(now, 3)
+                    res["models"] = {k: v.get("load_ms") for k, v in body["models"].items()}
+            else:
+                code, body = _get(base + "/status")
+                if code == 200 and body.get("present") and body.get("frame_ts"):
+                    res["t_first_emotion_s"] = round(now, 3)
+                    break
+            time.sleep(args.poll)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return res
+
+
+def _median(runs, key):
+    vals = [r[key] for r in runs if r[key] is not None]
+    return round(statistics.median(vals), 3) if vals else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--camera", default="0", help="camera index or video file (LUMI_CAMERA)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--timeout", type=float, default=180.0, help="per-run timeout, seconds")
+    ap.add_argument("--poll", type=float, default=0.02, help="poll interval, seconds")
+    args = ap.parse_args()
+
+    runs = [run_once(args) for _ in range(args.runs)]
+    print(json.dumps({
+        "runs": runs,
+        "median": {k: _median(runs, k) for k in ("t_http_s", "t_ready_s", "t_first_emotion_s")},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
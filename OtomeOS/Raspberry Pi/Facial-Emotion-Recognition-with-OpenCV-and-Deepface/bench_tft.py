@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# bench_tft.py
+"""
+Micro-benchmark for tft.TFT: draws per second for the original draw path
+(decode PNG / wrap by re-measuring / JPEG to disk on every draw) against the
+precomputed one (preloaded progress frames, cached text frames and word
+widths, framebuffer blit). Prints JSON.
+
+    python3 bench_tft.py --seconds 2
+    LUMI_FB=/dev/fb1 python3 bench_tft.py      # blit to a real panel
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from PIL import Image, ImageDraw
+
+import tft as tftmod
+from tft import TFT
+
+SAMPLE_TEXT = [
+    "Hi Lumi! Ready for today's practice?",
+    "You did great yesterday, let's keep the streak going.",
+    "Take a deep breath. We can try that one again.",
+    "Almost there: one more exercise and you're done!",
+]
+
+
+def legacy_text(t, text, out):
+    img = Image.new("RGB", (t.w, t.h), (0, 0, 0))
+    d = ImageDraw.Draw(img)
+    lines, line = [], ""
+    for w in text.split():
+        if d.textlength((line + " " + w).strip(), font=t.font) > (t.w - 16):
+            if line: lines.append(line)
+            line = w
+        else:
+            line = (line + " " + w).strip()
+    if line: lines.append(line)
+    y = 8
+    for ln in lines[:10]:
+        d.text((8, y), ln, font=t.font, fill=(255, 255, 255))
+        y += 22
+    img.save(out, quality=92)
+
+
+def legacy_image(t, path, out):
+    Image.open(path).convert("RGB").resize((t.w, t.h)).save(out, quality=92)
+
+
+def rate(fn, seconds):
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        fn(n)
+        n += 1
+    return round(n / (time.perf_counter() - t0), 1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=2.0, help="per measurement")
+    ap.add_argument("--size", type=int, default=240)
+    ap.add_argument("--preview", action="store_true", help="keep the throttled JPEG preview on")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="lumi-tft-")
+    files = {}
+    for pct in (0, 25, 50, 75, 100):
+        files[pct] = os.path.join(tmp, f"{pct}.png")
+        Image.new("RGB", (480, 480), (pct * 2, 80, 255 - pct * 2)).save(files[pct])
+    out = os.path.join(tmp, "tft_preview.jpg")
+
+    tftmod.PREVIEW_JPEG = args.preview
+    t = TFT(args.size, args.size, preview_dir=tmp)
+    t.preload_progress(files)
+    pcts = sorted(files)
+
+    # Unique strings defeat the frame cache: measures render + cached word widths.
+    report = {
+        "framebuffer": t.fb.device or "memory",
+        "bpp": t.fb.bpp,
+        "draws_per_sec": {
+            "legacy_progress": rate(lambda i: legacy_image(t, files[pcts[i % 5]], out), args.seconds),
+            "progress": rate(lambda i: t.show_progress(pcts[i % 5]), args.seconds),
+            "legacy_text": rate(lambda i: legacy_text(t, SAMPLE_TEXT[i % 4], out), args.seconds),
+            "text_uncached": rate(lambda i: t.show_text(f"{SAMPLE_TEXT[i % 4]} #{i}"), args.seconds),
+            "text_cached": rate(lambda i: t.show_text(SAMPLE_TEXT[i % 4]), args.seconds),
+        },
+        "stats": t.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# capture.py
+"""
+Latest-frame camera capture for the Pi server.
+
+A dedicated thread keeps calling `grab()` so the V4L2 queue never fills up
+with old frames. Frames are only decoded (`retrieve()`) when the analyzer is
+actually waiting for one, and only the newest decoded frame is kept in a
+single-slot buffer. Whatever the analyzer gets is therefore at most one frame
+interval old, no matter how long the previous analysis took.
+
+    grabber = LatestFrameCapture(0, 320, 240)
+    grabber.start()
+    frame = grabber.read(min_seq=last_seq + 1)   # -> Frame(seq, ts, image)
+"""
+
+import time
+import threading
+from collections import namedtuple
+
+import cv2
+
+# A frame is considered stale if its result reaches /status later than this.
+STALE_FRAME_SEC = 0.25
+
+Frame = namedtuple("Frame", ["seq", "ts", "image"])
+
+
+class LatestFrameCapture:
+    """Grab continuously, decode on demand, hand out only the newest frame."""
+
+    def __init__(self, source=0, width=None, height=None, stale_sec=STALE_FRAME_SEC):
+        self.source = source
+        self.width, self.height = width, height
+        self.stale_sec = stale_sec
+
+        self._cap = None
+        self._thread = None
+        self._stop = False
+        self._cond = threading.Condition()
+
+        self._slot = None          # newest decoded Frame
+        self._want_seq = None      # set while a reader is waiting
+        self._seq = 0              # sequence number of the last grab
+
+        # counters (read via stats())
+        self.grabbed = 0
+        self.decoded = 0
+        self.dropped = 0           # grabbed but never decoded/handed out
+        self.stale = 0             # results published later than stale_sec
+        self.failed_grabs = 0
+        self.last_latency_ms = 0.0
+
+    # ---------- lifecycle ----------
+    def open(self):
+        cap = self.source if hasattr(self.source, "grab") else cv2.VideoCapture(self.source)
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        # Ask the driver for the smallest queue it supports; the grab loop
+        # drains whatever is left.
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._cap = cap
+        return cap.isOpened()
+
+    def start(self):
+        if self._cap is None and not self.open():
+            print("[Camera] Could not open camera", self.source)
+            return False
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop = True
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        try:
+            self._cap.release()
+        except Exception:
+            pass
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- producer ----------
+    def _run(self):
+        cap = self._cap
+        while not self._stop:
+            if not cap.grab():
+                self.failed_grabs += 1
+                time.sleep(0.03)
+                continue
+            ts = time.time()
+            with self._cond:
+                self._seq += 1
+                self.grabbed += 1
+                seq = self._seq
+                want = self._want_seq
+            if want is None or seq < want:
+                # Nobody is waiting (or the reader asked to skip ahead):
+                # leave it undecoded and move on.
+                self.dropped += 1
+                continue
+            ok, image = cap.retrieve()
+            if not ok:
+                self.failed_grabs += 1
+                continue
+            with self._cond:
+                self.decoded += 1
+                self._slot = Frame(seq, ts, image)
+                self._want_seq = None
+                self._cond.notify_all()
+
+    # ---------- consumer ----------
+    def read(self, min_seq=0, timeout=1.0):
+        """
+        Block until a frame with seq >= min_seq has been grabbed *after* this
+        call and return it. Returns None on timeout or stop.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            want = max(min_seq, self._seq + 1)
+            self._want_seq = want
+            while not self._stop:
+                slot = self._slot
+                if slot is not None and slot.seq >= want:
+                    self._slot = None
+                    return slot
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._want_seq = None
+        return None
+
+    def mark_published(self, frame: Frame):
+        """Record frame -> /status latency once a frame's result is visible."""
+        age = time.time() - frame.ts
+        self.last_latency_ms = age * 1000.0
+        if age > self.stale_sec:
+            self.stale += 1
+
+    def stats(self) -> dict:
+        return {
+            "grabbed": self.grabbed,
+            "decoded": self.decoded,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "failed_grabs": self.failed_grabs,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+        }
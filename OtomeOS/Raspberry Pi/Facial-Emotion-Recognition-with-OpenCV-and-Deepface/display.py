@@ -0,0 +1,148 @@
+# display.py
+"""
+Single render worker for the TFT.
+
+main.py used to poll every 100 ms (ui_heartbeat) and also draw straight from
+Flask request threads, so the same content was rendered twice, concurrent
+posts raced on the TFT and a button press waited for the next poll. Now the
+HTTP handlers and the GPIO callback only record the wanted display state
+(mode, text, progress) under a Condition and notify; one worker thread owns
+the TFT and draws whatever is wanted when it wakes:
+
+- any number of updates that arrive while it is drawing, or within
+  COALESCE_SEC of the first one, collapse into one draw of the latest state,
+- a mode toggle skips the coalescing wait and redraws immediately,
+- nothing is drawn when the wanted frame is already on screen.
+"""
+
+import time
+import threading
+
+MODE_TEXT = "text"
+MODE_PROGRESS = "progress"
+
+COALESCE_SEC = 0.02
+
+
+class DisplayScheduler:
+    def __init__(self, tft, mode=MODE_PROGRESS, text="", progress=0):
+        self.tft = tft
+        self._cond = threading.Condition()
+        self._mode, self._text, self._progress = mode, text, progress
+        self._pending = 0        # commands since the worker last looked
+        self._urgent = False     # a mode change is pending
+        self._stop = False
+        self._drawn = None       # (mode, content) on screen
+        self._thread = None
+        self.commands = 0
+        self.draws = 0
+        self.coalesced = 0       # commands folded into another command's draw
+        self.unchanged = 0       # wakeups where the frame was already on screen
+        self.last_draw_ms = 0.0
+
+    # ---------- wanted state (any thread, never touches PIL) ----------
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def progress(self):
+        return self._progress
+
+    def _submit(self, urgent=False, **changes):
+        with self._cond:
+            for k, v in changes.items():
+                setattr(self, "_" + k, v)
+            self.commands += 1
+            self._pending += 1
+            self._urgent = self._urgent or urgent
+            self._cond.notify()
+
+    def set_text(self, text):
+        self._submit(text=text)
+
+    def set_progress(self, pct):
+        self._submit(progress=pct)
+
+    def set_mode(self, mode):
+        self._submit(urgent=True, mode=mode)
+
+    def toggle_mode(self):
+        with self._cond:
+            mode = MODE_TEXT if self._mode == MODE_PROGRESS else MODE_PROGRESS
+            self._submit(urgent=True, mode=mode)   # Condition's lock is re-entrant
+        return mode
+
+    # ---------- worker ----------
+    def splash(self, text):
+        """Draw a one-off text frame; only for use before start()."""
+        self.tft.show_text(text)
+        self._drawn = ("splash", text)
+
+    def start(self):
+        with self._cond:
+            self._pending += 1       # draw the initial state
+        self._thread = threading.Thread(target=self._run, name="display", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def _next(self):
+        """Block until there is something to draw; returns the wanted frame."""
+        with self._cond:
+            while not self._pending and not self._stop:
+                self._cond.wait()
+            if not self._urgent and COALESCE_SEC:
+                deadline = time.time() + COALESCE_SEC
+                while not self._urgent and not self._stop:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.coalesced += max(0, self._pending - 1)
+            self._pending, self._urgent = 0, False
+            if self._stop:
+                return None
+            if self._mode == MODE_TEXT:
+                return (MODE_TEXT, self._text)
+            return (MODE_PROGRESS, self._progress)
+
+    def _run(self):
+        while True:
+            want = self._next()
+            if want is None:
+                return
+            if want == self._drawn:
+                self.unchanged += 1
+                continue
+            t0 = time.perf_counter()
+            try:
+                if want[0] == MODE_TEXT:
+                    self.tft.show_text(want[1])
+                elif not self.tft.show_progress(want[1]):
+                    print(f"[Display] no progress image for {want[1]}")
+                    continue
+                self._drawn = want
+                self.draws += 1
+            except Exception as e:
+                print("[Display] draw error:", e)
+            self.last_draw_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+
+    def stats(self):
+        return {
+            "mode": self._mode,
+            "pending": self._pending,
+            "commands": self.commands,
+            "draws": self.draws,
+            "coalesced": self.coalesced,
+            "unchanged": self.unchanged,
+            "last_draw_ms": self.last_draw_ms,
+        }
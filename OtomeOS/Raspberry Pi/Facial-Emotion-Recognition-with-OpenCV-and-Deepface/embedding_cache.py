@@ -0,0 +1,192 @@
+# embedding_cache.py
+"""
+Per-track Facenet embedding cache.
+
+Facenet is the most expensive call in the vision loop, and the answer does
+not change while the same person stays in front of the camera. So the
+embedding is tied to a face track instead of a frame:
+
+- a new track starts pooling: the first POOL_FRAMES good crops are embedded
+  and averaged into one L2-normalized vector,
+- after that the pooled vector is returned as-is (a cache hit),
+- every REVERIFY_SEC one fresh embedding is computed and compared against the
+  pooled one; if the cosine similarity falls below VERIFY_MIN_COS the person
+  probably changed under the tracker and pooling starts over,
+- when the track ends the vector is dropped.
+
+The cache holds one track: the main face's. pick_main() keeps the main face
+on the same track until another face is clearly larger, so two people of
+about the same size do not take turns and throw the pooled vector away.
+
+get_async() runs the same lookup on the cache's own model thread (one
+persistent worker), so an engine can run the emotion model on the same face
+meanwhile; TensorFlow and cv2.dnn release the GIL while they compute.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+POOL_FRAMES = 5
+REVERIFY_SEC = 10.0
+VERIFY_MIN_COS = 0.6
+MAIN_SWITCH_RATIO = 1.5   # another face must be this much larger to become the main face
+
+
+def l2_normalize(v):
+    v = np.asarray(v, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+
+def box_iou(a, b):
+    """IoU of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def pick_main(areas, current=None, switch_ratio=MAIN_SWITCH_RATIO):
+    """
+    Index of the main face among `areas`: the current main face (its index,
+    None if it is gone) unless another is switch_ratio times larger.
+    """
+    largest = max(range(len(areas)), key=areas.__getitem__)
+    if current is None or areas[largest] > switch_ratio * areas[current]:
+        return largest
+    return current
+
+
+class TrackIdAssigner:
+    """
+    Cheap track ids for pipelines without a real tracker: a box that overlaps
+    the previous one by at least min_iou keeps the same id.
+    """
+
+    def __init__(self, min_iou=0.3):
+        self.min_iou = min_iou
+        self.track_id = 0
+        self._last_box = None
+
+    @property
+    def last_box(self):
+        return self._last_box
+
+    def assign(self, box):
+        if box is None:
+            self._last_box = None
+            return None
+        if self._last_box is None or box_iou(self._last_box, box) < self.min_iou:
+            self.track_id += 1
+        self._last_box = box
+        return self.track_id
+
+
+class TrackEmbeddingCache:
+    def __init__(self, pool_frames=POOL_FRAMES, reverify_sec=REVERIFY_SEC,
+                 verify_min_cos=VERIFY_MIN_COS):
+        self.pool_frames = pool_frames
+        self.reverify_sec = reverify_sec
+        self.verify_min_cos = verify_min_cos
+
+        self.track_id = None
+        self._sum = None          # running sum of pooled samples
+        self._n = 0
+        self._vec = None          # current L2-normalized embedding
+        self._last_compute = 0.0
+        self._executor = None     # model thread for get_async()
+
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.reverify_failures = 0
+
+    @property
+    def pooled(self):
+        return self._n >= self.pool_frames
+
+    def end_track(self):
+        self.track_id = None
+        self._sum = None
+        self._n = 0
+        self._vec = None
+
+    def _add_sample(self, v):
+        self._sum = v.copy() if self._sum is None else self._sum + v
+        self._n += 1
+        self._vec = l2_normalize(self._sum)
+
+    def due(self, track_id, now=None):
+        """True if get(track_id, ...) would call compute() (so it is worth running off-thread)."""
+        now = time.time() if now is None else now
+        return (track_id != self.track_id or not self.pooled
+                or now - self._last_compute >= self.reverify_sec)
+
+    def get(self, track_id, compute, now=None):
+        """
+        Return the embedding for track_id. `compute()` is only called while
+        the track is still pooling or when a re-verify is due; it should
+        return a vector or None.
+        """
+        now = time.time() if now is None else now
+        if track_id != self.track_id:
+            self.end_track()
+            self.track_id = track_id
+
+        if self.pooled and now - self._last_compute < self.reverify_sec:
+            self.hits += 1
+            return self._vec
+
+        self.misses += 1
+        v = compute()
+        if v is None:
+            return self._vec
+        v = l2_normalize(v)
+        self._last_compute = now
+
+        if self.pooled:
+            if float(np.dot(v, self._vec)) < self.verify_min_cos:
+                # Different person under the same track: start over.
+                self.reverify_failures += 1
+                self._sum, self._n = None, 0
+                self._add_sample(v)
+            return self._vec
+
+        self._add_sample(v)
+        return self._vec
+
+    def _timed_get(self, track_id, compute, now):
+        t0 = time.perf_counter()
+        v = self.get(track_id, compute, now)
+        return v, (time.perf_counter() - t0) * 1000.0
+
+    def get_async(self, track_id, compute, now=None):
+        """
+        get() on the model thread: a Future of (vector, ms). A cache hit is
+        answered right away without a thread hop.
+        """
+        if not self.due(track_id, now):
+            f = Future()
+            f.set_result(self._timed_get(track_id, compute, now))
+            return f
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="facenet")
+        return self._executor.submit(self._timed_get, track_id, compute, now)
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "reverify_failures": self.reverify_failures,
+            "track_id": self.track_id,
+            "pooled": self.pooled,
+            "sec_since_recompute": round(now - self._last_compute, 1) if self._last_compute else None,
+        }
@@ -2,7 +2,13 @@
 import cv2
 import time
 import numpy as np
-from deepface import DeepFace
+
+from aggregator import SlidingWindowAggregator
+from embedding_cache import TrackEmbeddingCache, box_iou, pick_main
+from models import LAZY_MODELS, MANAGER, drop_deepface_model
+from moodlog import classify as classify_window
+from quality import QualityGate
+from roi_cache import RoiCache, dhash
 
 # ---------------- Config ----------------
 # Windowing / decision rules
@@ -84,17 +90,39 @@ def draw_hearts_row(img, hearts_on, total=5, size=HEART_SIZE, gap=HEART_GAP, ori
         draw_heart(img, (cx, cy), size, filled=True, on=(i < hearts_on))
 
 # ---------------- DeepFace (version-agnostic) ----------------
+# deepface pulls in TensorFlow, which takes seconds to import on a Pi. It is
+# imported on first use so `import emotion` stays cheap and main.py can bring
+# up its HTTP server before the models are loaded.
+_DeepFace = None
+
+def deepface():
+    global _DeepFace
+    if _DeepFace is None:
+        from deepface import DeepFace
+        _DeepFace = DeepFace
+    return _DeepFace
+
 def get_top_emotion_from_gray_face(img48gray):
     """
-    Takes a grayscale face crop (any size; we'll convert to RGB).
-    Uses DeepFace.analyze with detector 'skip' and returns the top emotion label and prob.
+    Takes a grayscale face crop (any size) and returns the top emotion label and prob.
+    Goes straight to the emotion model (EmotionClassifier); if that cannot be
+    built for this deepface version, falls back to DeepFace.analyze.
     """
+    try:
+        clf = get_classifier()
+    except Exception:
+        clf = None
+    if clf is not None:
+        probs = clf.predict_one(img48gray)
+        k = int(np.argmax(probs))
+        return emotion_labels[k], float(probs[k])
+
     if len(img48gray.shape) == 2:
         rgb = cv2.cvtColor(img48gray, cv2.COLOR_GRAY2RGB)
     else:
         rgb = cv2.cvtColor(img48gray, cv2.COLOR_BGR2RGB)
 
-    result = DeepFace.analyze(
+    result = deepface().analyze(
         rgb, actions=['emotion'], detector_backend='skip', enforce_detection=False
     )
 
@@ -115,55 +143,514 @@ def get_top_emotion_from_gray_face(img48gray):
     top_prob  = scores[top_label]
     return top_label, float(top_prob)
 
-# ---------------- Main loop ----------------
-cap = cv2.VideoCapture(0)
-tracker = None
-tracking = False
-lost_frames = 0
+def load_facenet_model():
+    """Build (and so cache inside DeepFace) the Facenet model DeepFace.represent uses."""
+    try:
+        return deepface().build_model(task="facial_recognition", model_name="Facenet")
+    except TypeError:  # older deepface: build_model(model_name)
+        return deepface().build_model(model_name="Facenet")
+
+# Facenet is resident only while embeddings are being computed (models.py).
+MANAGER.register("facenet", load_facenet_model, lambda _: drop_deepface_model("Facenet"),
+                 source="deepface:Facenet")
+
+def get_embedding_from_face(face_bgr):
+    """
+    Facenet embedding for an already-cropped face (no second detector pass).
+    Returns an L2-normalized float32 vector or None.
+    """
+    with MANAGER.use("facenet"):
+        reps = deepface().represent(
+            img_path=face_bgr, model_name="Facenet", detector_backend='skip', enforce_detection=False
+        )
+    if isinstance(reps, list) and reps and "embedding" in reps[0]:
+        v = np.array(reps[0]["embedding"], dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n > 0 else v
+    return None
+
+# ---------------- Emotion model fast path ----------------
+EMOTION_INPUT = 48
+
+def load_emotion_model():
+    """The raw Keras emotion model behind DeepFace."""
+    try:
+        m = deepface().build_model(task="facial_attribute", model_name="Emotion")
+    except TypeError:  # older deepface: build_model(model_name)
+        m = deepface().build_model(model_name="Emotion")
+    return getattr(m, "model", m)
+
+class EmotionClassifier:
+    """
+    Feeds 48x48 grayscale crops straight into the emotion model.
+
+    DeepFace.analyze(detector_backend='skip') re-converts, resizes, builds
+    per-face dicts and rescales scores on every call; at our input size that
+    overhead is larger than the model itself. Here the model is loaded once,
+    crops are resized into a preallocated uint8 scratch and scaled into a
+    preallocated float32 (N, 48, 48, 1) batch, and the model is called
+    directly. Output is the raw softmax vector over emotion_labels.
+
+    Without an explicit `model`, the Keras model is borrowed per call from
+    the model manager (models.py) as "emotion".
+    """
+
+    def __init__(self, model=None, max_batch=8):
+        self.model = model
+        if model is None:
+            MANAGER.register("emotion", load_emotion_model, lambda _: drop_deepface_model("Emotion"),
+                             source="deepface:Emotion", idle_sec=None)
+        self._scratch = np.empty((EMOTION_INPUT, EMOTION_INPUT), np.uint8)
+        self._batch = np.empty((max_batch, EMOTION_INPUT, EMOTION_INPUT, 1), np.float32)
+
+    def _fill(self, i, gray):
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        if gray.shape != self._scratch.shape:
+            cv2.resize(gray, (EMOTION_INPUT, EMOTION_INPUT), dst=self._scratch,
+                       interpolation=cv2.INTER_AREA)
+            gray = self._scratch
+        np.multiply(gray, 1.0 / 255.0, out=self._batch[i, :, :, 0], casting="unsafe")
+
+    def _run(self, x):
+        if self.model is not None:
+            return self._call(self.model, x)
+        with MANAGER.use("emotion") as model:
+            return self._call(model, x)
+
+    @staticmethod
+    def _call(model, x):
+        if callable(model) and hasattr(model, "layers"):
+            # model(x) skips predict()'s per-call data-adapter setup.
+            return np.asarray(model(x, training=False))
+        return np.asarray(model.predict(x, verbose=0))
+
+    def predict_proba(self, gray_faces):
+        """(N, 7) float32 probabilities for N grayscale crops of any size."""
+        n = len(gray_faces)
+        if n > len(self._batch):
+            self._batch = np.empty((n,) + self._batch.shape[1:], np.float32)
+        for i, g in enumerate(gray_faces):
+            self._fill(i, g)
+        probs = self._run(self._batch[:n])
+        return probs.astype(np.float32, copy=False).reshape(n, len(emotion_labels))
+
+    def predict_one(self, gray):
+        return self.predict_proba((gray,))[0]
+
+_classifier = None
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        _classifier = EmotionClassifier(max_batch=MAX_FACES)
+    return _classifier
+
+def classify_faces(gray_rois):
+    """
+    Classify every face crop with a single model call.
+    gray_rois: list of grayscale crops (any size).
+    Returns an (N, 7) float32 array of probabilities in emotion_labels order.
+    """
+    return get_classifier().predict_proba(gray_rois)
+
+# ---------------- Engine (importable, used by main.py) ----------------
 LOST_LIMIT = 20
+REDETECT_EVERY = 15   # analyzed frames between detector passes while tracking
+MAX_FACES = 8
+
+def clip_box(box, frame_shape):
+    """Clamp an (x, y, w, h) box to the frame; returns (x, y, x2, y2)."""
+    x, y, w, h = [int(v) for v in box]
+    x = max(0, x); y = max(0, y)
+    w = max(1, w); h = max(1, h)
+    x2 = min(frame_shape[1], x + w)
+    y2 = min(frame_shape[0], y + h)
+    return x, y, x2, y2
 
-hearts = HEARTS_START
+class FaceTrack:
+    __slots__ = ("track_id", "tracker", "box", "lost_frames")
 
-# Tumbling window state
-win_start = time.time()
-pos_count = 0
-neg_count = 0
-neu_count = 0
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.tracker = None
+        self.box = box
+        self.lost_frames = 0
 
-while True:
-    ok_ret, frame = cap.read()
-    if not ok_ret:
-        break
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def lock(self, frame_bgr, box):
+        self.box = box
+        self.lost_frames = 0
+        self.tracker = create_tracker()
+        if self.tracker is not None:
+            self.tracker.init(frame_bgr, box)
 
-    # --- Track existing lock ---
-    if tracking and tracker is not None:
-        ok, bbox = tracker.update(frame)
-        if ok:
-            x, y, w, h = [int(v) for v in bbox]
-            lost_frames = 0
-        else:
-            lost_frames += 1
-            if lost_frames >= LOST_LIMIT:
-                tracking = False
-                tracker = None
+class EmotionEngine:
+    """
+    Detect once, then track.
+
+    The Haar cascade only runs while there is no lock on any face, plus one
+    pass every REDETECT_EVERY analyzed frames to pick up people who walk in.
+    Each face gets its own CSRT/KCF tracker and track_id; a track is dropped
+    after LOST_LIMIT consecutive tracker failures.
 
-    # --- Acquire lock if needed ---
-    if not tracking:
+    Every tracked ROI first goes through the quality gate (quality.py):
+    blurry, small, badly exposed or profile faces are not classified (their
+    face dict carries `skip_reason`) and count as not classified. The rest
+    are classified together in one batched model call (classify_faces), so
+    the cost grows far slower than the face count. Each face carries its
+    `quality` score.
+
+    Before that, each ROI's dHash is looked up in the ROI cache (roi_cache.py):
+    a face that looks the same as a moment ago on the same track reuses the
+    cached emotion probabilities (and Facenet vector) and skips the models.
+    Entries of tracks that end are dropped, and so are those of a track
+    whose embedding stops matching (a different person under the tracker).
+
+    The largest face is the "main" face, and it stays main until another face
+    is MAIN_SWITCH_RATIO times larger or its track ends (embedding_cache.
+    pick_main). It fills the top-level fields, and its embedding is cached
+    per track (see embedding_cache.TrackEmbeddingCache), so Facenet runs a
+    handful of times per person instead of on every frame.
+    When it does run, it runs on the cache's model thread while the emotion
+    model classifies the same crops here, so the two models overlap. The
+    caller can set `want_embedding` to False while nobody consumes
+    embeddings; Facenet then stays idle (and is unloaded, see models.py).
+
+    The models are pluggable: `classifier` is anything with
+    predict_proba(gray_crops) -> (N, 7) and `embedder` any callable
+    face_bgr -> vector (see backends.py for the cv2.dnn ones). By default the
+    DeepFace Keras models are used.
+
+    analyze(frame_bgr) returns the dict main.py expects:
+        { present, dominant_emotion, emotion_conf, embedding, box, classified, track_id,
+          quality, skip_reason,
+          faces: [ { track_id, box, dominant_emotion, emotion_conf, classified, quality } ],
+          timings: { detect, quality, cache, emotion, embedding, models } (ms, stages that ran;
+                     models = wall time of emotion + embedding together) }
+    """
+
+    def __init__(self, with_embedding=True, lost_limit=LOST_LIMIT,
+                 redetect_every=REDETECT_EVERY, max_faces=MAX_FACES,
+                 classifier=None, embedder=None, quality_gate=True, roi_cache=True):
+        self._classifier = classifier
+        # no Facenet at all when embeddings are off (keeps TensorFlow out for dnn)
+        self.embedder = embedder or (get_embedding_from_face if with_embedding else None)
+        self.with_embedding = with_embedding
+        self.want_embedding = True
+        self.lost_limit = lost_limit
+        self.redetect_every = redetect_every
+        self.max_faces = max_faces
+        self.tracks = []
+        self.track_id = 0     # last id handed out
+        self.main_track = None  # track_id of the main face
+        self.detections = 0   # how many times the detector had to run
+        self._since_detect = 0
+        self.embeddings = TrackEmbeddingCache()
+        self.quality = QualityGate(enforce=quality_gate)
+        self.roi_cache = RoiCache() if roi_cache else None
+
+    def clone(self):
+        """Same models, fresh tracks and embedding cache (one engine per camera)."""
+        return EmotionEngine(self.with_embedding, self.lost_limit, self.redetect_every, self.max_faces,
+                             classifier=self.classifier, embedder=self.embedder,
+                             quality_gate=self.quality.enforce, roi_cache=self.roi_cache is not None)
+
+    @property
+    def classifier(self):
+        if self._classifier is None:
+            self._classifier = get_classifier()
+        return self._classifier
+
+    def reset(self):
+        self.tracks = []
+        self.main_track = None
+        self.embeddings.end_track()
+        if self.roi_cache is not None:
+            self.roi_cache.retain(())
+
+    def _embed(self, track_id, h, face_bgr):
+        """Facenet for the main face, unless the ROI cache has this crop."""
+        if self.roi_cache is None or h is None:
+            return self.embedder(face_bgr)
+        v = self.roi_cache.get(track_id, "embedding", h)
+        if v is None:
+            t0 = time.perf_counter()
+            v = self.embedder(face_bgr)
+            self.roi_cache.put(track_id, "embedding", h, v, (time.perf_counter() - t0) * 1000.0)
+        return v
+
+    def _detect(self, frame_bgr, gray):
+        self.detections += 1
+        self._since_detect = 0
         faces = face_cascade.detectMultiScale(
             gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60)
         )
-        main_face = pick_main_face(faces)
-        if main_face is not None:
-            x, y, w, h = main_face
-            tracker = create_tracker()
-            if tracker is not None:
-                tracker.init(frame, (x, y, w, h))
-                tracking = True
-                lost_frames = 0
+        faces = sorted((tuple(int(v) for v in f) for f in faces),
+                       key=lambda b: b[2] * b[3], reverse=True)[:self.max_faces]
+
+        matched = set()
+        for box in faces:
+            best, best_iou = None, 0.3
+            for t in self.tracks:
+                if t.track_id in matched:
+                    continue
+                iou = box_iou(t.box, box)
+                if iou >= best_iou:
+                    best, best_iou = t, iou
+            if best is None:
+                self.track_id += 1
+                best = FaceTrack(self.track_id, box)
+                self.tracks.append(best)
+            best.lock(frame_bgr, box)
+            matched.add(best.track_id)
+
+        # Tracks the detector did not confirm survive only if a tracker
+        # still follows them (Haar misses faces that CSRT holds fine).
+        self.tracks = [t for t in self.tracks
+                       if t.track_id in matched or t.tracker is not None]
+
+    def locate(self, frame_bgr, gray=None):
+        """Advance all tracks (detecting only when needed); returns the live FaceTracks."""
+        # --- Track existing locks ---
+        live = []
+        untracked = False
+        for t in self.tracks:
+            if t.tracker is None:
+                # No tracker available in this OpenCV build: the detector
+                # re-confirms the box (and keeps the track_id) every frame.
+                untracked = True
+            else:
+                ok, bbox = t.tracker.update(frame_bgr)
+                if ok:
+                    t.box = tuple(int(v) for v in bbox)
+                    t.lost_frames = 0
+                else:
+                    t.lost_frames += 1
+            if t.lost_frames < self.lost_limit:
+                live.append(t)
+        self.tracks = live
+        self._since_detect += 1
+
+        # --- Acquire locks if needed ---
+        if not self.tracks or untracked or self._since_detect >= self.redetect_every:
+            if gray is None:
+                gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+            self._detect(frame_bgr, gray)
+        return self.tracks
+
+    def analyze(self, frame_bgr):
+        out = {
+            "present": False,
+            "dominant_emotion": "neutral",
+            "emotion_conf": 0.0,
+            "embedding": None,
+            "box": None,
+            "classified": False,
+            "track_id": None,
+            "quality": None,
+            "skip_reason": None,
+            "faces": [],
+            "timings": {},
+        }
+        timings = out["timings"]
+        t0 = time.perf_counter()
+        gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+        tracks = self.locate(frame_bgr, gray)
+        timings["detect"] = (time.perf_counter() - t0) * 1000.0
+        if self.roi_cache is not None:
+            self.roi_cache.retain(t.track_id for t in tracks)
+        if not tracks:
+            self.embeddings.end_track()
+            return out
+
+        # --- Crop every tracked ROI, keep the ones worth a model call ---
+        faces, crops = [], []
+        for t in tracks:
+            x, y, x2, y2 = clip_box(t.box, frame_bgr.shape)
+            face = {
+                "track_id": t.track_id,
+                "box": [x, y, x2 - x, y2 - y],
+                "dominant_emotion": "neutral",
+                "emotion_conf": 0.0,
+                "classified": False,
+            }
+            faces.append(face)
+            crops.append(gray[y:y2, x:x2])
+        t0 = time.perf_counter()
+        checks = self.quality.check(crops)
+        timings["quality"] = (time.perf_counter() - t0) * 1000.0
+        rois = []
+        for face, roi_gray, q in zip(faces, crops, checks):
+            face["quality"] = q["score"]
+            if q["reason"] is None:
+                rois.append((face, roi_gray))
+            else:
+                face["skip_reason"] = q["reason"]
+
+        ids = [f["track_id"] for f in faces]
+        cur = ids.index(self.main_track) if self.main_track in ids else None
+        main_face = faces[pick_main([f["box"][2] * f["box"][3] for f in faces], cur)]
+        self.main_track = main_face["track_id"]
+
+        # --- Faces that look as they did a moment ago: cached results ---
+        hashes, todo = {}, rois
+        if self.roi_cache is not None and rois:
+            t0 = time.perf_counter()
+            todo = []
+            for face, roi_gray in rois:
+                h = hashes[face["track_id"]] = dhash(roi_gray)
+                p = self.roi_cache.get(face["track_id"], "emotion", h)
+                if p is None:
+                    todo.append((face, roi_gray))
+                else:
+                    self._label(face, p)
+            timings["cache"] = (time.perf_counter() - t0) * 1000.0
+
+        # --- Facenet on the model thread (caches permitting) ... ---
+        t_models = time.perf_counter()
+        emb_job = None
+        failures = self.embeddings.reverify_failures
+        if self.with_embedding and self.want_embedding and any(f is main_face for f, _ in rois):
+            x, y, w, h = main_face["box"]
+            face_bgr = frame_bgr[y:y + h, x:x + w]
+            tid, hsh = main_face["track_id"], hashes.get(main_face["track_id"])
+            emb_job = self.embeddings.get_async(tid, lambda: self._embed(tid, hsh, face_bgr))
+
+        # --- ... while one model call classifies the other faces ---
+        if todo:
+            t0 = time.perf_counter()
+            try:
+                probs = self.classifier.predict_proba([r for _, r in todo])
+                for (face, _), p in zip(todo, probs):
+                    self._label(face, p)
+            except Exception as e:
+                print("[Engine] emotion warn:", e)
+                probs = None
+                for face, _ in todo:
+                    face["dominant_emotion"], face["emotion_conf"] = 'neutral', 1.0
+                    face["classified"] = True
+            timings["emotion"] = (time.perf_counter() - t0) * 1000.0
+            if probs is not None and self.roi_cache is not None:
+                cost = timings["emotion"] / len(todo)
+                for (face, _), p in zip(todo, probs):
+                    tid = face["track_id"]
+                    self.roi_cache.put(tid, "emotion", hashes[tid], np.array(p, np.float32), cost)
+
+        if emb_job is not None:
+            try:
+                out["embedding"], timings["embedding"] = emb_job.result()
+            except Exception as e:
+                print("[Engine] embedding warn:", e)
+            if self.roi_cache is not None and self.embeddings.reverify_failures != failures:
+                # Someone else under this track: its cached results are stale.
+                self.roi_cache.invalidate(main_face["track_id"])
+        if rois:
+            timings["models"] = (time.perf_counter() - t_models) * 1000.0
+
+        out.update({k: main_face[k] for k in
+                    ("dominant_emotion", "emotion_conf", "box", "classified", "track_id", "quality")})
+        out["skip_reason"] = main_face.get("skip_reason")
+        out["present"] = True
+        out["faces"] = faces
+        return out
+
+    @staticmethod
+    def _label(face, p):
+        k = int(np.argmax(p))
+        face["dominant_emotion"] = emotion_labels[k]
+        face["emotion_conf"] = float(p[k])
+        face["classified"] = True
+
+    def warmup_steps(self):
+        """
+        (name, fn) pairs that load each model and run one dummy inference,
+        so the first real frame does not pay for graph building.
+        """
+        steps = []
+        if self._classifier is None or (self.with_embedding and self.embedder is get_embedding_from_face):
+            steps.append(("deepface", deepface))
+        steps.append(("emotion", lambda: self.classifier.predict_one(
+            np.zeros((EMOTION_INPUT, EMOTION_INPUT), np.uint8))))
+        if self.with_embedding and "facenet" not in LAZY_MODELS:
+            steps.append(("facenet", lambda: self.embedder(
+                np.zeros((160, 160, 3), np.uint8))))
+        return steps
+
+    def stats(self):
+        return {
+            "detections": self.detections,
+            "tracks": len(self.tracks),
+            "track_id": self.track_id,
+            "embedding_cache": self.embeddings.stats(),
+            "quality": self.quality.stats(),
+            "roi_cache": self.roi_cache.stats() if self.roi_cache is not None else None,
+            "batching": self._classifier.stats() if hasattr(self._classifier, "stats") else None,
+            "models": MANAGER.stats(),
+        }
+
+# ---------------- Hearts decision (sliding window) ----------------
+def polarity(label):
+    if label in POSITIVE:
+        return "pos"
+    if label in NEGATIVE:
+        return "neg"
+    return "neu"  # neutral or anything else
+
+class HeartsMeter:
+    """
+    Hearts from a sliding WINDOW_SEC window (aggregator.SlidingWindowAggregator)
+    instead of tumbling windows. The rule is the same as before: among
+    pos+neg frames (neutral ignored), POS_RATIO gains a heart and NEG_RATIO
+    loses one, given at least MIN_EFFECTIVE_FRAMES. It is checked on every
+    frame, so a clear mood moves the meter as soon as the evidence is there
+    rather than at the next window edge. After a change the window is
+    cleared, so one stretch of frames never counts for two hearts.
+    """
+
+    def __init__(self, window_sec=WINDOW_SEC, pos_ratio=POS_RATIO, neg_ratio=NEG_RATIO,
+                 min_effective=MIN_EFFECTIVE_FRAMES, start=HEARTS_START):
+        self.window = SlidingWindowAggregator(("pos", "neg", "neu"), window_sec)
+        self.pos_ratio = pos_ratio
+        self.neg_ratio = neg_ratio
+        self.min_effective = min_effective
+        self.hearts = start
+
+    def add(self, label, conf=1.0, ts=None):
+        self.window.add(polarity(label), weight=conf, ts=ts)
+
+    def classify(self, now=None):
+        """(classification, counts): positive | negative | mixed | insufficient."""
+        c = self.window.counts(now)
+        # neutral frames are ignored; same rule moodlog.py applies to logged windows
+        return classify_window(c["pos"], c["neg"], self.pos_ratio, self.neg_ratio,
+                               self.min_effective), c
+
+    def update(self, now=None):
+        cls, _ = self.classify(now)
+        if cls == "positive":
+            self.hearts = min(HEARTS_MAX, self.hearts + 1)
+        elif cls == "negative":
+            self.hearts = max(HEARTS_MIN, self.hearts - 1)
         else:
+            return self.hearts
+        self.window.reset()
+        return self.hearts
+
+# ---------------- Main loop (standalone hearts meter) ----------------
+def main():
+    cap = cv2.VideoCapture(0)
+    engine = EmotionEngine(with_embedding=False)
+    meter = HeartsMeter()
+
+    while True:
+        ok_ret, frame = cap.read()
+        if not ok_ret:
+            break
+
+        out = engine.analyze(frame)
+        if not out["present"]:
             # Show current hearts even if no lock
-            draw_hearts_row(frame, hearts, total=HEARTS_MAX)
+            draw_hearts_row(frame, meter.hearts, total=HEARTS_MAX)
             cv2.putText(frame, "No face", (HEART_ORIGIN[0], HEART_ORIGIN[1] + HEART_SIZE + 20),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (60, 60, 60), 2)
             cv2.imshow("Hearts Mood Meter (One Main Face)", frame)
@@ -171,64 +658,38 @@ while True:
                 break
             continue
 
-    # --- Crop ROI for the locked face ---
-    x = max(0, x); y = max(0, y)
-    w = max(1, w); h = max(1, h)
-    x2 = min(frame.shape[1], x + w)
-    y2 = min(frame.shape[0], y + h)
-    roi_gray = gray[y:y2, x:x2]
-
-    top_label = None
-    if roi_gray.size >= 48 * 48:
-        # DeepFace handles various sizes, but standardize for consistency
-        resized = cv2.resize(roi_gray, (96, 96), interpolation=cv2.INTER_AREA)
-        try:
-            top_label, top_prob = get_top_emotion_from_gray_face(resized)
-        except Exception:
-            top_label, top_prob = 'neutral', 1.0
-
-        # Update window counts based on top label
-        if top_label in POSITIVE:
-            pos_count += 1
-        elif top_label in NEGATIVE:
-            neg_count += 1
-        else:  # neutral or anything else
-            neu_count += 1
-
-        # Draw face box & label
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (20, 20, 220), 2)
-        cv2.putText(frame, f"{top_label} ({top_prob:.2f})", (x, y - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, TEXT_COLOR, 2)
-
-    # --- Window decision every WINDOW_SEC (tumbling windows) ---
-    now = time.time()
-    if now - win_start >= WINDOW_SEC:
-        effective = pos_count + neg_count  # neutral frames are ignored
-        if effective >= MIN_EFFECTIVE_FRAMES:
-            pos_ratio = pos_count / effective if effective > 0 else 0.0
-            neg_ratio = neg_count / effective if effective > 0 else 0.0
-
-            if pos_ratio >= POS_RATIO and pos_ratio > neg_ratio:
-                hearts = min(HEARTS_MAX, hearts + 1)
-            elif neg_ratio >= NEG_RATIO and neg_ratio > pos_ratio:
-                hearts = max(HEARTS_MIN, hearts - 1)
-            # else: no change
-
-        # reset window
-        win_start = now
-        pos_count = neg_count = neu_count = 0
-
-    # --- Draw hearts + status ---
-    draw_hearts_row(frame, hearts, total=HEARTS_MAX)
-    cv2.putText(frame, f"Window {int(WINDOW_SEC)}s  pos:{pos_count}  neg:{neg_count}  neu:{neu_count}",
-                (HEART_ORIGIN[0], HEART_ORIGIN[1] + HEART_SIZE + 20),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.6, TEXT_COLOR, 2)
-    cv2.putText(frame, "LOCKED: Main Face", (10, frame.shape[0] - 15),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (40, 180, 40), 2)
-
-    cv2.imshow("Hearts Mood Meter (One Main Face)", frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+        if out["classified"]:
+            # Update the window with the main face's top label
+            meter.add(out["dominant_emotion"], out["emotion_conf"])
+
+        # Draw face boxes & labels (main face in red)
+        for face in out["faces"]:
+            if not face["classified"]:
+                continue
+            x, y, w, h = face["box"]
+            color = (20, 20, 220) if face["track_id"] == out["track_id"] else (160, 160, 160)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+            cv2.putText(frame, f"{face['dominant_emotion']} ({face['emotion_conf']:.2f})", (x, y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, TEXT_COLOR, 2)
+
+        # --- Hearts decision on every frame (sliding window) ---
+        hearts = meter.update()
+        c = meter.window.counts()
+
+        # --- Draw hearts + status ---
+        draw_hearts_row(frame, hearts, total=HEARTS_MAX)
+        cv2.putText(frame, f"Window {int(WINDOW_SEC)}s  pos:{c['pos']}  neg:{c['neg']}  neu:{c['neu']}",
+                    (HEART_ORIGIN[0], HEART_ORIGIN[1] + HEART_SIZE + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, TEXT_COLOR, 2)
+        cv2.putText(frame, "LOCKED: Main Face", (10, frame.shape[0] - 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (40, 180, 40), 2)
+
+        cv2.imshow("Hearts Mood Meter (One Main Face)", frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# events.py
+"""
+Push side of /status: Server-Sent Events and long-poll on one asyncio thread.
+
+Flask's dev server spends a thread per connection, which is fine for short
+requests but not for phones that park a request waiting for the next change.
+EventHub runs its own tiny HTTP/1.1 server on EVENTS_PORT inside a single
+asyncio loop, so an idle subscriber costs a coroutine, not a thread:
+
+    GET /events                      SSE stream; one `status` event per state
+                                     version (resumes from Last-Event-ID)
+    GET /status?since=<v>&timeout=<s> returns as soon as version > v, or the
+                                     current state after the timeout
+
+The StateStore listener hops onto the loop with call_soon_threadsafe, and
+each version is rendered to JSON once no matter how many clients listen.
+"""
+
+import json
+import asyncio
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+KEEPALIVE_SEC = 15.0
+LONGPOLL_MAX_SEC = 30.0
+
+
+def _parse(value, cast):
+    """cast(value), or None if the client sent something malformed."""
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class EventHub:
+    def __init__(self, store, render, host="0.0.0.0", port=8001):
+        self.store = store
+        self.render = render          # Snapshot -> dict (JSON-serializable)
+        self.host, self.port = host, port
+        self.loop = None
+        self._changed = None          # asyncio.Event, replaced on every version
+        self._cached = (None, b"")    # (version, rendered json bytes)
+        self.subscribers = 0
+        self.longpolls = 0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        ready = threading.Event()
+        t = threading.Thread(target=self._run, args=(ready,), name="events", daemon=True)
+        t.start()
+        ready.wait(5.0)
+        self.store.subscribe(self._on_publish)
+        return t
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._changed = asyncio.Event()
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        print(f"[Events] SSE/long-poll on :{self.port}")
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            server.close()
+
+    def _on_publish(self, snap):
+        # Called from the vision thread.
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    def stats(self):
+        return {"subscribers": self.subscribers, "longpolls": self.longpolls}
+
+    # ---------- helpers ----------
+    def _payload(self, snap):
+        if self._cached[0] != snap.version:
+            self._cached = (snap.version, json.dumps(self.render(snap)).encode("utf-8"))
+        return self._cached[1]
+
+    async def _wait_newer(self, since, timeout):
+        snap = self.store.current()
+        while snap.version <= since:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+            snap = self.store.current()
+        return snap
+
+    # ---------- HTTP ----------
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10.0)
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = (lines[0].split(" ") + ["", ""])[:3]
+            headers = {}
+            for ln in lines[1:]:
+                if ":" in ln:
+                    k, v = ln.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+            url = urlsplit(target)
+            qs = parse_qs(url.query)
+            if method != "GET":
+                await self._respond(writer, 405, b'{"error":"method not allowed"}')
+            elif url.path == "/events":
+                await self._sse(writer, qs, headers)
+            elif url.path == "/status":
+                await self._longpoll(writer, qs)
+            else:
+                await self._respond(writer, 404, b'{"error":"not found"}')
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            print("[Events] warn:", e)
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _respond(self, writer, code, body, extra=""):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}.get(code, "OK")
+        writer.write((
+            f"HTTP/1.1 {code} {reason}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{extra}"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1") + body)
+        await writer.drain()
+
+    async def _longpoll(self, writer, qs):
+        since = _parse(qs.get("since", ["-1"])[0], int)
+        timeout = _parse(qs.get("timeout", [LONGPOLL_MAX_SEC])[0], float)
+        if since is None or timeout is None:
+            await self._respond(writer, 400, b'{"ok":false,"error":"since must be an integer, timeout a number"}')
+            return
+        timeout = min(timeout, LONGPOLL_MAX_SEC)
+        self.longpolls += 1
+        try:
+            snap = await self._wait_newer(since, timeout)
+        finally:
+            self.longpolls -= 1
+        await self._respond(writer, 200, self._payload(snap),
+                            extra=f"X-State-Version: {snap.version}\r\n")
+
+    async def _sse(self, writer, qs, headers):
+        since = _parse(headers.get("last-event-id") or qs.get("since", ["-1"])[0], int)
+        if since is None:
+            await self._respond(writer, 400, b'{"ok":false,"error":"Last-Event-ID / since must be an integer"}')
+            return
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+            b"retry: 1000\n\n"
+        )
+        await writer.drain()
+        self.subscribers += 1
+        try:
+            while True:
+                snap = await self._wait_newer(since, KEEPALIVE_SEC)
+                if snap.version <= since:
+                    writer.write(b": keepalive\n\n")
+                else:
+                    since = snap.version
+                    writer.write(b"id: %d\nevent: status\ndata: " % snap.version
+                                 + self._payload(snap) + b"\n\n")
+                await writer.drain()
+        finally:
+            self.subscribers -= 1
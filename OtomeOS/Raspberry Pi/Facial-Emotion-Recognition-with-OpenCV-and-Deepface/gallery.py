@@ -0,0 +1,146 @@
+# gallery.py
+"""
+Identity gallery on the Pi.
+
+Enrolled embeddings live in one contiguous float32 matrix (one L2-normalized
+row per person), persisted as a memory-mapped .npy with a JSON sidecar that
+holds the ids and per-row sample counts:
+
+    <dir>/gallery.npy        (capacity, dim) float32, rows [0, count) valid
+    <dir>/gallery.ids.json   { "dim", "count", "ids": [...], "samples": [...] }
+
+Identification is one matrix-vector product over the valid rows plus an
+argpartition for the top-k, so thousands of people stay in the
+low-millisecond range. Enrolling appends a row (capacity doubles when full)
+or merges into the person's existing row; deleting swaps the last row into
+the hole. Nothing is rebuilt.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+
+from embedding_cache import l2_normalize
+
+INITIAL_CAPACITY = 256
+IDENTIFY_MIN_COS = 0.6   # Facenet cosine similarity to call it the same person
+
+
+class Gallery:
+    def __init__(self, directory, initial_capacity=INITIAL_CAPACITY):
+        self.dir = directory
+        self.initial_capacity = initial_capacity
+        self.npy_path = os.path.join(directory, "gallery.npy")
+        self.ids_path = os.path.join(directory, "gallery.ids.json")
+        self._lock = threading.Lock()
+        self._m = None          # np.memmap (capacity, dim)
+        self.dim = None
+        self.ids = []           # row -> person id
+        self.samples = []       # row -> how many embeddings were merged into it
+        self._row = {}          # person id -> row
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ---------- persistence ----------
+    def _load(self):
+        if not (os.path.exists(self.npy_path) and os.path.exists(self.ids_path)):
+            return
+        try:
+            with open(self.ids_path) as f:
+                meta = json.load(f)
+            self._m = np.load(self.npy_path, mmap_mode="r+")
+            self.dim = int(meta["dim"])
+            self.ids = list(meta["ids"])[:int(meta["count"])]
+            self.samples = list(meta.get("samples", [1] * len(self.ids)))[:len(self.ids)]
+            self._row = {pid: i for i, pid in enumerate(self.ids)}
+        except Exception as e:
+            print("[Gallery] could not load, starting empty:", e)
+            self._m, self.dim, self.ids, self.samples, self._row = None, None, [], [], {}
+
+    def _write_meta(self):
+        tmp = self.ids_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "count": len(self.ids),
+                       "ids": self.ids, "samples": self.samples}, f)
+        os.replace(tmp, self.ids_path)
+
+    def _ensure_capacity(self, n):
+        cap = 0 if self._m is None else self._m.shape[0]
+        if n <= cap:
+            return
+        new_cap = max(self.initial_capacity, cap * 2)
+        while new_cap < n:
+            new_cap *= 2
+        tmp = self.npy_path + ".tmp"
+        m = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(new_cap, self.dim))
+        if self._m is not None and self.ids:
+            m[:len(self.ids)] = self._m[:len(self.ids)]
+        m.flush()
+        del m
+        os.replace(tmp, self.npy_path)
+        self._m = np.load(self.npy_path, mmap_mode="r+")
+
+    # ---------- API ----------
+    def __len__(self):
+        return len(self.ids)
+
+    def enroll(self, person_id, vec, merge=True):
+        """Add a person, or fold another sample into their row. Returns the row's sample count."""
+        v = l2_normalize(np.asarray(vec, dtype=np.float32).reshape(-1))
+        with self._lock:
+            if self.dim is None:
+                self.dim = v.size
+            if v.size != self.dim:
+                raise ValueError(f"embedding has dim {v.size}, gallery uses {self.dim}")
+            row = self._row.get(person_id)
+            if row is None:
+                row = len(self.ids)
+                self._ensure_capacity(row + 1)
+                self.ids.append(person_id)
+                self.samples.append(0)
+                self._row[person_id] = row
+            if merge and self.samples[row]:
+                n = self.samples[row]
+                v = l2_normalize(self._m[row] * n + v)
+            else:
+                self.samples[row] = 0
+            self._m[row] = v
+            self.samples[row] += 1
+            self._m.flush()
+            self._write_meta()
+            return self.samples[row]
+
+    def delete(self, person_id):
+        with self._lock:
+            row = self._row.pop(person_id, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                self._m[row] = self._m[last]
+                self.ids[row] = self.ids[last]
+                self.samples[row] = self.samples[last]
+                self._row[self.ids[row]] = row
+            self.ids.pop()
+            self.samples.pop()
+            self._m.flush()
+            self._write_meta()
+            return True
+
+    def search(self, vec, k=5):
+        """Top-k [(person_id, cosine)] for an embedding, best first."""
+        q = l2_normalize(np.asarray(vec, dtype=np.float32).reshape(-1))
+        with self._lock:
+            n = len(self.ids)
+            if n == 0 or q.size != self.dim:
+                return []
+            scores = self._m[:n] @ q
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i])) for i in top]
+
+    def info(self):
+        return {"count": len(self.ids), "dim": self.dim,
+                "capacity": 0 if self._m is None else int(self._m.shape[0])}
@@ -0,0 +1,443 @@
+# inference_pool.py
+"""
+Process-pool inference: the engine runs in worker processes, not in the
+vision thread.
+
+In-process, the engine's pre/post-processing holds the GIL while a frame is
+analyzed, so /status, the event hub and the display worker stall behind it
+and only one of the Pi's cores does real work. With LUMI_WORKERS=N, main.py
+uses an InferencePool instead of the engine. The pool has the same
+.analyze / .warmup_steps / .stats surface.
+
+- frames: one SharedMemory block holds a ring of frame slots. analyze()
+  copies the frame into a free slot once. The worker wraps that slot in an
+  ndarray without copying, and the pipe only carries (job, slot, shape).
+- results: the engine's result dict comes back pickled over the worker's
+  socket pipe (multiprocessing.connection). An embedding the engine returns
+  from its cache is sent once and is marked as unchanged after that.
+- workers: plain `python3 inference_pool.py --worker ...` processes, so they
+  never import main.py (no TFT or GPIO setup, and no forked threads). Each
+  worker loads and warms up its own models and reports their load state.
+- health: a watchdog thread detects a worker that exits, closes its pipe or
+  works on one job for longer than job_timeout, counted from when the job
+  was handed to it (time spent waiting for a free slot or worker is capped
+  separately by queue_timeout). It kills that worker, fails the job and
+  restarts the worker with backoff. A caller only sees an exception for
+  that one frame.
+
+Calls pass a `key` (the camera, with several pipelines). A worker keeps
+one engine per key (backends.clone: own tracks and embedding cache, shared
+models), and a key stays on the same worker whenever that worker is free.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import socket
+import argparse
+import itertools
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection, wait
+
+import numpy as np
+
+JOB_TIMEOUT_SEC = 15.0       # a worker busy with one job this long is killed
+QUEUE_TIMEOUT_SEC = 15.0     # longest a caller waits for a free slot and worker
+READY_TIMEOUT_SEC = 300.0    # model import + warm-up in a fresh worker
+HEALTH_SEC = 0.5             # watchdog period
+RESTART_MIN_SEC = 1.0        # restart delay after a crash, doubling ...
+RESTART_MAX_SEC = 30.0       # ... up to this while the worker keeps crashing
+STATS_EVERY_SEC = 1.0        # how often a worker attaches engine stats to a result
+SAME_EMBEDDING = "same"      # result["embedding"] marker: the worker's last one
+
+_Job = namedtuple("_Job", ["id", "key", "t0", "future"])   # t0: handed to a worker
+
+
+class _Worker:
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, index):
+        self.index = index
+        self.proc = None
+        self.conn = None
+        self.state = "dead"          # starting | ready | busy | dead
+        self.ready = threading.Event()
+        self.job = None
+        self.models = {}             # name -> { state, load_ms, error }
+        self.engine_stats = {}
+        self.last_embedding = {}     # key -> last embedding received
+        self.started = 0.0
+        self.restart_at = 0.0
+        self.crashes = 0             # in a row; reset once a restart becomes ready
+        self.restarts = 0
+        self.jobs = 0
+        self.busy_ms = None
+
+    def stats(self):
+        return {
+            "pid": self.proc.pid if self.proc is not None else None,
+            "state": self.state,
+            "jobs": self.jobs,
+            "restarts": self.restarts,
+            "busy_ms": None if self.busy_ms is None else round(self.busy_ms, 1),
+            "models": dict(self.models),
+            "engine": self.engine_stats,
+        }
+
+
+class InferencePool:
+    def __init__(self, backend="auto", workers=1, frame_shape=(240, 320, 3), slots=None,
+                 job_timeout=JOB_TIMEOUT_SEC, queue_timeout=QUEUE_TIMEOUT_SEC, backend_options=None):
+        self.backend = backend
+        self.frame_shape = tuple(frame_shape)
+        self.slot_bytes = int(np.prod(self.frame_shape))
+        self.n_slots = max(slots or workers, workers)
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self.backend_options = dict(backend_options or {})
+        self.workers = [_Worker(i) for i in range(workers)]
+
+        self._shm = None
+        self._free = queue.Queue()           # free slot indices
+        self._cond = threading.Condition()   # worker state and job assignment
+        self._affinity = {}                  # key -> worker index
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._stop = False
+
+        # counters (read via stats())
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.copied = 0       # frames that did not fit a slot and went through the pipe
+        self.ipc_ms = None
+
+    # ---------- lifecycle ----------
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.n_slots)
+            for i in range(self.n_slots):
+                self._free.put(i)
+            for w in self.workers:
+                self._spawn(w)
+            self._thread = threading.Thread(target=self._run, name="inference-pool", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop = True
+        with self._cond:
+            self._cond.notify_all()
+        for w in self.workers:
+            try:
+                w.conn.send(("quit",))
+            except Exception:
+                pass
+        for w in self.workers:
+            if w.proc is None:
+                continue
+            try:
+                w.proc.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                w.proc.kill()
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                pass   # a caller still holds a slot view; unlink anyway
+            self._shm.unlink()
+            self._shm = None
+
+    def _spawn(self, w):
+        parent, child = socket.socketpair()
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", str(child.fileno()),
+               "--shm", self._shm.name, "--shape", "x".join(map(str, self.frame_shape)),
+               "--backend", self.backend, "--options", json.dumps(self.backend_options)]
+        w.proc = subprocess.Popen(cmd, pass_fds=(child.fileno(),))
+        child.close()
+        w.conn = Connection(parent.detach())
+        w.state = "starting"
+        w.started = time.time()
+        w.models = {}
+        w.last_embedding = {}
+        print(f"[Pool] worker {w.index} started (pid {w.proc.pid}, backend={self.backend})")
+
+    def _lost(self, w, why):
+        with self._cond:
+            job, w.job = w.job, None
+            w.state = "dead"
+            w.ready.clear()
+            w.crashes += 1
+            delay = min(RESTART_MIN_SEC * 2 ** (w.crashes - 1), RESTART_MAX_SEC)
+            w.restart_at = time.time() + delay
+            self._cond.notify_all()
+        if w.proc.poll() is None:
+            w.proc.kill()
+            w.proc.wait()
+        try:
+            w.conn.close()
+        except OSError:
+            pass
+        w.conn = None
+        if job is not None:
+            self.failed += 1
+            job.future.set_exception(RuntimeError(f"inference worker {w.index} {why}"))
+        print(f"[Pool] worker {w.index} {why}; restarting in {delay:.0f}s")
+
+    # ---------- watchdog / receiver ----------
+    def _run(self):
+        while not self._stop:
+            conns = {w.conn: w for w in self.workers if w.conn is not None}
+            if conns:
+                ready = wait(list(conns), HEALTH_SEC)
+            else:
+                time.sleep(HEALTH_SEC)
+                ready = []
+            for conn in ready:
+                w = conns[conn]
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    if not self._stop:
+                        self._lost(w, "closed its pipe")
+                    continue
+                self._handle(w, msg)
+            if not self._stop:
+                self._check()
+
+    def _handle(self, w, msg):
+        kind = msg[0]
+        if kind == "model":
+            _, name, st = msg
+            w.models[name] = st
+        elif kind == "ready":
+            with self._cond:
+                w.state = "ready"
+                w.crashes = 0
+                self._cond.notify_all()
+            w.ready.set()
+            print(f"[Pool] worker {w.index} ready in {time.time() - w.started:.1f}s")
+        elif kind in ("result", "error"):
+            with self._cond:
+                job = w.job
+                if job is None or job.id != msg[1]:
+                    return   # answer to a job that was already failed
+                w.job = None
+                w.state = "ready"
+                w.jobs += 1
+                self._cond.notify_all()
+            if kind == "error":
+                self.failed += 1
+                job.future.set_exception(RuntimeError(f"inference worker {w.index}: {msg[2]}"))
+                return
+            _, _, out, busy_ms, stats = msg
+            if stats is not None:
+                w.engine_stats = stats
+            w.busy_ms = busy_ms if w.busy_ms is None else w.busy_ms + 0.2 * (busy_ms - w.busy_ms)
+            emb = out.get("embedding")
+            if isinstance(emb, str) and emb == SAME_EMBEDDING:
+                out["embedding"] = w.last_embedding.get(job.key)   # same object -> no re-hash downstream
+            else:
+                w.last_embedding[job.key] = emb
+            self.completed += 1
+            job.future.set_result((out, busy_ms))
+
+    def _check(self):
+        now = time.time()
+        for w in self.workers:
+            if w.state == "dead":
+                if now >= w.restart_at:
+                    w.restarts += 1
+                    self._spawn(w)
+                continue
+            job = w.job
+            if w.proc.poll() is not None:
+                self._lost(w, f"exited with code {w.proc.returncode}")
+            elif job is not None and now - job.t0 > self.job_timeout:
+                self.timeouts += 1
+                self._lost(w, f"stuck on a frame for {now - job.t0:.0f}s")
+            elif w.state == "starting" and now - w.started > READY_TIMEOUT_SEC:
+                self._lost(w, "did not finish loading its models")
+
+    # ---------- engine surface ----------
+    def _acquire(self, key, job, deadline):
+        with self._cond:
+            while True:
+                if self._stop:
+                    raise RuntimeError("inference pool closed")
+                idle = [w for w in self.workers if w.state == "ready"]
+                if idle:
+                    pref = self._affinity.get(key)
+                    w = next((x for x in idle if x.index == pref), idle[0])
+                    if key is not None:
+                        self._affinity[key] = w.index
+                    w.state = "busy"
+                    w.job = job._replace(t0=time.time())   # the watchdog times work, not queueing
+                    return w
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError("no inference worker ready")
+                self._cond.wait(remaining)
+
+    def analyze(self, frame_bgr, key=None, want_embedding=True):
+        """
+        Engine .analyze() in a worker process; blocks (without the GIL) until
+        it answers. want_embedding is passed on to the engine (see backends.py).
+        """
+        if self._thread is None:
+            self.start()
+        t0 = time.perf_counter()
+        deadline = time.time() + self.queue_timeout
+        job = _Job(next(self._ids), key, None, Future())
+        try:
+            slot = self._free.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise RuntimeError("no free inference slot")
+        try:
+            w = self._acquire(key, job, deadline)
+            self.submitted += 1
+            img = frame_bgr
+            if img.dtype == np.uint8 and img.nbytes <= self.slot_bytes:
+                view = np.ndarray(img.shape, np.uint8, buffer=self._shm.buf,
+                                  offset=slot * self.slot_bytes)
+                np.copyto(view, img)
+                del view
+                msg = ("frame", job.id, key, want_embedding, slot, img.shape)
+            else:
+                self.copied += 1
+                msg = ("image", job.id, key, want_embedding, img)
+            try:
+                w.conn.send(msg)
+            except (AttributeError, OSError):
+                pass   # worker just died: the watchdog fails the job
+            try:
+                out, busy_ms = job.future.result(timeout=self.job_timeout + 4 * HEALTH_SEC)
+            except FutureTimeout:
+                raise RuntimeError(f"inference worker {w.index} did not answer")
+        finally:
+            self._free.put(slot)
+        ipc = max(0.0, (time.perf_counter() - t0) * 1000.0 - busy_ms)
+        self.ipc_ms = ipc if self.ipc_ms is None else self.ipc_ms + 0.2 * (ipc - self.ipc_ms)
+        out.setdefault("timings", {})["ipc"] = ipc
+        return out
+
+    def warmup_steps(self):
+        """One step per worker: done once it has loaded and warmed up its models."""
+        def wait_ready(w):
+            self.start()
+            if not w.ready.wait(READY_TIMEOUT_SEC):
+                raise RuntimeError(f"worker {w.index} not ready")
+            bad = {n: m for n, m in w.models.items() if m["state"] != "ready"}
+            if bad:
+                raise RuntimeError("; ".join(f"{n}: {m.get('error')}" for n, m in bad.items()))
+        return [(f"worker-{w.index}", lambda w=w: wait_ready(w)) for w in self.workers]
+
+    def stats(self):
+        return {
+            "workers": [w.stats() for w in self.workers],
+            "slots": self.n_slots,
+            "free_slots": self._free.qsize(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "restarts": sum(w.restarts for w in self.workers),
+            "copied": self.copied,
+            "ipc_ms": None if self.ipc_ms is None else round(self.ipc_ms, 2),
+        }
+
+
+# ----------------- worker process -----------------
+def _worker_main(argv=None):
+    ap = argparse.ArgumentParser(description="LumiLens inference worker (started by InferencePool)")
+    ap.add_argument("--worker", type=int, required=True, help="socket fd to the pool")
+    ap.add_argument("--shm", required=True)
+    ap.add_argument("--shape", required=True, help="slot frame shape, HxWxC")
+    ap.add_argument("--backend", default="auto")
+    ap.add_argument("--options", default="{}", help="backend kwargs as JSON")
+    args = ap.parse_args(argv)
+
+    # Ctrl-C reaches the whole process group; the pool shuts workers down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    conn = Connection(args.worker)
+    shm = shared_memory.SharedMemory(name=args.shm)
+    # Before Python 3.13 attaching registers the block with this process's
+    # resource tracker, which would unlink it when the worker exits.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    shape = tuple(int(v) for v in args.shape.split("x"))
+    slot_bytes = int(np.prod(shape))
+
+    import backends
+    engine = backends.create(args.backend, **json.loads(args.options))
+    steps = getattr(engine, "warmup_steps", None)
+    if callable(steps):
+        steps = steps()
+    else:
+        dummy = np.zeros(shape, np.uint8)
+        steps = [("engine", lambda: engine.analyze(dummy))]
+    for name, fn in steps:
+        t0 = time.time()
+        try:
+            fn()
+            st = {"state": "ready", "load_ms": round((time.time() - t0) * 1000.0, 1)}
+        except Exception as e:
+            st = {"state": "error", "load_ms": None, "error": str(e)}
+        conn.send(("model", name, st))
+    conn.send(("ready",))
+
+    engines = {}                      # one per camera key; the first gets the loaded engine
+    last_emb, last_stats = {}, 0.0
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break   # the pool (or the server) is gone
+        if msg[0] == "quit":
+            break
+        job_id, key, want_embedding = msg[1], msg[2], msg[3]
+        if msg[0] == "frame":
+            slot, fshape = msg[4], msg[5]
+            image = np.ndarray(fshape, np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+        else:
+            image = msg[4]
+        t0 = time.perf_counter()
+        try:
+            eng = engines.get(key)
+            if eng is None:
+                eng = engines[key] = backends.clone(engine) if engines else engine
+            eng.want_embedding = want_embedding
+            out = dict(eng.analyze(image))
+        except Exception as e:
+            conn.send(("error", job_id, f"{type(e).__name__}: {e}"))
+            continue
+        finally:
+            del image
+        busy_ms = (time.perf_counter() - t0) * 1000.0
+        emb = out.get("embedding")
+        if emb is not None and emb is last_emb.get(key):
+            out["embedding"] = SAME_EMBEDDING
+        else:
+            last_emb[key] = emb
+        stats = None
+        if callable(getattr(engine, "stats", None)) and time.time() - last_stats >= STATS_EVERY_SEC:
+            stats, last_stats = {str(k): e.stats() for k, e in engines.items()}, time.time()
+            stats = next(iter(stats.values())) if len(stats) == 1 else stats
+        conn.send(("result", job_id, out, busy_ms, stats))
+    conn.close()
+    shm.close()
+
+
+if __name__ == "__main__":
+    _worker_main()
@@ -9,19 +9,91 @@ Pi server (TFT only) with optional emotion.py integration.
     Mode A: Text (name + AI dialogue)  -> set via POST /display/text
     Mode B: Progress image (0/25/50/75/100) -> set via POST /display/progress
 - /status serves:
-    { present, emotion: happy|neutral|upset, emotion_conf, embedding: base64(f32[]), last_seen_ts }
-
-Integration with your existing emotion.py:
+    { version, present, emotion: happy|neutral|upset, emotion_conf, embedding: base64(f32[]), last_seen_ts,
+      frame_ts, faces: [ { track_id, box: [x,y,w,h], emotion, dominant_emotion, emotion_conf,
+                           classified, quality, skip_reason } ] }
+  (a face the quality gate skipped has classified: false and a null emotion)
+  and with ?stats=1 also the diagnostics block (not for polling clients):
+      stats: { capture: { grabbed, decoded, dropped, stale, last_latency_ms },
+               engine: { embedding_cache: { hits, misses, sec_since_recompute, ... } }, ... }
+- Every /status body carries a `version` that only moves when presence, label,
+  identity or faces change. GET /status?since=<version> long-polls; port
+  PORT+1 serves the same long-poll plus a /events SSE stream from one asyncio
+  thread (events.py), for many idle subscribers.
+- /status is conditional: ETag is the state version (If-None-Match -> 304), and
+  ?embedding_hash=<h> drops a vector the client already has. Clients can opt
+  into a compact body with `Accept: application/octet-stream` (wire.py layout)
+  or `application/msgpack`, with ?emb=f16|i8|f32|none (default f16).
+- Identity gallery on the Pi (gallery.py): GET/POST /gallery {id, embedding?},
+  DELETE /gallery/<id>, GET|POST /identify?k= -> top-k cosine matches. Without
+  an embedding in the request, the current camera embedding is used.
+- GET /history?from=&to=&bucket=[&format=csv] -> mood windows (mood_log.csv
+  fields) from an in-memory ring plus rotating binary segments on disk
+  (moodlog.py), summed server-side into bucket-second points. Each processed
+  frame's label and confidence also go to frames-*.bin segments next to
+  them (LUMI_FRAME_LOG=0 to disable); tune_hearts.py re-scores the hearts
+  rule over those logs offline for many settings at once.
+- GET /metrics: Prometheus text. Frame counters (captured/analyzed/skipped/
+  failed), queue depths and model load state always; latency histograms for
+  capture, each pipeline stage, DeepFace/model calls and the TFT blit unless
+  LUMI_METRICS=0, which installs no timing hooks at all (metrics.py).
+- /healthz (liveness) and /ready (200 once models are warm, else 503) report
+  per-model load state and load times; models load in the background so the
+  server answers right after boot. `resident` (models.py) shows which models
+  are in memory, their RSS and load/unload counts: LUMI_MODEL_BUDGET_MB caps
+  the total and idle models are unloaded after LUMI_MODEL_IDLE_SEC.
+- LUMI_EMBEDDINGS=auto (default) computes Facenet embeddings only while
+  someone consumes them: a /status, /identify or /gallery request in the
+  last EMBEDDING_DEMAND_SEC (?emb=none opts out) or an /events subscriber.
+  Facenet loads on the first such new track and is unloaded once idle.
+  on: always; off: never (emotion only, Facenet is never loaded).
+- LUMI_WORKERS=N runs the engine in N worker processes (inference_pool.py):
+  frames go through shared-memory slots, results come back over a pipe,
+  and a watchdog restarts crashed or stuck workers, so /status and the
+  display keep answering during inference. 0 (default) analyzes in the
+  vision thread. With workers, stats.engine reports them (state, restarts,
+  per-worker engine stats) and the IPC overhead.
+- Faces pass a quality gate before the models (quality.py: sharpness,
+  exposure, size, pose); skipped faces are counted per reason in
+  stats.engine.quality and cast no mood vote. LUMI_QUALITY_VOTES=1 also
+  weights each vote by the face's quality score.
+- A face crop that still looks like the last one on its track (perceptual
+  hash within a few bits, roi_cache.py) reuses the cached emotion and
+  Facenet results; stats.engine.roi_cache has hits, saved model ms and
+  evictions (LRU, TTL, memory cap, ended tracks).
+- Inference is scheduled adaptively (scheduler.py, LUMI_ADAPTIVE=0 for the
+  fixed stride): unchanged face ROIs are skipped, motion raises the rate, and
+  a CPU budget caps it; see stats.scheduler for the rate and skip reasons.
+- LUMI_CAMERAS=name=source[@priority],... runs one pipeline per camera or
+  stream (own capture, scheduler, mood window and log) against the one
+  engine or worker pool. GET /status/<name> and /history?source=<name>
+  serve each; /status is the first. A fair-share scheduler (scheduler.py)
+  sheds frames from the lowest-priority stream once inference saturates,
+  and in-process the cameras' face ROIs share batched model calls.
+- Camera frames come from capture.LatestFrameCapture: a grab thread drains the
+  device and only the newest frame is decoded for analysis. LUMI_CAMERA may
+  also name a video file, an image directory or synthetic[:N] (sources.py),
+  played back at camera pace; bench_pipeline.py replays them offline.
+- The TFT (tft.py) draws precomputed frames: progress images are decoded once
+  at boot, text frames are LRU-cached, and the blit goes to /dev/fb* when an
+  fbdev panel driver is present; tft_preview.jpg is a throttled debug copy.
+  Only the display worker (display.py) draws: /display/* and the button just
+  post the wanted state, bursts collapse into one draw, toggles redraw at once.
+
+Inference backend (LUMI_BACKEND, see backends.py): auto | engine | deepface | dnn | dnn-int8 | stub.
+"auto" keeps the original behaviour:
 - If a module named `emotion` is importable and it provides either:
     1) function: analyze_frame(frame_bgr) -> dict with keys:
        { "present": bool,
          "dominant_emotion": <str from deepface like "happy"/"sad"/"angry"/"surprise"/"fear"/"disgust"/"neutral">,
          "emotion_conf": float,
-         "embedding": np.ndarray (float32, L2-normalized, shape ~128-512) }
+         "embedding": np.ndarray (float32, L2-normalized, shape ~128-512),
+         "faces": optional list of { track_id, box, dominant_emotion, emotion_conf } }
        (you can add this thin wrapper to your file)
     OR
     2) class: EmotionEngine with .analyze(frame_bgr) returning the same dict
-- Otherwise we fallback to internal DeepFace pipeline.
+       (emotion.py ships one: detect-once-then-track, all faces in one batched model call)
+- Otherwise we fallback to the full DeepFace pipeline (backends.DeepFaceEngine).
 
 Progress images expected at: /app/images/progress/{0,25,50,75,100}.png
 """
@@ -34,13 +106,51 @@ import threading
 import numpy as np
 import cv2
 from flask import Flask, request, jsonify
-from PIL import Image, ImageDraw, ImageFont
+
+import backends
+import metrics
+import models
+import sources
+import wire
+from aggregator import SlidingWindowAggregator
+from capture import LatestFrameCapture
+from display import DisplayScheduler, MODE_PROGRESS
+from events import EventHub
+from gallery import Gallery, IDENTIFY_MIN_COS
+from inference_pool import InferencePool
+from moodlog import MoodLog, FrameLog
+from scheduler import AdaptiveScheduler, FairShare, FixedScheduler
+from state import StateStore
+from tft import TFT
 
 # ----------------- CONFIG -----------------
-PORT = 8000
+def _env(name, default, cast=str):
+    """Optional LUMI_* environment override for a config value (benchmarks, dev boxes)."""
+    v = os.environ.get(name)
+    return default if v in (None, "") else cast(v)
+
+def _camera(v):
+    return int(v) if str(v).isdigit() else v
+
+def _flag(v):
+    return str(v).lower() not in ("0", "false", "off", "no")
+
+PORT = _env("LUMI_PORT", 8000, int)
+EVENTS_PORT = _env("LUMI_EVENTS_PORT", PORT + 1, int)   # /events SSE + /status long-poll
+LONGPOLL_MAX_SEC = 30.0
+CAMERA_SOURCE = _env("LUMI_CAMERA", 0, _camera)   # device index, video file, image dir or synthetic[:N]
+# Several cameras/streams: "name=source[@priority],..." (sources.parse_sources);
+# the first one is /status. Empty: just CAMERA_SOURCE, as "main".
+CAMERAS = sources.parse_sources(_env("LUMI_CAMERAS", "")) or [("main", CAMERA_SOURCE, 1.0)]
+LOOP_SOURCES = _env("LUMI_LOOP", False, _flag)   # replay files/synthetic streams forever
 FRAME_W, FRAME_H = 320, 240
-ANALYZE_EVERY_N_FRAMES = 3
-EMOTION_WINDOW_SEC = 5.0
+ANALYZE_EVERY_N_FRAMES = 3   # base stride; the adaptive scheduler moves around it
+ADAPTIVE_SCHEDULING = _env("LUMI_ADAPTIVE", True, _flag)   # motion/budget-driven (scheduler.py)
+# Latency histograms for /metrics (metrics.py). Off = no timing hooks at all.
+METRICS = _env("LUMI_METRICS", True, _flag)
+EMOTION_WINDOW_SEC = 5.0     # sliding window for the /status label
+EMOTION_EMA_ALPHA = None     # e.g. 0.2 to use an EMA label instead of the window
+QUALITY_WEIGHTED_VOTES = _env("LUMI_QUALITY_VOTES", False, _flag)   # vote weight = conf * face quality
 
 # TFT (logical) size — adjust to your panel
 TFT_W, TFT_H = 240, 240
@@ -59,56 +169,26 @@ PROGRESS_FILES = {
 }
 
 # Where to drop a preview JPG if you don’t have a real TFT driver yet
-RUNTIME_OUT = "/app/runtime"
+RUNTIME_OUT = _env("LUMI_RUNTIME", "/app/runtime")
 os.makedirs(RUNTIME_OUT, exist_ok=True)
 
-# ----------------- TFT BACKEND -----------------
-class TFT:
-    def __init__(self, w=TFT_W, h=TFT_H):
-        self.w, self.h = w, h
-        try:
-            self.font = ImageFont.truetype(
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18
-            )
-        except Exception:
-            self.font = ImageFont.load_default()
-        # If you have a real display (e.g. ST7789), init it here.
-
-    def show_image_file(self, path: str):
-        try:
-            img = Image.open(path).convert("RGB").resize((self.w, self.h))
-            self._blit(img)
-        except Exception as e:
-            print("[TFT] show_image_file error:", e)
-
-    def show_text(self, text: str):
-        img = Image.new("RGB", (self.w, self.h), (0, 0, 0))
-        d = ImageDraw.Draw(img)
-        # naive word-wrapping
-        lines, line = [], ""
-        for w in text.split():
-            if d.textlength((line + " " + w).strip(), font=self.font) > (self.w - 16):
-                if line: lines.append(line)
-                line = w
-            else:
-                line = (line + " " + w).strip()
-        if line: lines.append(line)
-        y = 8
-        for ln in lines[:10]:
-            d.text((8, y), ln, font=self.font, fill=(255, 255, 255))
-            y += 22
-        self._blit(img)
+# Enrolled identities (memory-mapped .npy + id sidecar, see gallery.py)
+GALLERY_DIR = os.path.join(RUNTIME_OUT, "gallery")
 
-    def _blit(self, img: Image.Image):
-        # Replace this with real display driver call if available
-        img.save(os.path.join(RUNTIME_OUT, "tft_preview.jpg"), quality=92)
+# Mood time series: one record per EMOTION_WINDOW_SEC window (see moodlog.py)
+MOOD_LOG_DIR = os.path.join(RUNTIME_OUT, "moodlog")
+# ... and one record per processed frame, for offline tuning (tune_hearts.py)
+FRAME_LOG = _env("LUMI_FRAME_LOG", True, _flag)
 
-tft = TFT()
+# ----------------- TFT BACKEND -----------------
+tft = TFT(TFT_W, TFT_H, preview_dir=RUNTIME_OUT)
+tft.preload_progress(PROGRESS_FILES)
+if METRICS:
+    metrics.instrument(tft, "_blit", "lumi_tft_blit_seconds", "TFT framebuffer blit time")
 
 # ----------------- MODE TOGGLE (BUTTON) -----------------
-MODE_TEXT = "text"
-MODE_PROGRESS = "progress"
-current_mode = MODE_PROGRESS  # default
+# Only the display worker touches the TFT; everything else posts to it.
+display = DisplayScheduler(tft, mode=MODE_PROGRESS, text="—", progress=0)
 
 try:
     import RPi.GPIO as GPIO
@@ -116,101 +196,107 @@ try:
     GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
     def _button_cb(channel):
-        global current_mode
-        current_mode = MODE_TEXT if current_mode == MODE_PROGRESS else MODE_PROGRESS
-        print("[GPIO] Toggled mode ->", current_mode)
+        print("[GPIO] Toggled mode ->", display.toggle_mode())
 
     GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, callback=_button_cb, bouncetime=300)
 except Exception as e:
     print("[GPIO] Skipping GPIO button (not on Pi or no wiring):", e)
 
-# ----------------- EMOTION ENGINE (emotion.py or fallback) -----------------
+# ----------------- EMOTION ENGINE (backends.py) -----------------
+# LUMI_BACKEND picks the inference backend: auto (emotion.py if present,
+# else DeepFace), engine, deepface, dnn, dnn-int8 or stub. See backends.py.
+INFERENCE_BACKEND = _env("LUMI_BACKEND", "auto")
+BACKEND_OPTIONS = {}   # backend kwargs (bench_pipeline.py sets the stub's latency)
+# 0: analyze in the vision thread. N: N worker processes (inference_pool.py),
+# keeping the GIL-heavy model work off the HTTP and display threads.
+INFERENCE_WORKERS = _env("LUMI_WORKERS", 0, int)
+# Facenet embeddings: auto (only while a client consumes them) | on | off
+EMBEDDINGS = _env("LUMI_EMBEDDINGS", "auto")
+EMBEDDING_DEMAND_SEC = 60.0   # auto: how long one request keeps embeddings on
+
 _engine = None
-_use_external = False
 
-def _try_load_external_engine():
-    global _engine, _use_external
-    try:
-        import emotion  # your file
-        # Prefer a class EmotionEngine with .analyze(frame_bgr)
-        if hasattr(emotion, "EmotionEngine"):
-            _engine = emotion.EmotionEngine()
-            _use_external = True
-            print("[Engine] Using emotion.EmotionEngine from emotion.py")
-            return
-        # Or a function analyze_frame(frame_bgr)
-        if hasattr(emotion, "analyze_frame") and callable(emotion.analyze_frame):
-            class _Wrapper:
-                def analyze(self, frame_bgr):
-                    return emotion.analyze_frame(frame_bgr)
-            _engine = _Wrapper()
-            _use_external = True
-            print("[Engine] Using emotion.analyze_frame from emotion.py")
-            return
-        print("[Engine] emotion.py found but no compatible API; using fallback.")
-    except Exception as e:
-        print("[Engine] No emotion.py or import error; using fallback. Details:", e)
-
-_try_load_external_engine()
-
-# Fallback: DeepFace internal
-if not _use_external:
-    from deepface import DeepFace
-    _facenet_ready = False
-    def _ensure_facenet():
-        global _facenet_ready
-        if not _facenet_ready:
-            try:
-                DeepFace.build_model(model_name="Facenet")
-                _facenet_ready = True
-            except Exception as e:
-                print("[DeepFace] preload warn:", e)
-
-    def _fallback_analyze(frame_bgr):
-        """Return dict like external engine would."""
-        out = {
-            "present": False,
-            "dominant_emotion": "neutral",
-            "emotion_conf": 0.0,
-            "embedding": None,
-        }
+# ----------------- MODEL LOADING (background) -----------------
+# The HTTP server and boot splash come up first; engine selection, model
+# import and one dummy inference per model happen here, in the background.
+engine_ready = threading.Event()
+model_state = {}     # name -> { state: pending|loading|ready|error, load_ms, error }
+_boot_t0 = time.time()
+
+def _warmup_steps():
+    steps = getattr(_engine, "warmup_steps", None)
+    if callable(steps):
+        return steps()
+    dummy = np.zeros((FRAME_H, FRAME_W, 3), np.uint8)
+    return [("engine", lambda: _engine.analyze(dummy))]
+
+def load_models():
+    global _engine
+    options = dict(BACKEND_OPTIONS)
+    if EMBEDDINGS == "off":
+        options["with_embedding"] = False
+    if INFERENCE_WORKERS > 0:
+        _engine = InferencePool(INFERENCE_BACKEND, workers=INFERENCE_WORKERS,
+                                frame_shape=(FRAME_H, FRAME_W, 3), backend_options=options)
+    else:
+        _engine = backends.create(INFERENCE_BACKEND, **options)
+    print(f"[Engine] backend={INFERENCE_BACKEND} ({type(_engine).__name__})")
+    steps = _warmup_steps()
+    for name, _ in steps:
+        model_state[name] = {"state": "pending", "load_ms": None}
+    for name, fn in steps:
+        model_state[name] = {"state": "loading", "load_ms": None}
+        t0 = time.time()
         try:
-            _ensure_facenet()
-            analysis = DeepFace.analyze(
-                img_path=frame_bgr, actions=["emotion"], enforce_detection=False
-            )
-            if isinstance(analysis, list) and analysis:
-                analysis = analysis[0]
-            if analysis:
-                de = analysis.get("dominant_emotion", "neutral")
-                emo_map = analysis.get("emotion", {})
-                conf = float(emo_map.get(de, 1.0)) if isinstance(emo_map, dict) else 1.0
-                out["dominant_emotion"] = de
-                out["emotion_conf"] = conf
-                out["present"] = True
-
-                # Crop by region if available
-                roi = frame_bgr
-                if "region" in analysis:
-                    r = analysis["region"]
-                    x, y, w, h = max(0, r.get("x", 0)), max(0, r.get("y", 0)), r.get("w", 0), r.get("h", 0)
-                    if w and h: roi = frame_bgr[y:y+h, x:x+w]
-
-                reps = DeepFace.represent(img_path=roi, model_name="Facenet", enforce_detection=False)
-                if isinstance(reps, list) and reps and "embedding" in reps[0]:
-                    v = np.array(reps[0]["embedding"], dtype=np.float32)
-                    n = np.linalg.norm(v)
-                    out["embedding"] = v / n if n > 0 else v
+            fn()
+            model_state[name] = {"state": "ready", "load_ms": round((time.time() - t0) * 1000.0, 1)}
         except Exception as e:
-            print("[Fallback] analyze warn:", e)
-        return out
+            print(f"[Models] {name} warm-up failed:", e)
+            model_state[name] = {"state": "error", "load_ms": None, "error": str(e)}
+        print(f"[Models] {name}: {model_state[name]['state']} {model_state[name]['load_ms']} ms")
+    if len(pipelines) > 1 and not isinstance(_engine, InferencePool):
+        # In-process, the cameras' engines are clones sharing these models.
+        backends.share_models(_engine, parties=lambda: sum(p.busy for p in pipelines))
+    if METRICS:
+        _instrument_models()
+    engine_ready.set()
+
+def _instrument_models():
+    # After warm-up, so load time stays out of the per-call histograms.
+    metrics.instrument_deepface()
+    clf = getattr(_engine, "_classifier", None)
+    if clf is not None and hasattr(clf, "predict_proba"):
+        metrics.instrument(clf, "predict_proba", "lumi_model_call_seconds",
+                           "direct model call time", model="emotion")
+    if getattr(_engine, "with_embedding", False) and callable(getattr(_engine, "embedder", None)):
+        metrics.instrument(_engine, "embedder", "lumi_model_call_seconds",
+                           "direct model call time", model="facenet")
+
+def models_ready() -> bool:
+    return engine_ready.is_set() and all(m["state"] == "ready" for m in model_state.values())
 
 # Thin adapter so the rest of the code calls one function
 def analyze_frame(frame_bgr):
-    if _use_external:
-        return _engine.analyze(frame_bgr)
-    else:
-        return _fallback_analyze(frame_bgr)
+    return _engine.analyze(frame_bgr)
+
+_embedding_demand = 0.0   # time of the last request that wanted the embedding
+
+def note_embedding_demand():
+    global _embedding_demand
+    _embedding_demand = time.time()
+
+def want_embeddings() -> bool:
+    """Whether the engines should compute embeddings for the next frame."""
+    if EMBEDDINGS != "auto":
+        return EMBEDDINGS == "on"
+    if time.time() - _embedding_demand < EMBEDDING_DEMAND_SEC:
+        return True
+    ev = events.stats() if events is not None else {}
+    return bool(ev.get("subscribers") or ev.get("longpolls"))
+
+def engine_stats():
+    fn = getattr(_engine, "stats", None)
+    return fn() if callable(fn) else {}
 
 # Map DeepFace labels -> {happy, neutral, upset}
 def map_to_three(label: str) -> str:
@@ -223,121 +309,606 @@ def map_to_three(label: str) -> str:
         return "upset"
     return "neutral"
 
-def b64_from_vec(vec: np.ndarray) -> str:
+def _status_face(face: dict) -> dict:
+    # A face the quality gate skipped has no reading: null emotion, not "neutral".
+    classified = bool(face.get("classified", True))
+    de = str(face.get("dominant_emotion", "neutral")) if classified else None
+    q = face.get("quality")
+    return {
+        "track_id": face.get("track_id"),
+        "box": [int(v) for v in face.get("box") or (0, 0, 0, 0)],
+        "emotion": map_to_three(de) if classified else None,
+        "dominant_emotion": de,
+        "emotion_conf": float(face.get("emotion_conf", 0.0)) if classified else 0.0,
+        "classified": classified,
+        "quality": None if q is None else round(float(q), 3),
+        "skip_reason": face.get("skip_reason"),
+    }
+
+def b64_from_vec(vec: np.ndarray, fmt: str = "f32", key: str = None) -> str:
     if vec is None:
         return ""
-    if vec.dtype != np.float32:
-        vec = vec.astype(np.float32)
-    return base64.b64encode(vec.tobytes()).decode("ascii")
+    # encode_embedding memoizes on key, so an unchanged vector is encoded once
+    return base64.b64encode(wire.encode_embedding(vec, fmt, key=key)).decode("ascii")
 
 # ----------------- VISION THREAD -----------------
-cap = None
+grabber = None
+scheduler = None
 stop_flag = False
+vision_counts = {"analyzed": 0, "skipped": 0, "failed": 0, "shed": 0}
+_stage_hists = {}
+
+EMPTY_STATE = {
+    "present": False,
+    "emotion": "neutral",
+    "emotion_conf": 0.0,
+    "embedding": None,
+    "embedding_hash": "",
+    "last_seen_ts": 0,
+    "frame_ts": 0.0,
+    "faces": (),
+}
 
-# shared state
-last_present = False
-last_emotion_label = "neutral"
-last_emotion_conf = 0.0
-last_embedding = None
-last_seen_ts = 0
-
-# smoothing window
-_counts = {"happy": 0, "neutral": 0, "upset": 0}
-_window_t0 = time.time()
-
-def vision_loop():
-    global cap, stop_flag
-    global last_present, last_emotion_label, last_emotion_conf, last_embedding, last_seen_ts
-    global _counts, _window_t0
-
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_W)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_H)
-
-    if not cap.isOpened():
-        print("[Camera] Could not open camera")
+def _mood_window():
+    return SlidingWindowAggregator(("happy", "neutral", "upset"), EMOTION_WINDOW_SEC,
+                                   ema_alpha=EMOTION_EMA_ALPHA)
+
+# shared state: the vision thread publishes one immutable snapshot per
+# analyzed frame; HTTP handlers only ever read store.current()
+store = StateStore(dict(EMPTY_STATE))
+
+# smoothing: sliding window over the last EMOTION_WINDOW_SEC of analyzed
+# frames, confidence-weighted (aggregator.py); updated on every frame
+mood = _mood_window()
+
+# one mood_log-style record per window; record() never touches the SD card
+moodlog = MoodLog(MOOD_LOG_DIR)
+framelog = FrameLog(MOOD_LOG_DIR) if FRAME_LOG else None
+
+class Pipeline:
+    """
+    One camera or stream: capture, scheduler, counters and its own state
+    store, mood window and mood log. The first pipeline uses the module
+    globals above, so /status, /events and /history stay as they were.
+    """
+
+    def __init__(self, name, source, priority=1.0, primary=False):
+        self.name = name
+        self.source = source
+        self.priority = priority
+        self.grabber = None
+        self.scheduler = None
+        self.engine = None     # in-process engine once models are ready
+        self.busy = False      # inside an engine call (BatchingClassifier parties)
+        if primary:
+            self.counts, self.store, self.mood, self.moodlog = vision_counts, store, mood, moodlog
+            self.framelog = framelog
+        else:
+            self.counts = {"analyzed": 0, "skipped": 0, "failed": 0, "shed": 0}
+            self.store = StateStore(dict(EMPTY_STATE))
+            self.mood = _mood_window()
+            self.moodlog = MoodLog(os.path.join(MOOD_LOG_DIR, name))
+            self.framelog = FrameLog(os.path.join(MOOD_LOG_DIR, name)) if FRAME_LOG else None
+
+    def analyze(self, image):
+        want = want_embeddings()
+        if isinstance(_engine, InferencePool):
+            # The pool keeps one engine per key in each worker.
+            return _engine.analyze(image, key=self.name if len(pipelines) > 1 else None,
+                                   want_embedding=want)
+        self.engine.want_embedding = want
+        return self.engine.analyze(image)
+
+    def engine_stats(self):
+        if self.engine is None or self.engine is _engine:
+            return engine_stats()
+        fn = getattr(self.engine, "stats", None)
+        return fn() if callable(fn) else {}
+
+pipelines = [Pipeline(name, src, prio, primary=(i == 0)) for i, (name, src, prio) in enumerate(CAMERAS)]
+pipeline_by_name = {p.name: p for p in pipelines}
+# Splits inference between the cameras; None with one camera.
+fair_share = FairShare(lanes=max(1, INFERENCE_WORKERS)) if len(pipelines) > 1 else None
+if fair_share is not None:
+    for p in pipelines:
+        fair_share.register(p.name, p.priority)
+
+def smoothed_label(now=None, agg=None) -> str:
+    agg = mood if agg is None else agg
+    if EMOTION_EMA_ALPHA:
+        return agg.ema_label(default="neutral")
+    return agg.dominant(now, weighted=True, default="neutral")
+
+def _state_key(state):
+    """What has to change for subscribers to be woken (see state.py)."""
+    return (
+        state["present"],
+        state["emotion"],
+        state["embedding_hash"],
+        tuple((f["track_id"], f["emotion"]) for f in state["faces"]),
+    )
+
+def vision_context(pipe=None):
+    """Per-pipeline state carried from one analyzed frame to the next."""
+    return {"embedding": None, "embedding_src": None, "embedding_hash": "",
+            "last_seen_ts": 0, "next_window": None, "last_out": None,
+            "store": pipe.store if pipe else store, "mood": pipe.mood if pipe else mood,
+            "moodlog": pipe.moodlog if pipe else moodlog,
+            "framelog": pipe.framelog if pipe else framelog,
+            "analyze": pipe.analyze if pipe else analyze_frame}
+
+def process_frame(frame, ctx, out=None, vote=True):
+    """
+    Analyze one captured frame, fold it into the mood window / mood log and
+    publish the new state. Returns (state, timings_ms). Everything is timed
+    against frame.ts, so replays (bench_pipeline.py) are deterministic.
+
+    With `out` given (the scheduler skipped inference on an unchanged scene)
+    that result is carried forward instead of running the engine. vote=False
+    publishes it without adding it to the mood window again: a frame shed
+    under load says nothing new about a scene that may be changing.
+    """
+    t0 = time.perf_counter()
+    reused = out is not None
+    if out is None:
+        out = ctx["analyze"](frame.image)
+        ctx["last_out"] = out
+    t1 = time.perf_counter()
+
+    present = bool(out.get("present", False))
+    classified = bool(out.get("classified", present))   # False: the quality gate skipped the face
+    de = str(out.get("dominant_emotion", "neutral"))
+    conf = float(out.get("emotion_conf", 0.0))
+    emb = out.get("embedding", None)
+
+    # Ternary mapping
+    tri = map_to_three(de)
+
+    # Update smoothing window
+    now = frame.ts
+    mood = ctx["mood"]
+    if present and classified and vote:
+        weight = conf
+        if QUALITY_WEIGHTED_VOTES and out.get("quality") is not None:
+            weight *= float(out["quality"])
+        mood.add(tri, weight=weight, ts=now)
+    emotion_label = smoothed_label(now, mood)
+    if ctx["framelog"] is not None:
+        ctx["framelog"].record(now, de, conf, out.get("quality"), present, classified, reused, shed=not vote)
+    if ctx["next_window"] is None:
+        ctx["next_window"] = now + EMOTION_WINDOW_SEC
+    elif now >= ctx["next_window"]:
+        c = mood.counts(now)
+        ctx["moodlog"].record(now, c["happy"], c["upset"], c["neutral"], EMOTION_WINDOW_SEC)
+        ctx["next_window"] = now + EMOTION_WINDOW_SEC
+
+    # shared
+    if present:
+        ctx["last_seen_ts"] = int(now)
+    if emb is not None and emb is not ctx["embedding_src"]:
+        # engines hand back the same object while an embedding is cached
+        embedding = np.array(emb, dtype=np.float32)
+        embedding.setflags(write=False)
+        ctx["embedding"], ctx["embedding_src"] = embedding, emb
+        ctx["embedding_hash"] = wire.embedding_hash(embedding)
+    state = {
+        "present": present,
+        "emotion": emotion_label,
+        "emotion_conf": conf,
+        "embedding": ctx["embedding"],
+        "embedding_hash": ctx["embedding_hash"],
+        "last_seen_ts": ctx["last_seen_ts"],
+        "frame_ts": frame.ts,
+        "faces": tuple(_status_face(f) for f in out.get("faces", [])),
+    }
+    ctx["store"].publish(state, key=_state_key(state))
+
+    timings = dict(out.get("timings") or {})
+    timings["analyze"] = (t1 - t0) * 1000.0
+    timings["aggregate"] = (time.perf_counter() - t1) * 1000.0
+    return state, timings
+
+def _observe_stages(timings):
+    for stage, ms in timings.items():
+        h = _stage_hists.get(stage)
+        if h is None:
+            h = _stage_hists[stage] = metrics.REGISTRY.histogram(
+                "lumi_stage_seconds", "vision pipeline stage time", stage=stage)
+        h.observe(ms / 1000.0)
+
+def make_scheduler():
+    if ADAPTIVE_SCHEDULING:
+        return AdaptiveScheduler(base_stride=ANALYZE_EVERY_N_FRAMES)
+    return FixedScheduler(ANALYZE_EVERY_N_FRAMES)
+
+def vision_loop(pipe=None):
+    global grabber, scheduler, stop_flag
+    pipe = pipe or pipelines[0]
+    primary = pipe is pipelines[0]
+
+    src = sources.open_source(pipe.source, loop=LOOP_SOURCES)
+    if METRICS and primary:
+        src = metrics.timed_capture(cv2.VideoCapture(src) if isinstance(src, int) else src)
+    pipe.grabber = LatestFrameCapture(src, FRAME_W, FRAME_H)
+    if primary:
+        grabber = pipe.grabber
+    if not pipe.grabber.start():
+        print(f"[Vision] {pipe.name}: could not open {pipe.source!r}")
         return
+    if METRICS and primary:
+        metrics.instrument(pipe.grabber, "read", "lumi_frame_wait_seconds",
+                           "time the analyzer waits for a camera frame")
 
-    idx = 0
+    # The camera warms up while the models load.
+    while not stop_flag and not engine_ready.wait(0.5):
+        pass
+    if not isinstance(_engine, InferencePool):
+        pipe.engine = _engine if primary else backends.clone(_engine)
+
+    ctx = vision_context(pipe)
+    pipe.scheduler = make_scheduler()
+    if primary:
+        scheduler = pipe.scheduler
+    counts = pipe.counts
+    seq = 0
     while not stop_flag:
-        ok, frame = cap.read()
-        if not ok:
-            time.sleep(0.03)
-            continue
-
-        idx += 1
-        if idx % ANALYZE_EVERY_N_FRAMES != 0:
-            time.sleep(0.005)
+        # Only every stride-th grabbed frame is decoded; the capture thread
+        # drops the rest without paying for retrieve(). The scheduler sets
+        # the stride from motion and the CPU budget.
+        frame = pipe.grabber.read(min_seq=seq + pipe.scheduler.next_stride())
+        if frame is None:
             continue
+        seq = frame.seq
 
         try:
-            out = analyze_frame(frame)
-            present = bool(out.get("present", False))
-            de = str(out.get("dominant_emotion", "neutral"))
-            conf = float(out.get("emotion_conf", 0.0))
-            emb = out.get("embedding", None)
-
-            # Ternary mapping
-            tri = map_to_three(de)
-
-            # Update smoothing window
-            now = time.time()
-            if now - _window_t0 >= EMOTION_WINDOW_SEC:
-                # finalize stabilized label
-                last_emotion_label = max(_counts, key=lambda k: _counts[k])
-                _counts = {"happy": 0, "neutral": 0, "upset": 0}
-                _window_t0 = now
-            else:
-                if tri in _counts:
-                    _counts[tri] += 1
-
-            # shared
-            last_present = present
-            if present:
-                last_seen_ts = int(time.time())
-            last_emotion_conf = conf
-            if emb is not None:
-                last_embedding = emb
-
+            run, _ = pipe.scheduler.decide(frame)
+            if not run:
+                # Unchanged scene: keep the last result (and the mood window) fresh.
+                process_frame(frame, ctx, out=ctx["last_out"])
+                counts["skipped"] += 1
+                continue
+            if fair_share is not None and ctx["last_out"] is not None and not fair_share.admit(pipe.name):
+                # Inference is saturated and this stream is over its share.
+                process_frame(frame, ctx, out=ctx["last_out"], vote=False)
+                counts["shed"] += 1
+                continue
+            pipe.busy = True
+            try:
+                state, timings = process_frame(frame, ctx)
+            finally:
+                pipe.busy = False
+            if fair_share is not None:
+                fair_share.used(pipe.name, timings["analyze"])
+            pipe.scheduler.analyzed(frame, timings["analyze"], [f["box"] for f in state["faces"]])
+            pipe.grabber.mark_published(frame)
+            counts["analyzed"] += 1
+            if METRICS:
+                _observe_stages(timings)
         except Exception as e:
-            print("[Vision] warn:", e)
+            counts["failed"] += 1
+            metrics.REGISTRY.counter("lumi_vision_errors_total", "frames that raised in the pipeline",
+                                     type=type(e).__name__).inc()
+            print(f"[Vision] {pipe.name} warn:", e)
 
-        time.sleep(0.005)
-
-    try:
-        cap.release()
-    except Exception:
-        pass
+    pipe.grabber.stop()
 
 # ----------------- HTTP SERVER -----------------
 app = Flask(__name__)
-
-text_buffer = "—"
-progress_pct = 0  # 0/25/50/75/100
+events = None   # EventHub (SSE + long-poll on EVENTS_PORT), started in main()
+gallery = Gallery(GALLERY_DIR)
+
+
+def status_payload(snap, with_stats=False, known_hash=None, pipe=None) -> dict:
+    """JSON-ready body. The vector is left out if the client already has known_hash."""
+    pipe = pipe or pipelines[0]
+    st = snap.state
+    h = st["embedding_hash"]
+    send_vec = st["embedding"] is not None and known_hash != h
+    body = {
+        "version": snap.version,
+        "present": bool(st["present"]),
+        "emotion": st["emotion"] or "neutral",
+        "emotion_conf": float(st["emotion_conf"]),
+        "embedding": b64_from_vec(st["embedding"], key=h) if send_vec else "",
+        "embedding_hash": h,
+        "last_seen_ts": int(st["last_seen_ts"]),
+        "frame_ts": float(st["frame_ts"]),
+        "faces": list(st["faces"]),
+    }
+    if with_stats:
+        agg = pipe.mood
+        body["stats"] = {
+            "capture": pipe.grabber.stats() if pipe.grabber is not None else {},
+            "scheduler": pipe.scheduler.stats() if pipe.scheduler is not None else {},
+            "engine": pipe.engine_stats(),
+            "mood": {"counts": agg.counts(), "weights": agg.weights(), "ema": agg.ema()},
+            "events": events.stats() if events is not None else {},
+            "tft": tft.stats(),
+            "display": display.stats(),
+            "moodlog": pipe.moodlog.stats(),
+            "framelog": pipe.framelog.stats() if pipe.framelog is not None else None,
+        }
+        if fair_share is not None:
+            body["stats"]["source"] = pipe.name
+            body["stats"]["fair_share"] = fair_share.stats()
+    return body
 
 @app.route("/status", methods=["GET"])
 def status():
+    return _status_response(pipelines[0])
+
+@app.route("/status/<source>", methods=["GET"])
+def status_source(source):
+    pipe = pipeline_by_name.get(source)
+    if pipe is None:
+        return jsonify({"ok": False, "error": f"unknown source, have {sorted(pipeline_by_name)}"}), 404
+    return _status_response(pipe)
+
+@app.route("/sources", methods=["GET"])
+def sources_list():
+    return jsonify({"sources": [
+        {"name": p.name, "source": str(p.source), "priority": p.priority,
+         "version": p.store.version, "counts": dict(p.counts)} for p in pipelines
+    ]})
+
+def _status_response(pipe):
+    # ?emb=none: this client does not use the embedding (see want_embeddings()).
+    fmt = request.args.get("emb", "f16")
+    if fmt != "none":
+        note_embedding_demand()
+    # ?since=<version> long-polls (bounded) until the state changes. Many
+    # waiting clients should use the EventHub port instead: each request here
+    # holds a Flask thread.
+    since = request.args.get("since", type=int)
+    if since is not None:
+        timeout = min(request.args.get("timeout", LONGPOLL_MAX_SEC, type=float), LONGPOLL_MAX_SEC)
+        snap = pipe.store.wait(since, timeout)
+    else:
+        snap = pipe.store.current()
+
+    # Conditional GET: the ETag is the state version, so an unchanged state
+    # costs a bodyless 304.
+    etag = f'W/"{snap.version}"'
+    if etag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+        resp = app.response_class(status=304)
+    else:
+        known = request.args.get("embedding_hash")
+        if fmt == "none":
+            known = snap.state["embedding_hash"]   # JSON: leave the vector out
+        accept = request.headers.get("Accept", "")
+        if "application/octet-stream" in accept or "application/msgpack" in accept:
+            # Opt-in compact encodings (see wire.py); f16 embedding by default.
+            if fmt not in wire.EMB_FORMATS:
+                return jsonify({"ok": False, "error": f"emb must be one of {sorted(wire.EMB_FORMATS)}"}), 400
+            body = status_payload(snap, with_stats=False, pipe=pipe)
+            vec = snap.state["embedding"] if known != body["embedding_hash"] else None
+            if "application/msgpack" in accept and wire.msgpack is not None:
+                resp = app.response_class(wire.pack_msgpack(body, vec, fmt), mimetype="application/msgpack")
+            else:
+                resp = app.response_class(wire.pack_status(body, vec, fmt), mimetype="application/octet-stream")
+        else:
+            resp = jsonify(status_payload(snap, with_stats=request.args.get("stats", False, type=_flag),
+                                          known_hash=known, pipe=pipe))
+    resp.headers["ETag"] = etag
+    resp.headers["Vary"] = "Accept"
+    resp.headers["X-State-Version"] = str(snap.version)
+    return resp
+
+@app.route("/history", methods=["GET"])
+def history():
+    # ?from=&to= are unix seconds (default: the last 24 h); ?bucket=<sec>
+    # sums windows per bucket, and is picked automatically for long ranges.
+    # ?source=<name> picks a camera (default: the first).
+    pipe = pipeline_by_name.get(request.args.get("source", pipelines[0].name))
+    if pipe is None:
+        return jsonify({"ok": False, "error": f"unknown source, have {sorted(pipeline_by_name)}"}), 404
+    moodlog = pipe.moodlog
+    t_from = request.args.get("from", type=float)
+    t_to = request.args.get("to", type=float)
+    if request.args.get("format") == "csv":
+        return app.response_class(moodlog.to_csv(t_from, t_to), mimetype="text/csv")
+    bucket = request.args.get("bucket", type=float)
+    if bucket is not None and bucket <= 0:
+        return jsonify({"ok": False, "error": "bucket must be > 0"}), 400
+    return jsonify(moodlog.query(t_from, t_to, bucket))
+
+# ----------------- METRICS -----------------
+def _collect():
+    """Counters and gauges that already live elsewhere, read at scrape time."""
+    cap = grabber.stats() if grabber is not None else {}
+    yield ("lumi_frames_total", "counter", "camera frames by outcome", [
+        ({"outcome": "captured"}, cap.get("grabbed")),
+        ({"outcome": "skipped"}, cap.get("dropped")),
+        ({"outcome": "unchanged"}, vision_counts["skipped"]),
+        ({"outcome": "analyzed"}, vision_counts["analyzed"]),
+        ({"outcome": "failed"}, vision_counts["failed"]),
+        ({"outcome": "stale"}, cap.get("stale")),
+        ({"outcome": "grab_failed"}, cap.get("failed_grabs")),
+    ])
+    latency = cap.get("last_latency_ms")
+    yield ("lumi_frame_to_status_seconds", "gauge", "age of the last frame when its state was published",
+           [({}, None if latency is None else round(latency / 1000.0, 4))])
+    ev = events.stats() if events is not None else {}
+    yield ("lumi_queue_depth", "gauge", "items waiting per queue", [
+        ({"queue": "display"}, display.stats()["pending"]),
+        ({"queue": "moodlog"}, moodlog.stats()["pending"]),
+        ({"queue": "framelog"}, framelog.stats()["pending"] if framelog is not None else None),
+        ({"queue": "longpoll"}, ev.get("longpolls")),
+        ({"queue": "sse"}, ev.get("subscribers")),
+    ])
+    yield ("lumi_model_ready", "gauge", "1 once a model is loaded and warm", [
+        ({"model": name}, 1 if st["state"] == "ready" else 0) for name, st in model_state.items()
+    ])
+    yield ("lumi_model_load_seconds", "gauge", "model load + warm-up time", [
+        ({"model": name}, st["load_ms"] / 1000.0) for name, st in model_state.items()
+        if st.get("load_ms") is not None
+    ])
+    resident = _resident_models()
+    yield ("lumi_model_resident_bytes", "gauge", "RSS a loaded model added at load (0: unloaded)", [
+        (dict(labels, model=name), (m["rss_mb"] or 0.0) * 2 ** 20 if m["loaded"] else 0)
+        for labels, st in resident for name, m in st["models"].items()
+    ])
+    yield ("lumi_model_loads_total", "counter", "model loads and unloads (by reason)", [
+        (dict(labels, model=name, event="load"), m["loads"])
+        for labels, st in resident for name, m in st["models"].items()
+    ] + [
+        (dict(labels, model=name, event="unload", reason=r), n)
+        for labels, st in resident for name, m in st["models"].items() for r, n in m["unloads"].items()
+    ])
+    if scheduler is not None:
+        st = scheduler.stats()
+        yield ("lumi_scheduler_decisions_total", "counter", "analyze/skip decisions by reason",
+               [({"decision": "analyze", "reason": r}, n) for r, n in st.get("analyzed", {}).items()]
+               + [({"decision": "skip", "reason": r}, n) for r, n in st.get("skipped", {}).items()])
+        yield ("lumi_scheduler_stride", "gauge", "frames advanced per decode", [({}, st["stride"])])
+        yield ("lumi_analysis_fps", "gauge", "effective inference rate (10 s window)",
+               [({}, st.get("analysis_fps"))])
+    if isinstance(_engine, InferencePool):
+        st = _engine.stats()
+        yield ("lumi_inference_workers", "gauge", "inference worker processes by state", [
+            ({"state": s}, sum(1 for w in st["workers"] if w["state"] == s))
+            for s in ("starting", "ready", "busy", "dead")
+        ])
+        yield ("lumi_inference_worker_restarts_total", "counter", "inference worker restarts", [
+            ({"worker": str(i)}, w["restarts"]) for i, w in enumerate(st["workers"])
+        ])
+        yield ("lumi_inference_failures_total", "counter", "frames lost to worker errors, crashes or timeouts",
+               [({}, st["failed"])])
+    yield ("lumi_state_version", "gauge", "current /status state version", [({}, store.version)])
+    if fair_share is not None:
+        yield ("lumi_source_frames_total", "counter", "frames per camera by outcome", [
+            ({"source": p.name, "outcome": k}, n) for p in pipelines for k, n in p.counts.items()
+        ])
+        yield ("lumi_source_inference_share", "gauge", "inference busy time per second, per camera", [
+            ({"source": n, "kind": k}, st[k]) for n, st in fair_share.stats()["sources"].items()
+            for k in ("busy", "share")
+        ])
+
+def _resident_models():
+    """[(labels, models.MANAGER.stats())] for this process and each inference worker."""
+    if not isinstance(_engine, InferencePool):
+        return [({}, models.MANAGER.stats())]
+    out = []
+    for i, w in enumerate(_engine.stats()["workers"]):
+        eng = w.get("engine") or {}
+        if "models" not in eng and eng:
+            eng = next(iter(eng.values())) or {}   # one engine per camera, one manager
+        if isinstance(eng.get("models"), dict):
+            out.append(({"worker": str(i)}, eng["models"]))
+    return out
+
+metrics.REGISTRY.collect(_collect)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return app.response_class(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+# ----------------- IDENTITY GALLERY -----------------
+def vec_from_b64(s: str) -> np.ndarray:
+    """base64 float32[] -> vector; ValueError if it is not one."""
+    try:
+        raw = base64.b64decode(s)
+    except (TypeError, ValueError):   # binascii.Error is a ValueError
+        raise ValueError("embedding is not valid base64")
+    if not raw or len(raw) % 4:
+        raise ValueError(f"embedding has {len(raw)} bytes, not a float32 vector")
+    return np.frombuffer(raw, dtype=np.float32)
+
+def _request_embedding(data):
+    """
+    Embedding from the request (base64 f32), else the current one from the
+    camera. ValueError for a malformed one.
+    """
+    b64 = data.get("embedding") or request.args.get("embedding")
+    if b64:
+        return vec_from_b64(b64)
+    note_embedding_demand()
+    return store.current().state["embedding"]
+
+@app.route("/gallery", methods=["GET"])
+def gallery_list():
+    return jsonify(dict(gallery.info(), ids=gallery.ids))
+
+@app.route("/gallery", methods=["POST"])
+def gallery_enroll():
+    data = request.get_json(silent=True) or {}
+    person_id = str(data.get("id", "")).strip()
+    if not person_id:
+        return jsonify({"ok": False, "error": "id is required"}), 400
+    try:
+        vec = _request_embedding(data)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if vec is None:
+        return jsonify({"ok": False, "error": "no embedding given and nobody in view"}), 409
+    try:
+        samples = gallery.enroll(person_id, vec, merge=bool(data.get("merge", True)))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "id": person_id, "samples": samples, "count": len(gallery)})
+
+@app.route("/gallery/<person_id>", methods=["DELETE"])
+def gallery_delete(person_id):
+    if not gallery.delete(person_id):
+        return jsonify({"ok": False, "error": "unknown id"}), 404
+    return jsonify({"ok": True, "count": len(gallery)})
+
+@app.route("/identify", methods=["GET", "POST"])
+def identify():
+    data = request.get_json(silent=True) or {}
+    try:
+        k = max(1, min(int(data.get("k", request.args.get("k", 5))), 50))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "k must be an integer"}), 400
+    try:
+        vec = _request_embedding(data)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if vec is None:
+        return jsonify({"ok": True, "present": False, "match": None, "matches": []})
+    if gallery.dim is not None and vec.size != gallery.dim:
+        return jsonify({"ok": False, "error": f"embedding has dim {vec.size}, gallery uses {gallery.dim}"}), 400
+    t0 = time.perf_counter()
+    matches = gallery.search(vec, k)
+    took_ms = (time.perf_counter() - t0) * 1000.0
+    best = matches[0] if matches and matches[0][1] >= IDENTIFY_MIN_COS else None
     return jsonify({
-        "present": bool(last_present),
-        "emotion": last_emotion_label or "neutral",
-        "emotion_conf": float(last_emotion_conf),
-        "embedding": b64_from_vec(last_embedding) if last_embedding is not None else "",
-        "embedding_hash": "",  # optional: add a short hash if you like
-        "last_seen_ts": int(last_seen_ts),
+        "ok": True,
+        "match": {"id": best[0], "score": best[1]} if best else None,
+        "matches": [{"id": pid, "score": sc} for pid, sc in matches],
+        "took_ms": round(took_ms, 3),
     })
 
+def _health():
+    return {
+        "ok": True,
+        "ready": models_ready(),
+        "uptime_s": round(time.time() - _boot_t0, 2),
+        "backend": INFERENCE_BACKEND,
+        "engine": type(_engine).__name__ if _engine is not None else None,
+        "models": model_state,
+        "resident": models.MANAGER.stats(),
+    }
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness: the server is up, whatever the models are doing.
+    return jsonify(_health())
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Readiness: 200 only once every model has loaded and been warmed up.
+    body = _health()
+    return jsonify(body), (200 if body["ready"] else 503)
+
 @app.route("/display/text", methods=["POST"])
 def set_text():
-    global text_buffer
     data = request.get_json(silent=True) or {}
-    text_buffer = str(data.get("text", ""))[:200]
-    if current_mode == MODE_TEXT:
-        tft.show_text(text_buffer)
+    display.set_text(str(data.get("text", ""))[:200])
     return jsonify({"ok": True})
 
 @app.route("/display/progress", methods=["POST"])
 def set_progress():
-    global progress_pct
     data = request.get_json(silent=True) or {}
     image_id = str(data.get("image_id", "progress_0"))
     try:
@@ -346,31 +917,9 @@ def set_progress():
         pct = 0
     if pct not in (0, 25, 50, 75, 100):
         pct = 0
-    progress_pct = pct
-    if current_mode == MODE_PROGRESS:
-        path = PROGRESS_FILES.get(progress_pct, "")
-        if path and os.path.exists(path):
-            tft.show_image_file(path)
+    display.set_progress(pct)
     return jsonify({"ok": True})
 
-def ui_heartbeat():
-    last_mode = None
-    last_drawn = None
-    while not stop_flag:
-        if current_mode != last_mode:
-            last_mode = current_mode
-            last_drawn = None  # force redraw on mode switch
-        # Draw if not already current
-        if current_mode == MODE_TEXT and text_buffer != last_drawn:
-            tft.show_text(text_buffer)
-            last_drawn = text_buffer
-        elif current_mode == MODE_PROGRESS and progress_pct != last_drawn:
-            path = PROGRESS_FILES.get(progress_pct, "")
-            if path and os.path.exists(path):
-                tft.show_image_file(path)
-                last_drawn = progress_pct
-        time.sleep(0.1)
-
 def get_ip():
     try:
         import socket
@@ -384,20 +933,38 @@ def get_ip():
 
 def main():
     # Boot splash on TFT (since no OLED)
-    boot = f"Starting…\nIP: {get_ip()}:{PORT}\nMode: {current_mode.upper()}"
-    tft.show_text(boot)
+    boot = f"Starting…\nIP: {get_ip()}:{PORT}\nMode: {display.mode.upper()}"
+    display.splash(boot)
+
+    mt = threading.Thread(target=load_models, daemon=True)
+    mt.start()
+
+    for p in pipelines:
+        p.moodlog.start()
+        if p.framelog is not None:
+            p.framelog.start()
+
+    global events
+    events = EventHub(store, lambda snap: status_payload(snap, with_stats=False), port=EVENTS_PORT)
+    events.start()
 
-    vt = threading.Thread(target=vision_loop, daemon=True)
-    vt.start()
+    for p in pipelines:
+        vt = threading.Thread(target=vision_loop, args=(p,), name=f"vision-{p.name}", daemon=True)
+        vt.start()
 
-    ut = threading.Thread(target=ui_heartbeat, daemon=True)
-    ut.start()
+    display.start()
 
     app.run(host="0.0.0.0", port=PORT, debug=False, threaded=True)
 
 def _shutdown(sig, frame):
     global stop_flag
     stop_flag = True
+    for p in pipelines:
+        p.moodlog.flush()
+        if p.framelog is not None:
+            p.framelog.flush()
+    if isinstance(_engine, InferencePool):
+        _engine.close()
     os._exit(0)
 
 if __name__ == "__main__":
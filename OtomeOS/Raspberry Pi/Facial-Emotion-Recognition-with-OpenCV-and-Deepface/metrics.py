@@ -0,0 +1,204 @@
+# metrics.py
+"""
+Counters, gauges and latency histograms, rendered as Prometheus text for
+GET /metrics.
+
+Hot-path timing is added from the outside, never inside the timed code:
+instrument(obj, "method", ...) replaces an attribute with a timing wrapper
+and timed_capture(cap) proxies a capture's grab()/retrieve(). main.py only
+installs them when LUMI_METRICS is on, so with it off the hot path runs the
+exact same code as before, at zero cost.
+
+Counts that already exist elsewhere (capture counters, display queue, model
+load state, ...) are not duplicated: collect(fn) registers a callback that
+reads them when /metrics is scraped.
+"""
+
+import sys
+import time
+import bisect
+import threading
+
+# seconds; covers a 0.1 ms TFT blit up to a multi-second model load
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels) + "}"
+
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, v):
+        self.value = v
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        out, acc = [], 0
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            acc += c
+            out.append((name + "_bucket", labels + (("le", _num(le)),), acc))
+        out.append((name + "_sum", labels, round(total, 6)))
+        out.append((name + "_count", labels, n))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}        # name -> (type, help, {labels tuple: metric})
+        self._collectors = []
+
+    def _get(self, cls, kind, name, help, labels, **kw):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, _, series = self._metrics.setdefault(name, (kind, help, {}))
+            m = series.get(key)
+            if m is None:
+                m = series[key] = cls(**kw)
+            return m
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, "counter", name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, "gauge", name, help, labels)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, "histogram", name, help, labels, buckets=buckets)
+
+    def collect(self, fn):
+        """fn() -> iterable of (name, type, help, [(labels dict, value)]), read at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            items = [(n, k, h, dict(s)) for n, (k, h, s) in sorted(self._metrics.items())]
+        for name, kind, help, series in items:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, m in sorted(series.items()):
+                if kind == "histogram":
+                    for n, l, v in m.samples(name, labels):
+                        lines.append(f"{n}{_labels(l)} {_num(v)}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_num(m.value)}")
+        for fn in self._collectors:
+            try:
+                for name, kind, help, samples in fn():
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, v in samples:
+                        if v is None:
+                            continue
+                        lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {_num(v)}")
+            except Exception as e:
+                lines.append(f"# collector error: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ---------- hooks (installed only when instrumentation is on) ----------
+def instrument(obj, attr, name, help="", registry=REGISTRY, **labels):
+    """Replace obj.attr (a callable) with a wrapper that times every call."""
+    fn = getattr(obj, attr)
+    if getattr(fn, "_lumi_timed", False):
+        return fn
+    hist = registry.histogram(name, help, **labels)
+    errors = registry.counter(name.replace("_seconds", "") + "_errors_total",
+                              f"exceptions raised by {attr}", **labels)
+    clock = time.perf_counter
+
+    def timed(*a, **kw):
+        t0 = clock()
+        try:
+            return fn(*a, **kw)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            hist.observe(clock() - t0)
+
+    timed._lumi_timed = True
+    timed.__wrapped__ = fn
+    setattr(obj, attr, timed)
+    return timed
+
+
+class _TimedCapture:
+    """cv2.VideoCapture proxy timing grab() and retrieve()."""
+
+    def __init__(self, cap, registry):
+        self._cap = cap
+        self._grab = registry.histogram("lumi_capture_seconds", "camera grab/retrieve time", op="grab")
+        self._retrieve = registry.histogram("lumi_capture_seconds", "camera grab/retrieve time", op="retrieve")
+
+    def grab(self):
+        t0 = time.perf_counter()
+        ok = self._cap.grab()
+        self._grab.observe(time.perf_counter() - t0)
+        return ok
+
+    def retrieve(self, *a):
+        t0 = time.perf_counter()
+        out = self._cap.retrieve(*a)
+        self._retrieve.observe(time.perf_counter() - t0)
+        return out
+
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+def timed_capture(cap, registry=REGISTRY):
+    return _TimedCapture(cap, registry)
+
+
+def instrument_deepface(registry=REGISTRY):
+    """Time DeepFace.analyze / DeepFace.represent if deepface has been imported."""
+    mod = getattr(sys.modules.get("deepface"), "DeepFace", None)
+    if mod is None:
+        return False
+    for fn in ("analyze", "represent"):
+        if hasattr(mod, fn):
+            instrument(mod, fn, "lumi_deepface_call_seconds", "DeepFace API call time",
+                       registry=registry, call=fn)
+    return True
@@ -0,0 +1,245 @@
+# models.py
+"""
+Model manager: which models are resident, within a memory budget.
+
+On a 1-2 GB Pi the emotion model and Facenet (plus TensorFlow) do not leave
+much room, and Facenet is only needed while someone consumes embeddings.
+Engines therefore do not hold their models; they register a loader here
+and borrow the model per call:
+
+    MANAGER.register("facenet", load_fn, unload_fn, source="deepface:Facenet")
+    with MANAGER.use("facenet") as model:
+        ...
+
+- A model loads on first use (or at warm-up, unless it is in LAZY_MODELS).
+- Before a load, least-recently-used idle models are unloaded until the
+  resident total plus the newcomer's last measured size fits BUDGET_MB
+  (LUMI_MODEL_BUDGET_MB; unset = no budget). A model in use is never
+  unloaded; if nothing can go, the load happens anyway and is counted
+  as over budget.
+- A model unused for its idle_sec (LUMI_MODEL_IDLE_SEC, default IDLE_SEC)
+  is unloaded by a reaper thread. idle_sec=None keeps it until the budget
+  needs the room.
+
+A model's resident size is the process RSS growth across its load (loads
+are serialized, so they do not overlap), and on unload the RSS actually
+given back is recorded too: TensorFlow keeps part of its heap, so
+freed_mb can be well below rss_mb. stats() reports both per model, with
+load/unload counts and load times.
+"""
+
+import gc
+import os
+import sys
+import time
+import threading
+import contextlib
+
+BUDGET_MB = float(os.environ.get("LUMI_MODEL_BUDGET_MB") or 0) or None
+IDLE_SEC = float(os.environ.get("LUMI_MODEL_IDLE_SEC") or 300.0)
+# Loaded on first use instead of at boot ("facenet": only once embeddings are wanted).
+LAZY_MODELS = {n.strip() for n in os.environ.get("LUMI_LAZY_MODELS", "facenet").split(",") if n.strip()}
+REAP_EVERY_SEC = 5.0
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def drop_deepface_model(model_name):
+    """Forget DeepFace's own cached copy of a model (the cache moved between versions)."""
+    dropped = False
+    for modname in ("deepface.modules.modeling", "deepface.DeepFace", "deepface.commons.functions"):
+        mod = sys.modules.get(modname)
+        for attr in ("cached_models", "model_obj"):
+            cache = getattr(mod, attr, None)
+            if not isinstance(cache, dict):
+                continue
+            for d in [cache] + [v for v in cache.values() if isinstance(v, dict)]:
+                if d.pop(model_name, None) is not None:
+                    dropped = True
+    return dropped
+
+
+class _Model:
+    def __init__(self, name, load, unload, source, idle_sec):
+        self.name = name
+        self.load = load
+        self.unload = unload
+        self.source = source
+        self.idle_sec = idle_sec
+        self.obj = None
+        self.loaded = False
+        self.in_use = 0
+        self.last_used = 0.0
+        self.lock = threading.Lock()     # serializes this model's load
+        self.rss_mb = None               # RSS growth of the last load
+        self.freed_mb = None             # RSS given back by the last unload
+        self.load_ms = None
+        self.loads = 0
+        self.unloads = {}                # reason -> count
+        self.error = None
+
+
+class ModelManager:
+    def __init__(self, budget_mb=BUDGET_MB, idle_sec=IDLE_SEC):
+        self.budget_mb = budget_mb
+        self.idle_sec = idle_sec
+        self._models = {}
+        self._lock = threading.Lock()        # bookkeeping
+        self._load_lock = threading.Lock()   # one load at a time, so RSS deltas are per model
+        self._reaper = None
+        self.over_budget = 0
+
+    def register(self, name, load, unload=None, source=None, idle_sec="default"):
+        """
+        load() -> model; unload(model) frees whatever the loader cached
+        elsewhere. Registering the same name and source again is a no-op;
+        another source replaces the model (unloading the old one).
+        """
+        idle = self.idle_sec if idle_sec == "default" else idle_sec
+        with self._lock:
+            m = self._models.get(name)
+            if m is not None and m.source == source:
+                return
+            if m is not None and m.loaded:
+                self._unload(m, "replaced")
+            self._models[name] = _Model(name, load, unload, source, idle)
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def is_loaded(self, name):
+        m = self._models.get(name)
+        return m is not None and m.loaded
+
+    # ---------- borrowing ----------
+    def get(self, name):
+        """The model, loading it if needed (not held: may be evicted later)."""
+        with self.use(name) as obj:
+            return obj
+
+    @contextlib.contextmanager
+    def use(self, name):
+        m = self._models[name]
+        with self._lock:
+            m.in_use += 1
+            m.last_used = time.time()
+        try:
+            if not m.loaded:
+                self._load(m)
+            yield m.obj
+        finally:
+            with self._lock:
+                m.in_use -= 1
+                m.last_used = time.time()
+
+    def _load(self, m):
+        with m.lock:
+            if m.loaded:
+                return
+            with self._load_lock:
+                self._make_room(m)
+                before = rss_mb()
+                t0 = time.perf_counter()
+                try:
+                    obj = m.load()
+                except Exception as e:
+                    m.error = f"{type(e).__name__}: {e}"
+                    raise
+                m.load_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+                m.rss_mb = round(max(0.0, rss_mb() - before), 1)
+            with self._lock:
+                m.obj, m.loaded, m.error = obj, True, None
+                m.loads += 1
+            print(f"[Models] loaded {m.name}: {m.rss_mb} MB in {m.load_ms} ms")
+        self._start_reaper()
+
+    def _make_room(self, m):
+        if self.budget_mb is None:
+            return
+        need = m.rss_mb or 0.0
+        with self._lock:
+            while self._resident() + need > self.budget_mb:
+                idle = [o for o in self._models.values() if o.loaded and not o.in_use and o is not m]
+                if not idle:
+                    self.over_budget += 1
+                    print(f"[Models] loading {m.name} over the {self.budget_mb:.0f} MB budget")
+                    return
+                self._unload(min(idle, key=lambda o: o.last_used), "budget")
+
+    def _resident(self):
+        return sum(o.rss_mb or 0.0 for o in self._models.values() if o.loaded)
+
+    def _unload(self, m, reason):
+        """Caller holds self._lock."""
+        obj, m.obj, m.loaded = m.obj, None, False
+        before = rss_mb()
+        if m.unload is not None:
+            try:
+                m.unload(obj)
+            except Exception as e:
+                print(f"[Models] unload {m.name} warn:", e)
+        del obj
+        gc.collect()
+        m.freed_mb = round(max(0.0, before - rss_mb()), 1)
+        m.unloads[reason] = m.unloads.get(reason, 0) + 1
+        print(f"[Models] unloaded {m.name} ({reason}), {m.freed_mb} MB returned")
+
+    def unload(self, name, reason="manual"):
+        with self._lock:
+            m = self._models.get(name)
+            if m is None or not m.loaded or m.in_use:
+                return False
+            self._unload(m, reason)
+            return True
+
+    # ---------- idle eviction ----------
+    def evict_idle(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for m in self._models.values():
+                if (m.loaded and not m.in_use and m.idle_sec is not None
+                        and now - m.last_used > m.idle_sec):
+                    self._unload(m, "idle")
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(REAP_EVERY_SEC)
+            self.evict_idle()
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return {
+                "budget_mb": self.budget_mb,
+                "resident_mb": round(self._resident(), 1),
+                "rss_mb": round(rss_mb(), 1),
+                "over_budget": self.over_budget,
+                "models": {m.name: {
+                    "loaded": m.loaded,
+                    "in_use": m.in_use,
+                    "rss_mb": m.rss_mb,
+                    "freed_mb": m.freed_mb,
+                    "load_ms": m.load_ms,
+                    "loads": m.loads,
+                    "unloads": dict(m.unloads),
+                    "idle_sec": round(now - m.last_used, 1) if m.last_used else None,
+                    "error": m.error,
+                } for m in self._models.values()},
+            }
+
+
+MANAGER = ModelManager()
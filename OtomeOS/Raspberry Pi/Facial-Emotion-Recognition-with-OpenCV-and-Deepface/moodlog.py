@@ -0,0 +1,368 @@
+# moodlog.py
+"""
+Mood time series: one record per emotion window, the same fields as
+mood_log.csv (window counts, ratios, classification).
+
+Writing a CSV row from the vision thread would put SD-card latency on the
+frame path. MoodLog.record() only appends to an in-memory ring and a pending
+batch; a background thread flushes the batch every FLUSH_SEC (or once
+FLUSH_RECORDS are waiting) with one write to the current segment:
+
+    <dir>/mood-<first unix ts>.bin   8-byte header (b"LMLG", u16 layout
+                                     version, u16 record size), then packed
+                                     little-endian records (RECORD dtype)
+
+Segments rotate at SEGMENT_MAX_BYTES and the oldest are deleted beyond
+MAX_SEGMENTS. A torn tail after a power cut is ignored on read. A batch that
+fails to write is retried with the next flush, but at most MAX_PENDING
+records wait: with the card full or read-only the oldest are dropped (and
+counted) rather than piling up in memory.
+
+query(from, to, bucket) answers from the ring for recent records and from
+the segments for older ones, and downsamples server-side: windows are summed
+into `bucket`-second buckets (chosen automatically to stay under MAX_POINTS)
+and each bucket is re-classified from its summed counts.
+
+Window records only keep the outcome of one WINDOW_SEC / ratio setting.
+FrameLog writes what went into them, one 14-byte record per processed frame
+(FRAME_RECORD: timestamp, the 7-class label, its confidence, face quality
+and present / classified / reused / shed flags) to frames-<ts>.bin segments in the
+same directory and layout, so tune_hearts.py can re-score other settings
+offline. Nothing is kept in memory beyond the pending batch.
+"""
+
+import os
+import glob
+import math
+import time
+import struct
+import threading
+from collections import deque
+
+import numpy as np
+
+FLUSH_SEC = 30.0
+FLUSH_RECORDS = 64
+MAX_PENDING = 8192               # records held back while flushes fail
+RING_RECORDS = 17280             # one day of 5 s windows
+SEGMENT_MAX_BYTES = 1 << 20      # ~36k records
+MAX_SEGMENTS = 60
+MAX_POINTS = 720                 # rows per /history answer before auto-bucketing
+
+# Hearts rule (same defaults as emotion.py)
+POS_RATIO = 0.60
+NEG_RATIO = 0.60
+MIN_EFFECTIVE_FRAMES = 10
+
+CLASSES = ("insufficient", "mixed", "positive", "negative")
+_CLASS_CODE = {c: i for i, c in enumerate(CLASSES)}
+
+LAYOUT_VERSION = 1
+RECORD = np.dtype([
+    ("ts", "<f8"), ("window_sec", "<f4"),
+    ("pos", "<u2"), ("neg", "<u2"), ("neu", "<u2"),
+    ("pos_ratio", "<f4"), ("neg_ratio", "<f4"), ("cls", "u1"),
+])
+_HEADER = struct.Struct("<4sHH")
+_MAGIC = b"LMLG"
+
+# Per-frame records (FrameLog). Labels are coded in emotion.emotion_labels order.
+FRAME_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+_LABEL_CODE = {l: i for i, l in enumerate(FRAME_LABELS)}
+NO_LABEL = 255
+FRAME_PRESENT, FRAME_CLASSIFIED, FRAME_REUSED, FRAME_SHED = 1, 2, 4, 8   # SHED: reused, cast no vote
+FRAME_RECORD = np.dtype([
+    ("ts", "<f8"), ("conf", "<f2"), ("quality", "<f2"), ("label", "u1"), ("flags", "u1"),
+])
+FRAME_SEGMENT_MAX_BYTES = 4 << 20     # ~300k frames
+FRAME_MAX_SEGMENTS = 64               # ~2-3 weeks at 10 analyzed fps
+_FRAME_MAGIC = b"LMFR"
+
+CSV_HEADER = ("timestamp_iso,window_seconds,pos_count,neg_count,neu_count,"
+              "effective_frames,pos_ratio,neg_ratio,classification")
+
+
+def classify(pos, neg, pos_ratio=POS_RATIO, neg_ratio=NEG_RATIO, min_effective=MIN_EFFECTIVE_FRAMES):
+    """positive | negative | mixed | insufficient from pos/neg counts (neutral ignored)."""
+    effective = pos + neg
+    if effective < min_effective:
+        return "insufficient"
+    pr, nr = pos / effective, neg / effective
+    if pr >= pos_ratio and pr > nr:
+        return "positive"
+    if nr >= neg_ratio and nr > pr:
+        return "negative"
+    return "mixed"
+
+
+class SegmentLog:
+    """
+    Batched, append-only writer of fixed-size records to rotating segment
+    files <dir>/<prefix>-<first unix ts>.bin. Records are tuples in `dtype`
+    field order; _append() never touches the disk, the flush thread does.
+    """
+
+    prefix = None
+    dtype = None
+    magic = None
+    segment_max_bytes = SEGMENT_MAX_BYTES
+    max_segments = MAX_SEGMENTS
+    max_pending = MAX_PENDING
+
+    def __init__(self, directory, flush_sec=FLUSH_SEC):
+        self.dir = directory
+        self.flush_sec = flush_sec
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._seg_path = None
+        self._stop = False
+        self.records = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.dropped = 0                 # records lost to max_pending
+        self.last_flush_ms = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.n_segments = len(self.segments())   # kept up to date by _segment(): stats() never lists the dir
+
+    # ---------- write side ----------
+    def _append(self, rec):
+        """Caller holds self._lock."""
+        self._pending.append(rec)
+        self.records += 1
+        if len(self._pending) > self.max_pending:
+            self._trim()
+        if len(self._pending) >= FLUSH_RECORDS:
+            self._wake.set()
+
+    def _trim(self):
+        """Caller holds self._lock. Drops the oldest (a batch at a time, so appends stay cheap)."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            n = min(len(self._pending), excess + FLUSH_RECORDS)
+            del self._pending[:n]
+            self.dropped += n
+
+    def start(self):
+        t = threading.Thread(target=self._run, name=self.prefix + "log", daemon=True)
+        t.start()
+        return t
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_sec)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def _segment(self, first_ts):
+        if self._seg_path and os.path.exists(self._seg_path) \
+                and os.path.getsize(self._seg_path) < self.segment_max_bytes:
+            return self._seg_path
+        path = os.path.join(self.dir, f"{self.prefix}-{int(first_ts)}.bin")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(_HEADER.pack(self.magic, LAYOUT_VERSION, self.dtype.itemsize))
+            self.n_segments += 1
+        else:
+            # appending after a torn record would misalign everything after it
+            body = os.path.getsize(path) - _HEADER.size
+            os.truncate(path, _HEADER.size + max(0, body) // self.dtype.itemsize * self.dtype.itemsize)
+        self._seg_path = path
+        segs = self.segments()
+        for old in segs[:-self.max_segments]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        self.n_segments = min(len(segs), self.max_segments)
+        return path
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        t0 = time.perf_counter()
+        try:
+            path = self._segment(batch[0][0])
+            with open(path, "ab") as f:
+                f.write(np.array(batch, dtype=self.dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self.flushes += 1
+        except Exception as e:
+            self.flush_errors += 1
+            print(f"[{type(self).__name__}] flush error:", e)
+            with self._lock:
+                self._pending[:0] = batch   # retry next time ...
+                self._trim()                # ... within max_pending
+            return 0
+        self.last_flush_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+        return len(batch)
+
+    # ---------- read side ----------
+    def segments(self):
+        return segment_paths(self.dir, self.prefix)
+
+    def read_segment(self, path):
+        return read_segment(path, self.dtype, self.magic)
+
+    def read(self, t_from=-math.inf, t_to=math.inf):
+        """Every flushed record in [t_from, t_to), oldest first."""
+        return read_segments(self.segments(), self.dtype, self.magic, t_from, t_to)
+
+    def stats(self):
+        return {
+            "records": self.records,
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+            "segments": self.n_segments,
+        }
+
+
+def _segment_start(path):
+    return int(os.path.basename(path).rsplit("-", 1)[1][:-4])
+
+
+def segment_paths(directory, prefix):
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*.bin")), key=_segment_start)
+
+
+def read_segment(path, dtype=RECORD, magic=_MAGIC):
+    with open(path, "rb") as f:
+        head = f.read(_HEADER.size)
+        if len(head) < _HEADER.size:
+            return np.empty(0, dtype)
+        got, version, size = _HEADER.unpack(head)
+        if got != magic or size != dtype.itemsize:
+            print(f"[MoodLog] skipping {path}: unknown layout")
+            return np.empty(0, dtype)
+        raw = f.read()
+    n = len(raw) // dtype.itemsize   # drop a torn tail
+    return np.frombuffer(raw[:n * dtype.itemsize], dtype=dtype)
+
+
+def read_segments(paths, dtype=RECORD, magic=_MAGIC, t_from=-math.inf, t_to=math.inf):
+    """Records of sorted segments within [t_from, t_to); segments outside are not read."""
+    starts = [_segment_start(p) for p in paths]
+    parts = []
+    for i, path in enumerate(paths):
+        nxt = starts[i + 1] if i + 1 < len(paths) else math.inf
+        if nxt < t_from or starts[i] >= t_to:
+            continue
+        a = read_segment(path, dtype, magic)
+        parts.append(a[(a["ts"] >= t_from) & (a["ts"] < t_to)])
+    return np.concatenate(parts) if parts else np.empty(0, dtype)
+
+
+class MoodLog(SegmentLog):
+    prefix = "mood"
+    dtype = RECORD
+    magic = _MAGIC
+
+    def __init__(self, directory, flush_sec=FLUSH_SEC, ring_records=RING_RECORDS):
+        super().__init__(directory, flush_sec)
+        self._ring = deque(maxlen=ring_records)   # tuples in RECORD field order
+
+    def record(self, ts, pos, neg, neu, window_sec):
+        """Log one window. Cheap and non-blocking: called from the vision thread."""
+        effective = pos + neg
+        rec = (float(ts), float(window_sec), int(pos), int(neg), int(neu),
+               pos / effective if effective else 0.0,
+               neg / effective if effective else 0.0,
+               _CLASS_CODE[classify(pos, neg)])
+        with self._lock:
+            self._ring.append(rec)
+            self._append(rec)
+        return CLASSES[rec[-1]]
+
+    # ---------- read side ----------
+    def _range(self, t_from, t_to):
+        with self._lock:
+            ring = np.array(list(self._ring), dtype=RECORD)
+        ring_start = ring["ts"][0] if ring.size else math.inf
+        parts = []
+        if t_from < ring_start:
+            parts.append(self.read(t_from, min(t_to, ring_start)))
+        parts.append(ring[(ring["ts"] >= t_from) & (ring["ts"] <= t_to)])
+        return np.concatenate(parts)
+
+    def query(self, t_from=None, t_to=None, bucket=None):
+        """Columnar series for [t_from, t_to], summed into `bucket`-second buckets."""
+        t_to = time.time() if t_to is None else float(t_to)
+        t_from = t_to - 86400.0 if t_from is None else float(t_from)
+        rows = self._range(t_from, t_to)
+        if not bucket and rows.size > MAX_POINTS:
+            bucket = math.ceil((t_to - t_from) / MAX_POINTS)
+        out = {"from": t_from, "to": t_to, "bucket": int(bucket) if bucket else None,
+               "windows": int(rows.size)}
+        if not bucket:
+            out.update({
+                "ts": rows["ts"].tolist(),
+                "pos": rows["pos"].tolist(), "neg": rows["neg"].tolist(), "neu": rows["neu"].tolist(),
+                "pos_ratio": np.round(rows["pos_ratio"].astype(np.float64), 3).tolist(),
+                "neg_ratio": np.round(rows["neg_ratio"].astype(np.float64), 3).tolist(),
+                "classification": [CLASSES[c] for c in rows["cls"]],
+            })
+            return out
+
+        bucket = float(bucket)
+        keys, idx = np.unique(np.floor(rows["ts"] / bucket).astype(np.int64), return_inverse=True)
+        n = keys.size
+        pos = np.bincount(idx, rows["pos"], n).astype(np.int64)
+        neg = np.bincount(idx, rows["neg"], n).astype(np.int64)
+        neu = np.bincount(idx, rows["neu"], n).astype(np.int64)
+        eff = np.maximum(pos + neg, 1)
+        cls_counts = np.zeros((n, len(CLASSES)), np.int64)
+        np.add.at(cls_counts, (idx, rows["cls"]), 1)
+        out.update({
+            "ts": (keys * bucket).tolist(),
+            "pos": pos.tolist(), "neg": neg.tolist(), "neu": neu.tolist(),
+            "pos_ratio": np.round(pos / eff, 3).tolist(),
+            "neg_ratio": np.round(neg / eff, 3).tolist(),
+            "classification": [classify(int(p), int(q)) for p, q in zip(pos, neg)],
+            "window_classes": {c: cls_counts[:, i].tolist() for i, c in enumerate(CLASSES)},
+        })
+        return out
+
+    def to_csv(self, t_from=None, t_to=None):
+        """Raw rows in the mood_log.csv layout."""
+        t_to = time.time() if t_to is None else float(t_to)
+        t_from = t_to - 86400.0 if t_from is None else float(t_from)
+        lines = [CSV_HEADER]
+        for r in self._range(t_from, t_to):
+            lines.append("%s,%.1f,%d,%d,%d,%d,%.3f,%.3f,%s" % (
+                time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(r["ts"])), r["window_sec"],
+                r["pos"], r["neg"], r["neu"], int(r["pos"]) + int(r["neg"]),
+                r["pos_ratio"], r["neg_ratio"], CLASSES[r["cls"]]))
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        return dict(super().stats(), ring=len(self._ring))
+
+
+class FrameLog(SegmentLog):
+    """Label and confidence of every processed frame, for tune_hearts.py."""
+
+    prefix = "frames"
+    dtype = FRAME_RECORD
+    magic = _FRAME_MAGIC
+    segment_max_bytes = FRAME_SEGMENT_MAX_BYTES
+    max_segments = FRAME_MAX_SEGMENTS
+
+    def record(self, ts, label, conf, quality=None, present=True, classified=True, reused=False, shed=False):
+        """Log one frame. Cheap and non-blocking: called from the vision thread."""
+        flags = ((FRAME_PRESENT if present else 0) | (FRAME_CLASSIFIED if classified else 0)
+                 | (FRAME_REUSED if reused else 0) | (FRAME_SHED if shed else 0))
+        rec = (float(ts), float(conf), math.nan if quality is None else float(quality),
+               _LABEL_CODE.get(str(label).lower(), NO_LABEL) if present else NO_LABEL, flags)
+        with self._lock:
+            self._append(rec)
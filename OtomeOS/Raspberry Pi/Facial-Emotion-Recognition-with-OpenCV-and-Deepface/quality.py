@@ -0,0 +1,142 @@
+# quality.py
+"""
+Face-quality gate: cheap checks on the gray face ROI, run before any model.
+
+A blurry, tiny, badly exposed or profile face costs a full emotion call
+(and maybe a Facenet call) and mostly produces a noisy label. score() rates
+all ROIs of a frame in one vectorized pass over SAMPLE x SAMPLE resamples:
+
+    size       shorter side of the ROI, in frame pixels
+    sharpness  variance of the 4-neighbour Laplacian
+    exposure   mean brightness and share of clipped pixels; contrast = std
+    symmetry   correlation of the left half with the mirrored right half
+               (a frontal face is roughly mirror-symmetric, a profile is not)
+
+Each face gets a score in [0, 1] (the mean of the per-check scores, usable
+as a vote weight) and `reason`, the first hard limit it fails:
+small | dark | bright | blurry | flat | profile, or None if it passes.
+QualityGate wraps score() and counts what it let through and why it
+skipped the rest.
+"""
+
+from collections import Counter
+
+import numpy as np
+import cv2
+
+SAMPLE = 48              # resample side; the emotion model's input size
+MIN_SIZE = 48            # shorter ROI side below which a face is "small"
+GOOD_SIZE = 96
+MIN_SHARPNESS = 20.0     # Laplacian variance at SAMPLE x SAMPLE
+GOOD_SHARPNESS = 150.0
+DARK = 40.0              # mean gray below: "dark"
+BRIGHT = 215.0           # mean gray above: "bright"
+MAX_CLIPPED = 0.4        # share of pixels at <= 8 or >= 247 counted against exposure
+MIN_CONTRAST = 8.0       # gray std below: "flat"
+GOOD_CONTRAST = 40.0
+MIN_SYMMETRY = 0.15      # left/mirrored-right correlation below: "profile"
+GOOD_SYMMETRY = 0.6
+
+REASONS = ("small", "dark", "bright", "blurry", "flat", "profile")
+
+
+def _ramp(x, lo, hi):
+    return np.clip((x - lo) / (hi - lo), 0.0, 1.0)
+
+
+def score(gray_rois, sizes=None):
+    """
+    [{ score, reason, size, sharpness, brightness, contrast, symmetry }] for
+    a list of face crops (gray or BGR, any size). `sizes` overrides the ROI
+    side (e.g. the detector box of an aligned crop).
+    """
+    n = len(gray_rois)
+    if not n:
+        return []
+    batch = np.zeros((n, SAMPLE, SAMPLE), np.float32)
+    side = np.zeros(n, np.float32)
+    for i, g in enumerate(gray_rois):
+        if g.size == 0:
+            continue
+        if g.ndim == 3:
+            g = cv2.cvtColor(g, cv2.COLOR_BGR2GRAY)
+        side[i] = min(g.shape[:2])
+        batch[i] = cv2.resize(g, (SAMPLE, SAMPLE), interpolation=cv2.INTER_AREA)
+    if sizes is not None:
+        side = np.asarray(sizes, np.float32)
+
+    flat = batch.reshape(n, -1)
+    brightness = flat.mean(axis=1)
+    contrast = flat.std(axis=1)
+    clipped = ((flat <= 8) | (flat >= 247)).mean(axis=1)
+    lap = (batch[:, :-2, 1:-1] + batch[:, 2:, 1:-1] + batch[:, 1:-1, :-2]
+           + batch[:, 1:-1, 2:] - 4.0 * batch[:, 1:-1, 1:-1])
+    sharpness = lap.reshape(n, -1).var(axis=1)
+    half = SAMPLE // 2
+    left = batch[:, :, :half].reshape(n, -1)
+    right = batch[:, :, ::-1][:, :, :half].reshape(n, -1)
+    left = left - left.mean(axis=1, keepdims=True)
+    right = right - right.mean(axis=1, keepdims=True)
+    symmetry = (left * right).sum(axis=1) / np.sqrt(
+        (left * left).sum(axis=1) * (right * right).sum(axis=1) + 1e-6)
+
+    exposure = np.clip(1.0 - np.abs(brightness - 128.0) / (128.0 - DARK), 0.0, 1.0) \
+        * (1.0 - np.minimum(clipped / MAX_CLIPPED, 1.0))
+    total = (_ramp(side, MIN_SIZE, GOOD_SIZE) + _ramp(sharpness, MIN_SHARPNESS, GOOD_SHARPNESS)
+             + exposure * _ramp(contrast, MIN_CONTRAST, GOOD_CONTRAST)
+             + _ramp(symmetry, MIN_SYMMETRY, GOOD_SYMMETRY)) / 4.0
+
+    fails = np.stack([side < MIN_SIZE, brightness < DARK, brightness > BRIGHT,
+                      sharpness < MIN_SHARPNESS, contrast < MIN_CONTRAST,
+                      symmetry < MIN_SYMMETRY], axis=1)
+    out = []
+    for i in range(n):
+        k = np.flatnonzero(fails[i])
+        out.append({
+            "score": round(float(total[i]), 3),
+            "reason": REASONS[k[0]] if k.size else None,
+            "size": int(side[i]),
+            "sharpness": round(float(sharpness[i]), 1),
+            "brightness": round(float(brightness[i]), 1),
+            "contrast": round(float(contrast[i]), 1),
+            "symmetry": round(float(symmetry[i]), 3),
+        })
+    return out
+
+
+class QualityGate:
+    """
+    score() plus bookkeeping. With enforce=False only the old size rule
+    (a crop smaller than the model input) rejects a face; the scores are
+    still computed, e.g. for quality-weighted votes.
+    """
+
+    def __init__(self, enforce=True):
+        self.enforce = enforce
+        self.checked = 0
+        self.passed = 0
+        self.skipped = Counter()
+        self._score_sum = 0.0
+
+    def check(self, gray_rois, sizes=None):
+        """score() for each ROI, with `reason` set only for faces to skip."""
+        results = score(gray_rois, sizes)
+        for q in results:
+            if not self.enforce:
+                q["reason"] = "small" if q["size"] < MIN_SIZE else None
+            self.checked += 1
+            self._score_sum += q["score"]
+            if q["reason"] is None:
+                self.passed += 1
+            else:
+                self.skipped[q["reason"]] += 1
+        return results
+
+    def stats(self):
+        return {
+            "enforce": self.enforce,
+            "checked": self.checked,
+            "passed": self.passed,
+            "skipped": dict(self.skipped),
+            "mean_score": round(self._score_sum / self.checked, 3) if self.checked else None,
+        }
@@ -0,0 +1,170 @@
+# roi_cache.py
+"""
+Model results cached per face ROI, keyed by a perceptual hash.
+
+Someone holding still gives nearly the same face crop frame after frame,
+and the emotion model (and Facenet) would answer the same. RoiCache keeps
+model outputs under (track_id, kind, dhash): a lookup with a crop whose
+dHash is within MAX_DISTANCE bits of a cached one for the same track
+returns the cached output instead of running the model.
+
+- dhash(): gray ROI -> 9x8 INTER_AREA resample -> the 8x8 horizontal
+  gradients. The classic dHash keeps one sign bit per gradient, but on
+  flat skin or background that sign is decided by sensor noise. Here each
+  gradient is ternary: "rises" and "falls" bits (128 in all) are only set
+  beyond GRADIENT_MARGIN gray levels, and flat stays flat. Noise, JPEG
+  artefacts and a pixel of box jitter flip a bit or two; a new expression
+  or pose flips many.
+- Entries are evicted least-recently-used beyond MAX_ENTRIES or MAX_BYTES
+  (values are counted by nbytes) and expire after TTL_SEC, so a slowly
+  changing face is re-read at least that often.
+- Entries are per track: retain(live_ids) drops those of tracks that ended,
+  invalidate(track_id) those of a track whose person changed.
+
+Safe to share between an engine's thread and its embedding model thread.
+stats() reports hits, misses, hit rate, the model time the hits saved
+(each entry remembers what computing it cost) and evictions per reason.
+"""
+
+import time
+import threading
+from collections import OrderedDict, Counter
+
+import numpy as np
+import cv2
+
+HASH_W, HASH_H = 9, 8        # 8 x 8 gradients, 2 bits each
+GRADIENT_MARGIN = 2.0        # gray levels (of the resample) below which a gradient is flat
+MAX_DISTANCE = 4             # Hamming bits within which two crops count as the same
+TTL_SEC = 3.0
+MAX_ENTRIES = 256
+MAX_BYTES = 256 * 1024
+ENTRY_OVERHEAD = 200         # rough bytes per entry besides the value
+
+
+def dhash(gray):
+    """128-bit ternary difference hash of a gray (or BGR) crop, as an int."""
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray.astype(np.float32), (HASH_W, HASH_H), interpolation=cv2.INTER_AREA)
+    d = small[:, 1:] - small[:, :-1]
+    bits = np.concatenate(((d > GRADIENT_MARGIN).ravel(), (d < -GRADIENT_MARGIN).ravel()))
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class _Entry:
+    __slots__ = ("track_id", "kind", "hash", "value", "cost_ms", "ts", "nbytes")
+
+    def __init__(self, track_id, kind, h, value, cost_ms, ts):
+        self.track_id = track_id
+        self.kind = kind
+        self.hash = h
+        self.value = value
+        self.cost_ms = cost_ms
+        self.ts = ts
+        self.nbytes = ENTRY_OVERHEAD + int(getattr(value, "nbytes", 0))
+
+
+class RoiCache:
+    def __init__(self, max_distance=MAX_DISTANCE, ttl_sec=TTL_SEC,
+                 max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_distance = max_distance
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()     # id(entry) -> _Entry, least recently used first
+        self._by_track = {}               # (track_id, kind) -> [_Entry]
+        self.nbytes = 0
+        self._lock = threading.Lock()
+
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.evictions = Counter()        # reason -> count
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, e, reason):
+        self._entries.pop(id(e), None)
+        bucket = self._by_track.get((e.track_id, e.kind))
+        if bucket is not None:
+            bucket.remove(e)
+            if not bucket:
+                del self._by_track[(e.track_id, e.kind)]
+        self.nbytes -= e.nbytes
+        self.evictions[reason] += 1
+
+    def get(self, track_id, kind, h, now=None):
+        """Cached value for a crop hashing to `h` on this track, or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._get(track_id, kind, h, now)
+
+    def _get(self, track_id, kind, h, now):
+        best, best_d = None, self.max_distance + 1
+        for e in list(self._by_track.get((track_id, kind), ())):
+            if now - e.ts > self.ttl_sec:
+                self._drop(e, "ttl")
+                continue
+            d = hamming(e.hash, h)
+            if d < best_d:
+                best, best_d = e, d
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_ms += best.cost_ms
+        self._entries.move_to_end(id(best))
+        return best.value
+
+    def put(self, track_id, kind, h, value, cost_ms=0.0, now=None):
+        if track_id is None or value is None:
+            return
+        e = _Entry(track_id, kind, h, value, cost_ms, time.time() if now is None else now)
+        with self._lock:
+            self._put(e)
+
+    def _put(self, e):
+        self._entries[id(e)] = e
+        self._by_track.setdefault((e.track_id, e.kind), []).append(e)
+        self.nbytes += e.nbytes
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries.values())), "lru")
+        while self.nbytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries.values())), "memory")
+
+    def invalidate(self, track_id):
+        """Forget every result of one track (e.g. its person changed)."""
+        with self._lock:
+            self._forget(lambda tid: tid == track_id)
+
+    def retain(self, live_ids):
+        """Forget the results of every track not in live_ids."""
+        live = set(live_ids)
+        with self._lock:
+            self._forget(lambda tid: tid not in live)
+
+    def _forget(self, match):
+        for key in [k for k in self._by_track if match(k[0])]:
+            for e in list(self._by_track[key]):
+                self._drop(e, "track")
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries, nbytes, evictions = len(self._entries), self.nbytes, dict(self.evictions)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+            "entries": entries,
+            "bytes": nbytes,
+            "evictions": evictions,
+        }
@@ -0,0 +1,310 @@
+# scheduler.py
+"""
+Adaptive analysis scheduling for vision_loop.
+
+A fixed ANALYZE_EVERY_N_FRAMES burns full CPU on a static scene and falls
+behind when the person moves. AdaptiveScheduler decides, per decoded frame,
+whether inference is worth running, and how many frames to skip before the
+next decode:
+
+- motion: the face ROI (or the whole frame when nobody is tracked) is
+  downscaled to a THUMB x THUMB gray thumbnail and compared with the one
+  from the last *analyzed* frame (mean absolute difference, 0..255). Below
+  STILL_DIFF nothing changed and inference is skipped; at MOTION_DIFF or
+  more, expression-relevant motion is assumed and the stride drops to
+  min_stride for BOOST_SEC.
+- staleness: a face is re-analyzed at least every max_skip_sec however
+  still it is, so the published emotion is never older than that.
+- budget: analysis may use at most cpu_budget of wall time. The stride is
+  raised to ceil(analyze_ms / (cpu_budget * frame_interval_ms)) whatever
+  the motion says, so a slow backend degrades the rate instead of the
+  latency.
+
+    sched = AdaptiveScheduler(base_stride=3)
+    frame = grabber.read(min_seq=seq + sched.next_stride())
+    run, reason = sched.decide(frame)
+    if run:
+        ...; sched.analyzed(frame, analyze_ms, boxes)
+
+With several cameras (main.py pipelines), FairShare sits on top: it splits
+inference time between the sources by priority and, once inference is
+saturated, sheds frames from the lowest-priority source that is over its
+share.
+"""
+
+import math
+import time
+import threading
+from collections import deque, Counter
+
+import cv2
+
+THUMB = 24                 # thumbnail side (pixels) for frame differencing
+ROI_PAD = 0.15             # grow face boxes by this fraction before cropping
+STILL_DIFF = 2.5           # mean |diff| below this: nothing changed
+MOTION_DIFF = 10.0         # mean |diff| at or above this: expression-relevant motion
+BOOST_SEC = 1.5            # stay at min_stride this long after motion
+MAX_SKIP_SEC = 1.0         # re-analyze a present face at least this often
+EMPTY_MAX_SKIP_SEC = 2.0   # ... and an empty scene at least this often
+CPU_BUDGET = 0.5           # share of wall time analysis may take
+STATIC_STRIDE_FACTOR = 2   # stride multiplier while the scene is static
+RATE_WINDOW_SEC = 10.0
+SHARE_WINDOW_SEC = 5.0     # FairShare usage window
+SATURATION = 0.9           # busy share of an inference lane that counts as saturated
+
+
+class AdaptiveScheduler:
+    def __init__(self, base_stride=3, min_stride=1, max_stride=8, cpu_budget=CPU_BUDGET,
+                 max_skip_sec=MAX_SKIP_SEC, still_diff=STILL_DIFF, motion_diff=MOTION_DIFF):
+        self.base_stride = base_stride
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.cpu_budget = cpu_budget
+        self.max_skip_sec = max_skip_sec
+        self.still_diff = still_diff
+        self.motion_diff = motion_diff
+
+        self._ref = None             # thumbnail of the last analyzed frame
+        self._roi = None             # (x, y, x2, y2) it was cut from; None = whole frame
+        self._last_ts = None         # frame.ts of the last analysis
+        self._static = False
+        self._boost_until = 0.0
+        self._prev = None            # (seq, ts) of the previous decoded frame
+        self.frame_interval = None   # EMA seconds per grabbed frame
+        self.analyze_ms = None       # EMA analysis time
+        self.last_diff = None
+
+        self.decided = 0
+        self.reasons = Counter()     # analyze reasons
+        self.skips = Counter()       # skip reasons
+        self.budget_limited = 0
+        self._runs = deque()         # wall times of recent analyses
+        self._decodes = deque()
+
+    # ---------- helpers ----------
+    def _thumb(self, image, roi):
+        if roi is not None:
+            x, y, x2, y2 = roi
+            image = image[y:y2, x:x2]
+            if image.size == 0:
+                return None
+        small = cv2.resize(image, (THUMB, THUMB), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    @staticmethod
+    def _roi_from(boxes, shape):
+        if not boxes:
+            return None
+        x = min(b[0] for b in boxes)
+        y = min(b[1] for b in boxes)
+        x2 = max(b[0] + b[2] for b in boxes)
+        y2 = max(b[1] + b[3] for b in boxes)
+        px, py = int((x2 - x) * ROI_PAD), int((y2 - y) * ROI_PAD)
+        return (max(0, x - px), max(0, y - py),
+                min(shape[1], x2 + px), min(shape[0], y2 + py))
+
+    @staticmethod
+    def _ema(old, new, a=0.2):
+        return new if old is None else old + a * (new - old)
+
+    def _trim(self, q, now):
+        while q and q[0] < now - RATE_WINDOW_SEC:
+            q.popleft()
+
+    # ---------- API ----------
+    def _stride(self):
+        if self._last_ts is not None and self._prev is not None and self._prev[1] < self._boost_until:
+            want = self.min_stride
+        elif self._static:
+            want = self.base_stride * STATIC_STRIDE_FACTOR
+        else:
+            want = self.base_stride
+        budget = self.min_stride
+        if self.analyze_ms and self.frame_interval:
+            budget = math.ceil(self.analyze_ms / (self.cpu_budget * self.frame_interval * 1000.0))
+        limited = budget > want
+        return max(self.min_stride, min(self.max_stride, max(want, budget))), limited
+
+    @property
+    def stride(self):
+        """Frames to advance before the next decode."""
+        return self._stride()[0]
+
+    def next_stride(self):
+        """stride, counting how often the budget (not motion) set it."""
+        stride, limited = self._stride()
+        self.budget_limited += limited
+        return stride
+
+    def decide(self, frame):
+        """(run_inference, reason) for a decoded capture.Frame."""
+        now = time.time()
+        self.decided += 1
+        self._decodes.append(now)
+        self._trim(self._decodes, now)
+        if self._prev is not None and frame.seq > self._prev[0]:
+            dt = (frame.ts - self._prev[1]) / (frame.seq - self._prev[0])
+            self.frame_interval = self._ema(self.frame_interval, dt)
+        self._prev = (frame.seq, frame.ts)
+
+        if self._ref is None:
+            return self._run("first", now)
+        limit = self.max_skip_sec if self._roi is not None else EMPTY_MAX_SKIP_SEC
+        if frame.ts - self._last_ts >= limit:
+            return self._run("refresh", now)
+        thumb = self._thumb(frame.image, self._roi)
+        if thumb is None or thumb.shape != self._ref.shape:
+            return self._run("first", now)
+        diff = float(cv2.absdiff(thumb, self._ref).mean())
+        self.last_diff = round(diff, 2)
+        if diff < self.still_diff:
+            self._static = True
+            reason = "static" if self._roi is not None else "empty"
+            self.skips[reason] += 1
+            return False, reason
+        self._static = False
+        if diff >= self.motion_diff:
+            self._boost_until = frame.ts + BOOST_SEC
+            return self._run("motion", now)
+        return self._run("change", now)
+
+    def _run(self, reason, now):
+        self.reasons[reason] += 1
+        self._runs.append(now)
+        self._trim(self._runs, now)
+        return True, reason
+
+    def analyzed(self, frame, analyze_ms, boxes):
+        """Record an analysis: its cost, and the reference thumbnail for the next decide()."""
+        self.analyze_ms = self._ema(self.analyze_ms, analyze_ms)
+        self._last_ts = frame.ts
+        self._roi = self._roi_from(boxes, frame.image.shape)
+        self._ref = self._thumb(frame.image, self._roi)
+
+    @staticmethod
+    def _rate(q, now):
+        # read-only: only the vision thread trims
+        return round(sum(1 for t in list(q) if t >= now - RATE_WINDOW_SEC) / RATE_WINDOW_SEC, 2)
+
+    def stats(self):
+        now = time.time()
+        return {
+            "stride": self.stride,
+            "analysis_fps": self._rate(self._runs, now),
+            "decode_fps": self._rate(self._decodes, now),
+            "frame_interval_ms": None if self.frame_interval is None else round(self.frame_interval * 1000.0, 1),
+            "analyze_ms": None if self.analyze_ms is None else round(self.analyze_ms, 1),
+            "last_diff": self.last_diff,
+            "static": self._static,
+            "decided": self.decided,
+            "analyzed": dict(self.reasons),
+            "skipped": dict(self.skips),
+            "budget_limited": self.budget_limited,
+        }
+
+
+class FixedScheduler:
+    """The old behaviour: every Nth frame, always analyzed."""
+
+    def __init__(self, stride=3):
+        self.stride = stride
+        self.decided = 0
+
+    def next_stride(self):
+        return self.stride
+
+    def decide(self, frame):
+        self.decided += 1
+        return True, "fixed"
+
+    def analyzed(self, frame, analyze_ms, boxes):
+        pass
+
+    def stats(self):
+        return {"stride": self.stride, "decided": self.decided, "adaptive": False}
+
+
+class FairShare:
+    """
+    Inference admission for several pipelines sharing one engine or pool.
+
+    Every pipeline reports its analysis time with used(). Over the last
+    SHARE_WINDOW_SEC, the busy time of all pipelines is compared with the
+    capacity (lanes x SATURATION busy-seconds per second; a lane is one
+    worker process, or the vision threads sharing one engine). Below
+    capacity every frame is admitted. Above it, each source's share is its
+    priority-weighted slice of the capacity. Of the sources over their
+    share, the lowest-priority one is shed (admit() -> False) until it is
+    back under. Higher-priority streams are shed only once no lower one is
+    over its share.
+    """
+
+    def __init__(self, lanes=1, window_sec=SHARE_WINDOW_SEC):
+        self.capacity = max(1, lanes) * SATURATION
+        self.window_sec = window_sec
+        self.load = 0.0
+        self._lock = threading.Lock()
+        self._sources = {}    # name -> { priority, busy: deque[(ts, sec)], admitted, shed }
+
+    def register(self, name, priority=1.0):
+        with self._lock:
+            self._sources[name] = {"priority": float(priority), "busy": deque(),
+                                   "admitted": 0, "shed": 0}
+
+    def unregister(self, name):
+        with self._lock:
+            self._sources.pop(name, None)
+
+    def used(self, name, analyze_ms, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            s = self._sources.get(name)
+            if s is not None:
+                s["busy"].append((now, analyze_ms / 1000.0))
+
+    def _busy(self, now):
+        cutoff = now - self.window_sec
+        out = {}
+        for name, s in self._sources.items():
+            q = s["busy"]
+            while q and q[0][0] < cutoff:
+                q.popleft()
+            out[name] = sum(sec for _, sec in q) / self.window_sec
+        return out
+
+    def _shares(self):
+        total = sum(s["priority"] for s in self._sources.values()) or 1.0
+        return {n: self.capacity * s["priority"] / total for n, s in self._sources.items()}
+
+    def admit(self, name, now=None):
+        """True if `name` may run inference on its next frame."""
+        now = time.time() if now is None else now
+        with self._lock:
+            s = self._sources.get(name)
+            if s is None:
+                return True
+            busy = self._busy(now)
+            self.load = sum(busy.values()) / self.capacity
+            if self.load < 1.0 or len(self._sources) < 2:
+                s["admitted"] += 1
+                return True
+            shares = self._shares()
+            over = [n for n in self._sources if busy[n] > shares[n]]
+            victim = min(over, key=lambda n: (self._sources[n]["priority"], -busy[n])) if over else None
+            if victim == name:
+                s["shed"] += 1
+                return False
+            s["admitted"] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            busy = self._busy(time.time())
+            shares = self._shares()
+            return {
+                "capacity": self.capacity,
+                "load": round(self.load, 3),
+                "sources": {n: {"priority": s["priority"], "share": round(shares[n], 3),
+                                "busy": round(busy[n], 3), "admitted": s["admitted"], "shed": s["shed"]}
+                            for n, s in self._sources.items()},
+            }
@@ -0,0 +1,264 @@
+# sources.py
+"""
+Frame sources that stand in for cv2.VideoCapture(0).
+
+Each one has the cv2.VideoCapture surface LatestFrameCapture uses (grab,
+retrieve, read, set, get, isOpened, release), so a recorded clip, a folder
+of images or generated frames can replace the camera in main.py
+(LUMI_CAMERA) and in bench_pipeline.py:
+
+    VideoFileSource(path)     a video file
+    ImageDirSource(path)      *.jpg/*.png in name order
+    SyntheticSource(n)        deterministic generated frames (no files needed)
+
+With realtime=True, grab() is paced to the source fps like a camera, so the
+capture thread drops frames whenever the analyzer falls behind. With
+realtime=False frames come as fast as they are asked for, for lossless,
+deterministic replays. Requested CAP_PROP_FRAME_WIDTH/HEIGHT are honoured by
+resizing, like a camera driver would.
+
+    open_source("clip.mp4")  /  open_source("synthetic:600")  /  open_source(0)
+
+parse_sources() reads the multi-camera list (LUMI_CAMERAS in main.py):
+comma-separated [name=]source[@priority], e.g.
+
+    wearable=0@2,table=1                 two cameras, the wearable counts double
+    a=clip1.mp4,b=clip2.mp4,c=synthetic  recorded streams standing in for cameras
+"""
+
+import os
+import time
+
+import numpy as np
+import cv2
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+DEFAULT_FPS = 15.0
+SYNTHETIC_FRAMES = 300
+
+
+class FrameSource:
+    def __init__(self, fps=DEFAULT_FPS, realtime=True, loop=False):
+        self.fps = float(fps or DEFAULT_FPS)
+        self.realtime = realtime
+        self.loop = loop
+        self.size = None          # (w, h) once set() asks for one
+        self._want = [0, 0]
+        self.index = -1           # frame position of the last grab
+        self._image = None
+        self._open = True
+        self._t0 = None
+
+    # ---------- subclasses ----------
+    def _grab(self):
+        """Advance to the next frame; False at the end."""
+        raise NotImplementedError
+
+    def _decode(self):
+        """Image for the last grab (BGR uint8)."""
+        raise NotImplementedError
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+    # ---------- cv2.VideoCapture surface ----------
+    def isOpened(self):
+        return self._open
+
+    def release(self):
+        self._open = False
+
+    def grab(self):
+        if not self._open:
+            return False
+        if self.realtime:
+            if self._t0 is None:
+                self._t0 = time.monotonic()
+            delay = self._t0 + (self.index + 1) / self.fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if not self._grab():
+            if not self.loop:
+                self._open = False
+                return False
+            self._rewind()
+            if not self._grab():
+                self._open = False
+                return False
+        self.index += 1
+        self._image = None
+        return True
+
+    def retrieve(self):
+        if self._image is None:
+            img = self._decode()
+            if img is None:
+                return False, None
+            if self.size and (img.shape[1], img.shape[0]) != self.size:
+                img = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+            self._image = img
+        return True, self._image
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def timestamp(self):
+        """Media time of the last grabbed frame, in seconds."""
+        return self.index / self.fps
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self._want[0] = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self._want[1] = int(value)
+        else:
+            return False
+        if all(self._want):
+            self.size = tuple(self._want)
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index + 1)
+        return 0.0
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, fps=None, realtime=True, loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(fps or self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS, realtime, loop)
+        self._open = self.cap.isOpened()
+
+    def _grab(self):
+        return self.cap.grab()
+
+    def _decode(self):
+        ok, img = self.cap.retrieve()
+        return img if ok else None
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def __len__(self):
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    def __init__(self, path, fps=None, realtime=True, loop=False):
+        self.paths = sorted(os.path.join(path, n) for n in os.listdir(path)
+                            if n.lower().endswith(IMAGE_EXTS))
+        self._pos = -1
+        super().__init__(fps, realtime, loop)
+        self._open = bool(self.paths)
+
+    def _grab(self):
+        if self._pos + 1 >= len(self.paths):
+            return False
+        self._pos += 1
+        return True
+
+    def _decode(self):
+        return cv2.imread(self.paths[self._pos])
+
+    def _rewind(self):
+        self._pos = -1
+
+    def __len__(self):
+        return len(self.paths)
+
+
+class SyntheticSource(FrameSource):
+    """
+    A bright "face" blob over a noisy background. In every 120 frames it
+    drifts and changes brightness (so the stub backend's labels change) for
+    45 frames, holds still for 45, and then the scene is empty and dark for
+    30 (nobody present). Frame i is always the same image for the same seed.
+    """
+
+    def __init__(self, frames=SYNTHETIC_FRAMES, fps=None, realtime=True, loop=False,
+                 size=(320, 240), seed=0):
+        self.frames = int(frames)
+        self.seed = seed
+        self._pos = -1
+        super().__init__(fps, realtime, loop)
+        self.size = tuple(size)
+
+    def _grab(self):
+        if self._pos + 1 >= self.frames:
+            return False
+        self._pos += 1
+        return True
+
+    def _decode(self):
+        i = self._pos
+        w, h = self.size
+        rng = np.random.default_rng((self.seed, i))
+        phase = i % 120
+        if phase >= 90:
+            return rng.integers(0, 6, (h, w, 3), dtype=np.uint8)
+        t = i - phase + min(phase, 45)     # frozen after 45 frames
+        img = rng.integers(50, 62, (h, w, 3), dtype=np.uint8)
+        cx = int(w * (0.3 + 0.4 * (0.5 + 0.5 * np.sin(t / 20.0))))
+        cy = h // 2
+        level = 120 + (t * 7) % 120
+        cv2.ellipse(img, (cx, cy), (w // 7, h // 4), 0, 0, 360, (level, level, level), -1)
+        return img
+
+    def _rewind(self):
+        self._pos = -1
+
+    def __len__(self):
+        return self.frames
+
+
+def open_source(spec, realtime=True, fps=None, loop=False):
+    """
+    Camera index (returned unchanged for cv2), "synthetic[:frames]", an image
+    directory or a video file.
+    """
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return int(spec)
+    if spec.startswith("synthetic"):
+        _, _, n = spec.partition(":")
+        return SyntheticSource(int(n) if n else SYNTHETIC_FRAMES, fps=fps, realtime=realtime, loop=loop)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, fps=fps, realtime=realtime, loop=loop)
+    return VideoFileSource(spec, fps=fps, realtime=realtime, loop=loop)
+
+
+def parse_sources(spec, default_priority=1.0):
+    """[(name, source, priority)] from "[name=]source[@priority],..."; sources unnamed get cam<i>."""
+    out, names = [], set()
+    for i, item in enumerate(p.strip() for p in str(spec).split(",")):
+        if not item:
+            continue
+        name, sep, source = item.partition("=")
+        if not sep:
+            name, source = f"cam{i}", item
+        priority = default_priority
+        head, sep, tail = source.rpartition("@")
+        if sep:
+            try:
+                priority, source = float(tail), head
+            except ValueError:
+                pass   # an "@" in a file name
+        name = name.strip()
+        if not name or "/" in name or name in names:
+            raise ValueError(f"bad or duplicate camera name {name!r} in {spec!r}")
+        names.add(name)
+        out.append((name, int(source) if source.isdigit() else source, priority))
+    return out
@@ -0,0 +1,67 @@
+# state.py
+"""
+Versioned, immutable state snapshots shared between the vision thread and
+the HTTP side.
+
+The vision thread builds a complete state dict for every analyzed frame and
+publishes it in one step; readers always get a whole Snapshot, never a mix of
+two frames. `version` only increases when something a client cares about
+changed (the `key` passed to publish: presence, label, identity, faces), so
+clients can long-poll or subscribe and be woken only on real changes. Fast
+moving details (confidence, boxes, timestamps) still ride along in the
+latest snapshot under the same version.
+"""
+
+import time
+import threading
+from types import MappingProxyType
+from collections import namedtuple
+
+Snapshot = namedtuple("Snapshot", ["version", "ts", "state"])
+
+
+class StateStore:
+    def __init__(self, initial=None):
+        self._cond = threading.Condition()
+        self._key = None
+        self._snap = Snapshot(0, time.time(), MappingProxyType(dict(initial or {})))
+        self._listeners = []
+
+    def current(self) -> Snapshot:
+        return self._snap
+
+    @property
+    def version(self) -> int:
+        return self._snap.version
+
+    def subscribe(self, fn):
+        """fn(snapshot) is called from the publishing thread on every version bump."""
+        self._listeners.append(fn)
+
+    def publish(self, state: dict, key=None) -> Snapshot:
+        frozen = MappingProxyType(dict(state))
+        with self._cond:
+            changed = key is None or key != self._key
+            version = self._snap.version + 1 if changed else self._snap.version
+            self._key = key
+            self._snap = Snapshot(version, time.time(), frozen)
+            if changed:
+                self._cond.notify_all()
+        if changed:
+            for fn in self._listeners:
+                try:
+                    fn(self._snap)
+                except Exception as e:
+                    print("[State] listener warn:", e)
+        return self._snap
+
+    def wait(self, since: int, timeout: float) -> Snapshot:
+        """Block until version > since (or timeout) and return the current snapshot."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._snap.version <= since:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._snap
@@ -0,0 +1,255 @@
+# tft.py
+"""
+TFT output for main.py.
+
+Every draw used to re-open and resize a progress PNG, word-wrap text by
+measuring the growing line once per word, and re-encode a quality-92 JPEG
+to disk. Now:
+
+- the progress images are decoded, resized and converted to the panel's
+  pixel format once (preload_progress), so showing one is a single copy,
+- rendered text frames sit in a small LRU keyed by text,
+- word-wrap sums cached per-word widths instead of re-measuring lines,
+- _blit copies the frame into a framebuffer: an mmap of /dev/fb* when the
+  panel has an fbdev driver (RGB565 or 32-bit), otherwise an in-memory
+  buffer that stands in for the display,
+- the JPEG preview is an optional debug sink, throttled to one write per
+  PREVIEW_MIN_INTERVAL_SEC (the last frame of a burst is always written).
+"""
+
+import os
+import mmap
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+FONT_SIZE = 18
+MARGIN = 8
+LINE_H = 22
+MAX_LINES = 10
+
+TEXT_CACHE_SIZE = 32        # rendered text frames kept
+WORD_CACHE_SIZE = 4096      # cached word widths before the cache is cleared
+
+# fbdev: LUMI_FB=/dev/fb1 to pick one, LUMI_FB=none to never touch /dev/fb*
+FB_CANDIDATES = ("/dev/fb1", "/dev/fb0")
+
+PREVIEW_JPEG = True
+PREVIEW_MIN_INTERVAL_SEC = 1.0
+
+
+class Framebuffer:
+    """A /dev/fb* mapping, or an in-memory RGB888 buffer when there is none."""
+
+    def __init__(self, w, h, device=None):
+        self.w, self.h = w, h
+        self.device = None
+        self.bpp = 24
+        self.stride = w * 3
+        self._mm = None
+        self._fd = None
+        dev = device if device is not None else os.environ.get("LUMI_FB")
+        for path in ([dev] if dev else FB_CANDIDATES):
+            if path and path != "none" and os.path.exists(path):
+                try:
+                    self._map(path)
+                    break
+                except Exception as e:
+                    print(f"[TFT] {path} unusable, using memory framebuffer:", e)
+        if self._mm is None:
+            self.buf = np.zeros((h, w, 3), dtype=np.uint8)
+
+    def _map(self, path):
+        sysfs = os.path.join("/sys/class/graphics", os.path.basename(path))
+        with open(os.path.join(sysfs, "virtual_size")) as f:
+            xres, yres = (int(v) for v in f.read().strip().split(","))
+        with open(os.path.join(sysfs, "bits_per_pixel")) as f:
+            bpp = int(f.read().strip())
+        try:
+            with open(os.path.join(sysfs, "stride")) as f:
+                stride = int(f.read().strip())
+        except Exception:
+            stride = xres * bpp // 8
+        if bpp not in (16, 32):
+            raise ValueError(f"{bpp} bpp not supported")
+        fd = os.open(path, os.O_RDWR)
+        self._mm = mmap.mmap(fd, stride * yres, mmap.MAP_SHARED, mmap.PROT_WRITE | mmap.PROT_READ)
+        self._fd = fd
+        self.buf = np.frombuffer(self._mm, dtype=np.uint8).reshape(yres, stride)
+        self.device, self.bpp, self.stride = path, bpp, stride
+        self.w, self.h = min(self.w, xres), min(self.h, yres)
+        print(f"[TFT] framebuffer {path} {xres}x{yres} {bpp}bpp")
+
+    def convert(self, img: Image.Image) -> np.ndarray:
+        """RGB image -> (h, w*bytes_per_pixel) uint8 rows in this framebuffer's format."""
+        a = np.asarray(img.convert("RGB"), dtype=np.uint8)[:self.h, :self.w]
+        if self.bpp == 16:
+            r = a[..., 0].astype(np.uint16)
+            g = a[..., 1].astype(np.uint16)
+            b = a[..., 2].astype(np.uint16)
+            px = ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+            return px.astype("<u2").view(np.uint8).reshape(a.shape[0], -1)
+        if self.bpp == 32:
+            out = np.empty(a.shape[:2] + (4,), dtype=np.uint8)
+            out[..., 0], out[..., 1], out[..., 2], out[..., 3] = a[..., 2], a[..., 1], a[..., 0], 255
+            return out.reshape(a.shape[0], -1)
+        return np.ascontiguousarray(a)
+
+    def write(self, rows: np.ndarray):
+        # memory: (h, w, 3) into (h, w, 3); fbdev: (h, w*Bpp) into (yres, stride)
+        self.buf[:rows.shape[0], :rows.shape[1]] = rows
+
+    def close(self):
+        if self._mm is not None:
+            self.buf = None
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = None
+
+
+class TFT:
+    def __init__(self, w=240, h=240, preview_dir=None, fb_device=None):
+        self.w, self.h = w, h
+        try:
+            self.font = ImageFont.truetype(FONT_PATH, FONT_SIZE)
+        except Exception:
+            self.font = ImageFont.load_default()
+        self.fb = Framebuffer(w, h, fb_device)
+        self.preview_dir = preview_dir if PREVIEW_JPEG else None
+        self._lock = threading.Lock()
+
+        self._progress = {}                 # pct -> (Image, fb rows)
+        self._text = OrderedDict()          # text -> (Image, fb rows)
+        self._words = {}                    # word -> width in px
+        self._space_w = self._measure(" ")
+        self.draws = 0
+        self.text_hits = 0
+        self.text_misses = 0
+
+        self._last_img = None
+        self._preview_at = 0.0
+        self._preview_timer = None
+
+    # ---------- precomputed frames ----------
+    def _frame(self, img: Image.Image):
+        return img, self.fb.convert(img)
+
+    def preload_progress(self, files: dict):
+        """Decode, resize and convert every progress image once."""
+        for pct, path in files.items():
+            try:
+                img = Image.open(path).convert("RGB").resize((self.w, self.h))
+                self._progress[pct] = self._frame(img)
+            except Exception as e:
+                print(f"[TFT] progress {pct} not loaded:", e)
+        return sorted(self._progress)
+
+    def show_progress(self, pct):
+        frame = self._progress.get(pct)
+        if frame is None:
+            return False
+        self._blit(*frame)
+        return True
+
+    def show_image_file(self, path: str):
+        try:
+            img = Image.open(path).convert("RGB").resize((self.w, self.h))
+            self._blit(*self._frame(img))
+        except Exception as e:
+            print("[TFT] show_image_file error:", e)
+
+    # ---------- text ----------
+    def _measure(self, s):
+        d = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+        return d.textlength(s, font=self.font)
+
+    def _word_width(self, w):
+        width = self._words.get(w)
+        if width is None:
+            if len(self._words) >= WORD_CACHE_SIZE:
+                self._words.clear()
+            width = self._words[w] = self._measure(w)
+        return width
+
+    def wrap(self, text: str):
+        lines, line, line_w = [], [], 0.0
+        limit = self.w - 2 * MARGIN
+        for w in text.split():
+            ww = self._word_width(w)
+            new_w = line_w + self._space_w + ww if line else ww
+            if line and new_w > limit:
+                lines.append(" ".join(line))
+                line, line_w = [w], ww
+            else:
+                line.append(w)
+                line_w = new_w
+        if line:
+            lines.append(" ".join(line))
+        return lines
+
+    def render_text(self, text: str) -> Image.Image:
+        img = Image.new("RGB", (self.w, self.h), (0, 0, 0))
+        d = ImageDraw.Draw(img)
+        y = MARGIN
+        for ln in self.wrap(text)[:MAX_LINES]:
+            d.text((MARGIN, y), ln, font=self.font, fill=(255, 255, 255))
+            y += LINE_H
+        return img
+
+    def show_text(self, text: str):
+        frame = self._text.get(text)
+        if frame is None:
+            self.text_misses += 1
+            frame = self._text[text] = self._frame(self.render_text(text))
+            if len(self._text) > TEXT_CACHE_SIZE:
+                self._text.popitem(last=False)
+        else:
+            self.text_hits += 1
+            self._text.move_to_end(text)
+        self._blit(*frame)
+
+    # ---------- output ----------
+    def _blit(self, img: Image.Image, rows: np.ndarray):
+        with self._lock:
+            self.fb.write(rows)
+            self.draws += 1
+            self._last_img = img
+        if self.preview_dir:
+            self._preview()
+
+    def _preview(self):
+        now = time.time()
+        wait = self._preview_at + PREVIEW_MIN_INTERVAL_SEC - now
+        if wait <= 0:
+            self._write_preview()
+        elif self._preview_timer is None:
+            # Trailing write so the preview ends up showing the last frame.
+            self._preview_timer = threading.Timer(wait, self._write_preview)
+            self._preview_timer.daemon = True
+            self._preview_timer.start()
+
+    def _write_preview(self):
+        self._preview_timer = None
+        self._preview_at = time.time()
+        img = self._last_img
+        if img is None:
+            return
+        try:
+            img.save(os.path.join(self.preview_dir, "tft_preview.jpg"), quality=92)
+        except Exception as e:
+            print("[TFT] preview error:", e)
+
+    def stats(self):
+        return {
+            "draws": self.draws,
+            "framebuffer": self.fb.device or "memory",
+            "bpp": self.fb.bpp,
+            "text_cache": len(self._text),
+            "text_hits": self.text_hits,
+            "text_misses": self.text_misses,
+            "progress_frames": sorted(self._progress),
+        }
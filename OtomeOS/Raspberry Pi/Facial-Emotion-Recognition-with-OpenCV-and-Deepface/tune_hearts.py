@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# tune_hearts.py
+"""
+Offline re-scoring of the hearts rule (emotion.HeartsMeter) over frame logs.
+
+main.py logs every processed frame's label and confidence (moodlog.FrameLog,
+<runtime>/moodlog[/<camera>]/frames-*.bin). This replays those logs for a
+grid of WINDOW_SEC / POS_RATIO / NEG_RATIO / MIN_EFFECTIVE_FRAMES (and a
+minimum vote confidence) and reports, per setting, how often the meter moves
+and flips direction and where it spends its time, as JSON:
+
+    python3 tune_hearts.py /app/runtime/moodlog
+    python3 tune_hearts.py logs/ --window 3,5,8 --pos 0.5:0.8:0.05 --neg 0.5:0.8:0.05 \\
+        --min-effective 5:20:5 --min-conf 0,0.4 --top 20 --trajectories 3 --csv sweep.csv
+
+The replay is HeartsMeter's: a present face's vote (positive / negative /
+neutral, as emotion.POSITIVE / NEGATIVE) enters a sliding window, the rule is
+checked on every frame with a face, and the window is cleared after it fires.
+Window counts come from cumulative sums (count in (t - W, t] = two lookups),
+so only the reset makes the replay sequential. Past the first W seconds
+after a reset the window no longer reaches back to it, and the rule is the
+same as without the reset, so the next firing frame of that stretch is
+precomputed for a batch of settings at once (a reverse running minimum).
+Each step then advances every setting of the batch to its next firing: a
+scan of the short W-second stretch after its reset, else that jump. The
+cost is O(frames) per setting plus O(firings), all in NumPy.
+
+Per setting: events (rule firings, also at the 1 / 5 heart limits), ups /
+downs, changes (hearts moved), flips (moved opposite to the previous move),
+both per observed hour (gaps over GAP_SEC without a face do not count),
+time-weighted mean hearts and time at each level. The current emotion.py
+settings are always part of the grid. --verify N replays N settings through
+emotion.HeartsMeter itself and compares the trajectories.
+"""
+
+import csv
+import json
+import time
+import argparse
+
+import numpy as np
+
+from moodlog import FrameLog, FRAME_LABELS, FRAME_CLASSIFIED, FRAME_PRESENT, FRAME_REUSED, FRAME_SHED, \
+    read_segments, segment_paths
+import emotion
+
+GAP_SEC = 10.0                 # longer gaps between faces are not observed time
+BATCH_ELEMENTS = 1 << 25       # settings x frames per precomputed batch (~128 MB of int32)
+
+_POS_CODES = [i for i, l in enumerate(FRAME_LABELS) if l in emotion.POSITIVE]
+_NEG_CODES = [i for i, l in enumerate(FRAME_LABELS) if l in emotion.NEGATIVE]
+
+
+def parse_grid(spec, cast=float):
+    """"a,b,c" or "start:stop:step" (stop included)."""
+    if ":" in spec:
+        lo, hi, step = (float(x) for x in spec.split(":"))
+        values = np.arange(lo, hi + step / 2.0, step)
+    else:
+        values = [float(x) for x in spec.split(",") if x.strip()]
+    return sorted({cast(round(float(v), 6)) for v in values})
+
+
+def load_frames(dirs, t_from=-np.inf, t_to=np.inf):
+    parts = [read_segments(segment_paths(d, FrameLog.prefix), FrameLog.dtype, FrameLog.magic, t_from, t_to)
+             for d in dirs]
+    rows = np.concatenate(parts) if parts else np.empty(0, FrameLog.dtype)
+    return rows[np.argsort(rows["ts"], kind="stable")]
+
+
+class Votes:
+    """Present frames of a log with their votes under one minimum confidence."""
+
+    def __init__(self, rows, min_conf=0.0, fresh_only=False):
+        rows = rows[(rows["flags"] & FRAME_PRESENT) != 0]
+        vote = (rows["flags"] & FRAME_CLASSIFIED) != 0
+        vote &= (rows["flags"] & FRAME_SHED) == 0        # main.py casts no vote for shed frames
+        vote &= rows["conf"].astype(np.float64) >= min_conf
+        if fresh_only:
+            vote &= (rows["flags"] & FRAME_REUSED) == 0
+        self.rows = rows
+        self.vote = vote
+        self.ts = rows["ts"]
+        self.n = rows.size
+        pos = vote & np.isin(rows["label"], _POS_CODES)
+        neg = vote & np.isin(rows["label"], _NEG_CODES)
+        # P[k] / Q[k]: positive / negative votes among the first k frames
+        self.P = np.concatenate(([0], np.cumsum(pos, dtype=np.int32)))
+        self.Q = np.concatenate(([0], np.cumsum(neg, dtype=np.int32)))
+        self.neutral = int(vote.sum() - pos.sum() - neg.sum())
+        gaps = np.minimum(np.diff(self.ts), GAP_SEC) if self.n else np.empty(0)
+        # W[k]: observed seconds before frame k; W[n] is the total
+        self.W = np.concatenate(([0.0], np.cumsum(gaps), [gaps.sum()])) if self.n else np.zeros(1)
+
+
+def sweep(v, window_sec, settings, keep_trajectories=False):
+    """
+    Replay every (pos_ratio, neg_ratio, min_effective) of `settings` with one
+    window length. Returns one dict per setting (and, if asked, its hearts
+    trajectory as [(ts, hearts)] after each change).
+    """
+    n = v.n
+    S = len(settings)
+    pr_all = np.array([s[0] for s in settings], np.float64)
+    nr_all = np.array([s[1] for s in settings], np.float64)
+    me_all = np.array([s[2] for s in settings], np.int64)
+    out = [None] * S
+    traj = [[] for _ in range(S)] if keep_trajectories else None
+    if n == 0:
+        for i in range(S):
+            out[i] = _summary(0, 0, 0, 0, 0, np.zeros(emotion.HEARTS_MAX + 1), emotion.HEARTS_START, 0.0)
+        return out, traj
+
+    ar = np.arange(n)
+    lo = np.searchsorted(v.ts, v.ts - window_sec, side="right")   # first frame inside (t - W, t]
+    posw = v.P[1:] - v.P[lo]
+    negw = v.Q[1:] - v.Q[lo]
+    effw = posw + negw
+    rp = posw / np.maximum(effw, 1)
+    rn = negw / np.maximum(effw, 1)
+    # after a firing at k, frames before wend[k] still have the reset inside their window
+    wend = np.searchsorted(lo, ar, side="right")
+    warm = max(1, int((wend - ar - 1).max()))
+    offs = np.arange(1, warm + 1)
+
+    batch = max(1, min(S, BATCH_ELEMENTS // n))
+    for b0 in range(0, S, batch):
+        idx = np.arange(b0, min(S, b0 + batch))
+        pr, nr, me = pr_all[idx], nr_all[idx], me_all[idx]
+        B = idx.size
+
+        # next firing at or after each frame, ignoring resets
+        fires = (effw >= me[:, None]) & (((rp >= pr[:, None]) & (posw > negw)) |
+                                          ((rn >= nr[:, None]) & (negw > posw)))
+        nxt = np.where(fires, ar, n).astype(np.int32)
+        del fires
+        nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+        nxt = np.concatenate((nxt, np.full((B, 1), n, np.int32)), axis=1)
+
+        cur = nxt[:, 0].astype(np.int64)
+        sign = np.sign(posw[np.minimum(cur, n - 1)] - negw[np.minimum(cur, n - 1)])
+        hearts = np.full(B, emotion.HEARTS_START, np.int64)
+        last = np.zeros(B, np.int64)
+        last_dir = np.zeros(B, np.int64)
+        events = np.zeros(B, np.int64)
+        ups = np.zeros(B, np.int64)
+        changes = np.zeros(B, np.int64)
+        flips = np.zeros(B, np.int64)
+        dwell = np.zeros((B, emotion.HEARTS_MAX + 1))
+
+        while True:
+            act = np.flatnonzero(cur < n)
+            if not act.size:
+                break
+            k, d = cur[act], sign[act]
+            np.add.at(dwell, (act, hearts[act]), v.W[k] - v.W[last[act]])
+            new = np.clip(hearts[act] + d, emotion.HEARTS_MIN, emotion.HEARTS_MAX)
+            moved = new != hearts[act]
+            events[act] += 1
+            ups[act] += d > 0
+            changes[act] += moved
+            flips[act] += moved & (last_dir[act] == -d)
+            last_dir[act] = np.where(moved, d, last_dir[act])
+            hearts[act] = new
+            last[act] = k
+            if keep_trajectories:
+                for j in np.flatnonzero(moved):
+                    traj[idx[act[j]]].append((float(v.ts[k[j]]), int(new[j])))
+
+            # the window restarts after k: scan the stretch it still reaches back into ...
+            at = np.minimum(k[:, None] + offs, n - 1)
+            inside = (k[:, None] + offs) < wend[k][:, None]
+            p = v.P[at + 1] - v.P[k + 1][:, None]
+            q = v.Q[at + 1] - v.Q[k + 1][:, None]
+            eff = p + q
+            effd = np.maximum(eff, 1)
+            hit = inside & (eff >= me[act][:, None]) & (((p / effd >= pr[act][:, None]) & (p > q)) |
+                                                        ((q / effd >= nr[act][:, None]) & (q > p)))
+            has = hit.any(axis=1)
+            first = hit.argmax(axis=1)
+            rows = np.arange(act.size)
+            # ... else jump to the next firing past it
+            jump = nxt[act, wend[k]].astype(np.int64)
+            jc = np.minimum(jump, n - 1)
+            cur[act] = np.where(has, k + 1 + first, jump)
+            sign[act] = np.where(has, np.sign(p[rows, first] - q[rows, first]),
+                                 np.sign(posw[jc] - negw[jc]))
+
+        np.add.at(dwell, (np.arange(B), hearts), v.W[n] - v.W[last])
+        for j in range(B):
+            out[idx[j]] = _summary(events[j], ups[j], events[j] - ups[j], changes[j], flips[j],
+                                   dwell[j], hearts[j], v.W[n])
+    return out, traj
+
+
+def _summary(events, ups, downs, changes, flips, dwell, final, observed_sec):
+    hours = observed_sec / 3600.0
+    levels = range(emotion.HEARTS_MIN, emotion.HEARTS_MAX + 1)
+    return {
+        "events": int(events),
+        "ups": int(ups),
+        "downs": int(downs),
+        "changes": int(changes),
+        "flips": int(flips),
+        "changes_per_hour": round(changes / hours, 2) if hours else None,
+        "flips_per_hour": round(flips / hours, 2) if hours else None,
+        "mean_hearts": round(float((dwell * np.arange(dwell.size)).sum() / observed_sec), 3)
+                       if observed_sec else float(final),
+        "time_at_hearts": {h: round(float(dwell[h] / observed_sec), 4) if observed_sec else 0.0
+                           for h in levels},
+        "final_hearts": int(final),
+    }
+
+
+def replay_meter(v, window_sec, pos_ratio, neg_ratio, min_effective):
+    """The same replay through emotion.HeartsMeter, frame by frame (for --verify)."""
+    meter = emotion.HeartsMeter(window_sec, pos_ratio, neg_ratio, min_effective)
+    hearts, traj = meter.hearts, []
+    for row, vote in zip(v.rows, v.vote):
+        ts = float(row["ts"])
+        if vote:
+            label = FRAME_LABELS[row["label"]] if row["label"] < len(FRAME_LABELS) else "neutral"
+            meter.add(label, float(row["conf"]), ts=ts)
+        if meter.update(now=ts) != hearts:
+            hearts = meter.hearts
+            traj.append((ts, hearts))
+    return traj
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("dirs", nargs="+", help="frame log directories (<runtime>/moodlog[/<camera>])")
+    ap.add_argument("--from", dest="t_from", type=float, default=-np.inf, help="unix time")
+    ap.add_argument("--to", dest="t_to", type=float, default=np.inf, help="unix time")
+    ap.add_argument("--window", default="3,5,8", help="WINDOW_SEC values (a,b,c or start:stop:step)")
+    ap.add_argument("--pos", default="0.5:0.8:0.05", help="POS_RATIO values")
+    ap.add_argument("--neg", default="0.5:0.8:0.05", help="NEG_RATIO values")
+    ap.add_argument("--min-effective", default="5,10,15,20", help="MIN_EFFECTIVE_FRAMES values")
+    ap.add_argument("--min-conf", default="0", help="minimum confidence for a frame to vote")
+    ap.add_argument("--fresh-only", action="store_true",
+                    help="only frames the models ran on vote (not results the scheduler carried forward)")
+    ap.add_argument("--sort", default="flips_per_hour", help="result field to rank by; -field for descending")
+    ap.add_argument("--top", type=int, default=20, help="settings listed in the JSON")
+    ap.add_argument("--trajectories", type=int, default=0, help="hearts trajectories of the top N (and the current settings)")
+    ap.add_argument("--csv", help="write every setting's row here")
+    ap.add_argument("--verify", type=int, default=0, help="check N settings against emotion.HeartsMeter")
+    args = ap.parse_args()
+
+    current = (emotion.WINDOW_SEC, emotion.POS_RATIO, emotion.NEG_RATIO, emotion.MIN_EFFECTIVE_FRAMES, 0.0)
+    windows = sorted(set(parse_grid(args.window)) | {current[0]})
+    pos = sorted(set(parse_grid(args.pos)) | {current[1]})
+    neg = sorted(set(parse_grid(args.neg)) | {current[2]})
+    mins = sorted(set(parse_grid(args.min_effective, int)) | {current[3]})
+    if mins[0] < 1:
+        ap.error("--min-effective values must be at least 1")
+    confs = sorted(set(parse_grid(args.min_conf)) | {current[4]})
+    settings = [(p, q, m) for p in pos for q in neg for m in mins]
+
+    t0 = time.perf_counter()
+    rows = load_frames(args.dirs, args.t_from, args.t_to)
+    t_load = time.perf_counter() - t0
+
+    results, trajectories = [], {}
+    votes = None
+    for c in confs:
+        votes = Votes(rows, c, args.fresh_only)
+        for w in windows:
+            summaries, traj = sweep(votes, w, settings, keep_trajectories=args.trajectories > 0)
+            for i, (p, q, m) in enumerate(settings):
+                key = (w, p, q, m, c)
+                results.append(dict({"window_sec": w, "pos_ratio": p, "neg_ratio": q,
+                                     "min_effective": m, "min_conf": c}, **summaries[i]))
+                if traj is not None:
+                    trajectories[key] = traj[i]
+    t_sweep = time.perf_counter() - t0 - t_load
+
+    field = args.sort.lstrip("-")
+    ranked = sorted(results, key=lambda r: (r[field] is None, r[field]), reverse=args.sort.startswith("-"))
+    key_of = lambda r: (r["window_sec"], r["pos_ratio"], r["neg_ratio"], r["min_effective"], r["min_conf"])
+    by_key = {key_of(r): r for r in results}
+
+    if args.csv:
+        levels = range(emotion.HEARTS_MIN, emotion.HEARTS_MAX + 1)
+        with open(args.csv, "w", newline="") as f:
+            w = csv.writer(f)
+            head = [k for k in results[0] if k != "time_at_hearts"] if results else []
+            w.writerow(head + [f"time_at_{h}" for h in levels])
+            for r in ranked:
+                w.writerow([r[k] for k in head] + [r["time_at_hearts"][h] for h in levels])
+
+    report = {
+        "frames": int(rows.size),
+        "present": votes.n if votes is not None else 0,
+        "votes": {"pos": int(votes.P[-1]), "neg": int(votes.Q[-1]), "neu": votes.neutral} if votes else None,
+        "span": [float(rows["ts"][0]), float(rows["ts"][-1])] if rows.size else None,
+        "observed_hours": round(float(votes.W[-1]) / 3600.0, 3) if votes else 0.0,
+        "grid": {"window_sec": windows, "pos_ratio": pos, "neg_ratio": neg,
+                 "min_effective": mins, "min_conf": confs},
+        "settings": len(results),
+        "load_sec": round(t_load, 3),
+        "sweep_sec": round(t_sweep, 3),
+        "sort": args.sort,
+        "current": by_key[current],
+        "results": ranked[:args.top],
+    }
+    if args.trajectories:
+        start = float(rows["ts"][0]) if rows.size else 0.0
+        shown = [key_of(r) for r in ranked[:args.trajectories]] + [current]
+        report["trajectories"] = {
+            "window=%g pos=%g neg=%g min=%d conf=%g" % k: [(start, emotion.HEARTS_START)] + trajectories[k]
+            for k in dict.fromkeys(shown)
+        }
+
+    if args.verify:
+        rng = np.random.default_rng(0)
+        picks = [current] + [key_of(results[i]) for i in rng.choice(len(results), min(args.verify, len(results)) - 1,
+                                                                    replace=False)]
+        mismatches = []
+        for k in picks[:args.verify]:
+            w, p, q, m, c = k
+            v = Votes(rows, c, args.fresh_only)
+            want = replay_meter(v, w, p, q, m)
+            got = sweep(v, w, [(p, q, m)], keep_trajectories=True)[1][0]
+            if got != want:
+                mismatches.append(list(k))
+        report["verify"] = {"checked": len(picks[:args.verify]), "mismatches": mismatches}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
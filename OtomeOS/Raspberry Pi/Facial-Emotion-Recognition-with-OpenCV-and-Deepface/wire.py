@@ -0,0 +1,116 @@
+# wire.py
+"""
+Compact encodings for /status.
+
+The JSON body base64-encodes the full float32 embedding on every poll. These
+helpers give clients cheaper options:
+
+- embedding_hash(vec): short stable id of a vector; a client that already
+  has it sends ?embedding_hash=<h> and gets the body without the vector.
+- encode_embedding(vec, fmt): f32 (as before), f16, or i8 (symmetric
+  per-vector scale), memoized so a vector is encoded once however many
+  clients poll it.
+- pack_status(body, vec, fmt): fixed little-endian binary layout, served for
+  `Accept: application/octet-stream`:
+
+    header  <4sBBBBHIdfI8sB   magic "LUMI", layout version, flags (bit0 present),
+                              emotion (0 happy, 1 neutral, 2 upset), emb format
+                              (0 none, 1 f32, 2 f16, 3 i8), emb dim, state version,
+                              frame_ts, emotion_conf, last_seen_ts,
+                              embedding hash (8 raw bytes), face count
+    faces   <iHHHHBe per face track_id (-1 if none), x, y, w, h, emotion
+                              (3: not classified, skipped by the quality gate), conf
+    emb     f32/f16: dim values;  i8: <f scale, then dim int8  (value = q * scale)
+
+- pack_msgpack(...): same content as a msgpack map if msgpack is installed
+  (`Accept: application/msgpack`).
+"""
+
+import struct
+import hashlib
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+MAGIC = b"LUMI"
+LAYOUT_VERSION = 1
+EMOTION_CODES = {"happy": 0, "neutral": 1, "upset": 2}
+UNCLASSIFIED = 3             # face code only: no reading for this face
+EMB_FORMATS = {"none": 0, "f32": 1, "f16": 2, "i8": 3}
+
+_HEADER = struct.Struct("<4sBBBBHIdfI8sB")
+_FACE = struct.Struct("<iHHHHBe")
+_SCALE = struct.Struct("<f")
+
+
+def embedding_hash(vec) -> str:
+    if vec is None:
+        return ""
+    return hashlib.blake2b(np.ascontiguousarray(vec, dtype=np.float32).tobytes(),
+                           digest_size=8).hexdigest()
+
+
+_memo = {}
+
+
+def encode_embedding(vec, fmt="f32", key=None) -> bytes:
+    """Raw bytes of vec in fmt; memoized on (key, fmt) when key (e.g. the hash) is given."""
+    if vec is None or fmt == "none":
+        return b""
+    if key is not None and (key, fmt) in _memo:
+        return _memo[(key, fmt)]
+    v = np.asarray(vec, dtype=np.float32)
+    if fmt == "f32":
+        raw = v.tobytes()
+    elif fmt == "f16":
+        raw = v.astype("<f2").tobytes()
+    elif fmt == "i8":
+        peak = float(np.abs(v).max()) if v.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        raw = _SCALE.pack(scale) + np.clip(np.rint(v / scale), -127, 127).astype(np.int8).tobytes()
+    else:
+        raise ValueError(f"unknown embedding format {fmt!r}")
+    if key is not None:
+        if len(_memo) > 32:
+            _memo.clear()
+        _memo[(key, fmt)] = raw
+    return raw
+
+
+def pack_status(body: dict, vec, fmt="f16") -> bytes:
+    h = body.get("embedding_hash") or ""
+    emb = encode_embedding(vec, fmt, key=h or None)
+    faces = body.get("faces") or ()
+    out = [_HEADER.pack(
+        MAGIC, LAYOUT_VERSION,
+        1 if body.get("present") else 0,
+        EMOTION_CODES.get(body.get("emotion"), 1),
+        EMB_FORMATS[fmt] if emb else 0,
+        0 if vec is None or not emb else int(np.asarray(vec).size),
+        int(body.get("version", 0)) & 0xFFFFFFFF,
+        float(body.get("frame_ts", 0.0)),
+        float(body.get("emotion_conf", 0.0)),
+        int(body.get("last_seen_ts", 0)) & 0xFFFFFFFF,
+        bytes.fromhex(h) if h else b"\0" * 8,
+        min(len(faces), 255),
+    )]
+    for f in list(faces)[:255]:
+        x, y, w, hgt = (max(0, min(int(v), 0xFFFF)) for v in f.get("box", (0, 0, 0, 0)))
+        tid = f.get("track_id")
+        out.append(_FACE.pack(-1 if tid is None else int(tid), x, y, w, hgt,
+                              EMOTION_CODES.get(f.get("emotion"), 1) if f.get("classified", True) else UNCLASSIFIED,
+                              float(f.get("emotion_conf", 0.0))))
+    out.append(emb)
+    return b"".join(out)
+
+
+def pack_msgpack(body: dict, vec, fmt="f16") -> bytes:
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    d = dict(body)
+    d["embedding"] = encode_embedding(vec, fmt, key=d.get("embedding_hash") or None)
+    d["embedding_format"] = fmt if d["embedding"] else "none"
+    return msgpack.packb(d, use_bin_type=True)